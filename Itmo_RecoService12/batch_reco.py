@@ -0,0 +1,223 @@
+"""
+Офлайн-расчет рекомендаций модели из ServiceConfig.models для списка
+пользователей или всех теплых пользователей.
+
+Пользователи делятся на шарды по shard_size, каждый шард сохраняется
+парой файлов .npy: shard_00000_users.npy (id пользователей) и
+shard_00000_items.npy (матрица [пользователи, k] id айтемов, -1 -
+пустая позиция). Файл с рекомендациями пишется последним и атомарно,
+поэтому он же служит отметкой о готовности шарда: перезапуск с тем же
+--out пропускает готовые шарды. Список пользователей и параметры
+запуска сохраняются в users.npy и meta.json при первом запуске.
+
+Считает service.batch в пуле процессов; в конце печатается отчет:
+пользователей в секунду на процесс и на секунду CPU и пиковая память
+(ru_maxrss) родителя и самого большого процесса пула.
+
+python batch_reco.py --model userknn_BM25Recommender --out /tmp/recos \
+    --k 10 --workers 4
+"""
+import argparse
+import json
+import os
+import resource
+import time
+import typing as tp
+from pathlib import Path
+
+import numpy as np
+
+from service.batch import iter_recos, warm_users
+from service.log import app_logger
+from service.settings import ModelSpec, get_config
+
+META_FILE = "meta.json"
+USERS_FILE = "users.npy"
+
+
+def shard_files(path: Path, shard: int) -> tp.Tuple[Path, Path]:
+    return (path / f"shard_{shard:05d}_users.npy",
+            path / f"shard_{shard:05d}_items.npy")
+
+
+def save_array(path: Path, array: np.ndarray) -> None:
+    # запись во временный файл и переименование: файл либо целый,
+    # либо его нет
+    tmp_path = path.with_name(f"{path.stem}.tmp.npy")
+    np.save(tmp_path, array)
+    os.replace(tmp_path, path)
+
+
+def read_users(path: tp.Union[str, Path]) -> np.ndarray:
+    """
+    Пользователи из .npy или текстового файла (по одному id в строке)
+    """
+    path = Path(path)
+    if path.suffix == ".npy":
+        return np.load(path).astype(np.int64)
+    return np.loadtxt(path, dtype=np.int64, ndmin=1)
+
+
+def prepare(
+    path: Path,
+    meta: tp.Dict[str, tp.Any],
+    users: tp.Callable[[], np.ndarray],
+) -> np.ndarray:
+    """
+    Список пользователей запуска: при продолжении - сохраненный, при
+    первом запуске - users(), сохраняется вместе с meta
+    """
+    if (path / META_FILE).is_file():
+        with open(path / META_FILE) as f:
+            saved = json.load(f)
+        if {key: saved.get(key) for key in meta} != meta:
+            raise ValueError(
+                f"{path} contains another run: {saved}, remove it or "
+                f"use another --out")
+        return np.load(path / USERS_FILE)
+    path.mkdir(parents=True, exist_ok=True)
+    user_ids = np.asarray(users(), dtype=np.int64)
+    save_array(path / USERS_FILE, user_ids)
+    # meta.json последним: без него запуск начинается заново
+    with open(path / META_FILE, "w") as f:
+        json.dump({**meta, "n_users": len(user_ids)}, f)
+    return user_ids
+
+
+def peak_rss_mb() -> tp.Dict[str, float]:
+    # ru_maxrss в Linux - в килобайтах
+    return {
+        "main": round(resource.getrusage(
+            resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "workers": round(resource.getrusage(
+            resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+    }
+
+
+def cpu_seconds() -> float:
+    return sum(usage.ru_utime + usage.ru_stime for usage in (
+        resource.getrusage(resource.RUSAGE_SELF),
+        resource.getrusage(resource.RUSAGE_CHILDREN)))
+
+
+def run(
+    spec: ModelSpec,
+    path: tp.Union[str, Path],
+    model_name: str,
+    k_recos: int = 10,
+    user_ids: tp.Optional[np.ndarray] = None,
+    n_workers: tp.Optional[int] = None,
+    shard_size: int = 100_000,
+    block_size: int = 10_000,
+    memory_budget: tp.Optional[int] = None,
+) -> tp.Dict[str, tp.Any]:
+    """
+    Расчет рекомендаций с сохранением по шардам
+    :param spec: описание модели
+    :param path: директория результата
+    :param model_name: название модели (для meta.json)
+    :param user_ids: внешние id пользователей (по умолчанию все теплые)
+    :param n_workers: количество процессов (по умолчанию - по числу ядер)
+    :param shard_size: пользователей в шарде
+    :param block_size: пользователей в одном вызове reco_many
+    :param memory_budget: память на расчет скоров всех процессов, байт
+    :return: отчет о запуске
+    """
+    path = Path(path)
+    n_workers = n_workers or os.cpu_count() or 1
+    started_at = time.perf_counter()
+    cpu_started_at = cpu_seconds()
+    meta = {"model": model_name, "k": k_recos, "shard_size": shard_size}
+    user_ids = prepare(path, meta, lambda: warm_users(spec)
+                       if user_ids is None else user_ids)
+
+    shards = range(0, (len(user_ids) + shard_size - 1) // shard_size)
+    pending = [shard for shard in shards
+               if not shard_files(path, shard)[1].is_file()]
+    app_logger.info(f"{len(user_ids)} users, {len(pending)} of "
+                    f"{len(shards)} shards left")
+    # пользователи недостающих шардов считаются одним проходом, блоки
+    # раскладываются по шардам по мере готовности
+    todo = np.concatenate(
+        [user_ids[shard * shard_size:(shard + 1) * shard_size]
+         for shard in pending] or [user_ids[:0]])
+    blocks = iter_recos(spec, k_recos, todo, n_workers=n_workers,
+                        block_size=min(block_size, shard_size),
+                        memory_budget=memory_budget)
+    buffer: tp.List[np.ndarray] = []
+    n_buffered = 0
+    try:
+        for shard in pending:
+            users = user_ids[shard * shard_size:(shard + 1) * shard_size]
+            while n_buffered < len(users):
+                _, recos = next(blocks)
+                buffer.append(recos)
+                n_buffered += len(recos)
+            recos = np.concatenate(buffer)
+            users_path, items_path = shard_files(path, shard)
+            save_array(users_path, users)
+            save_array(items_path, recos[:len(users)])
+            buffer = [recos[len(users):]]
+            n_buffered -= len(users)
+            app_logger.info(f"Shard {shard} saved")
+    finally:
+        # генератор останавливается внутри with пула: пул закрывается и
+        # ждет процессы, только после этого они попадают в RUSAGE_CHILDREN
+        blocks.close()
+
+    n_users = len(todo)
+    elapsed = time.perf_counter() - started_at
+    cpu = cpu_seconds() - cpu_started_at
+    return {
+        "model": model_name,
+        "users": n_users,
+        "shards": len(pending),
+        "workers": n_workers,
+        "seconds": round(elapsed, 3),
+        "users_per_s": round(n_users / elapsed, 1),
+        "users_per_s_per_worker": round(n_users / elapsed / n_workers, 1),
+        "users_per_cpu_s": round(n_users / cpu, 1) if cpu else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def load_shards(path: tp.Union[str, Path]) -> tp.Tuple[np.ndarray,
+                                                       np.ndarray]:
+    """
+    Все шарды результата: id пользователей и матрица рекомендаций
+    """
+    path = Path(path)
+    with open(path / META_FILE) as f:
+        meta = json.load(f)
+    n_shards = (meta["n_users"] + meta["shard_size"] - 1) \
+        // meta["shard_size"]
+    files = [shard_files(path, shard) for shard in range(n_shards)]
+    return (np.concatenate([np.load(users) for users, _ in files]
+                           or [np.empty(0, dtype=np.int64)]),
+            np.concatenate([np.load(items) for _, items in files]
+                           or [np.empty((0, meta["k"]), dtype=np.int32)]))
+
+
+if __name__ == "__main__":
+    config = get_config()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", required=True,
+                        choices=sorted(config.models))
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--users",
+                        help=".npy или текстовый файл с id пользователей "
+                             "(по умолчанию все теплые)")
+    parser.add_argument("--k", type=int, default=config.k_recs)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--shard-size", type=int, default=100_000)
+    parser.add_argument("--block-size", type=int, default=10_000)
+    parser.add_argument("--memory-budget-mb", type=int)
+    args = parser.parse_args()
+    report = run(
+        config.models[args.model], args.out, args.model, k_recos=args.k,
+        user_ids=read_users(args.users) if args.users else None,
+        n_workers=args.workers, shard_size=args.shard_size,
+        block_size=args.block_size,
+        memory_budget=args.memory_budget_mb << 20
+        if args.memory_budget_mb else None)
+    print(json.dumps(report, indent=2))
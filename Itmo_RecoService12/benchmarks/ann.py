@@ -0,0 +1,142 @@
+"""
+Бенчмарк индекса приближенного поиска (service.ann) против точного
+расчета скоров векторной модели.
+
+Для каждой пары (n_lists, n_probe) меряются recall@K - доля айтемов
+точного top-K, найденных индексом (просмотренное исключается в обоих
+случаях), и задержка запроса одного пользователя. Векторы берутся из
+векторной модели синтетического датасета (benchmarks.synthetic) или,
+с --n-items, генерируются случайно вокруг кластеров, чтобы проверить
+каталог больше синтетического.
+
+python -m benchmarks.ann --data /tmp/kion --n-items 200000 --out ann.json
+"""
+import argparse
+import json
+import time
+import typing as tp
+from pathlib import Path
+
+import numpy as np
+from scipy import sparse
+
+from benchmarks.run import percentiles
+from benchmarks.synthetic import generate, load_specs
+from service.ann import IVFIndex
+from service.registry import load_model
+from service.scorers import VectorScorer
+
+
+def random_vectors(
+    n_users: int,
+    n_items: int,
+    dim: int = 32,
+    n_clusters: int = 100,
+    seed: int = 0,
+) -> VectorScorer:
+    """
+    Случайные векторы пользователей и айтемов вокруг общих центров
+    кластеров, без истории просмотров
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_clusters, dim))
+    item_vectors = centers[rng.integers(0, n_clusters, n_items)] \
+        + 0.5 * rng.normal(size=(n_items, dim))
+    user_vectors = centers[rng.integers(0, n_clusters, n_users)] \
+        + 0.5 * rng.normal(size=(n_users, dim))
+    return VectorScorer(user_vectors, item_vectors,
+                        sparse.csr_matrix((n_users, n_items),
+                                          dtype=np.float32))
+
+
+def model_vectors(data: Path) -> VectorScorer:
+    if not (data / "models.json").is_file():
+        generate(data)
+    for spec in load_specs(data).values():
+        model = load_model(spec)
+        if isinstance(model.scorer, VectorScorer):
+            return model.scorer
+    raise ValueError(f"No vector model in {data}")
+
+
+def recall(found: np.ndarray, exact: np.ndarray) -> float:
+    hits = sum(len(set(row[row >= 0]) & set(exact_row[exact_row >= 0]))
+               for row, exact_row in zip(found, exact))
+    return hits / max(1, int((exact >= 0).sum()))
+
+
+def latency(
+    recommend: tp.Callable[[np.ndarray, int], np.ndarray],
+    user_rows: np.ndarray,
+    k: int,
+) -> tp.Dict[str, float]:
+    durations = []
+    for row in user_rows:
+        started_at = time.perf_counter()
+        recommend(np.asarray([row]), k)
+        durations.append(time.perf_counter() - started_at)
+    return percentiles(durations)
+
+
+def run(
+    scorer: VectorScorer,
+    n_lists: tp.Sequence[tp.Optional[int]] = (None,),
+    n_probes: tp.Sequence[int] = (1, 4, 8, 16, 32),
+    n_queries: int = 500,
+    k: int = 10,
+    seed: int = 0,
+) -> tp.Dict[str, tp.Any]:
+    rng = np.random.default_rng(seed)
+    user_rows = rng.choice(len(scorer.user_vectors),
+                           min(n_queries, len(scorer.user_vectors)),
+                           replace=False)
+    exact = scorer.recommend(user_rows, k)
+    result: tp.Dict[str, tp.Any] = {
+        "n_items": len(scorer.item_vectors),
+        "dim": scorer.item_vectors.shape[1],
+        "k": k,
+        "exact": latency(scorer.recommend, user_rows, k),
+        "ivf": [],
+    }
+    for lists in n_lists:
+        started_at = time.perf_counter()
+        index = IVFIndex.build(scorer.item_vectors, n_lists=lists)
+        build_s = round(time.perf_counter() - started_at, 3)
+        ann = VectorScorer(scorer.user_vectors, scorer.item_vectors,
+                           scorer.user_items, index)
+        for n_probe in n_probes:
+            if n_probe > index.n_lists:
+                continue
+            index.n_probe = n_probe
+            result["ivf"].append({
+                "n_lists": index.n_lists,
+                "n_probe": n_probe,
+                "build_s": build_s,
+                f"recall@{k}": round(
+                    recall(ann.recommend(user_rows, k), exact), 4),
+                "latency": latency(ann.recommend, user_rows, k),
+            })
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", required=True)
+    parser.add_argument("--out")
+    parser.add_argument("--n-items", type=int,
+                        help="случайные векторы вместо модели")
+    parser.add_argument("--n-lists", type=int, nargs="+", default=[None])
+    parser.add_argument("--n-probes", type=int, nargs="+",
+                        default=[1, 4, 8, 16, 32])
+    parser.add_argument("--n-queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+    if args.n_items is not None:
+        vectors = random_vectors(args.n_queries, args.n_items)
+    else:
+        vectors = model_vectors(Path(args.data))
+    report = json.dumps(run(vectors, args.n_lists, args.n_probes,
+                            args.n_queries, args.k), indent=2)
+    if args.out:
+        Path(args.out).write_text(report)
+    print(report)
@@ -0,0 +1,190 @@
+"""
+Бенчмарк моделей сервиса на синтетическом датасете (benchmarks.synthetic).
+
+Для каждой модели меряются:
+- startup - время загрузки из dill и из артефакта;
+- interactions - время загрузки interactions.csv при старте сервиса:
+  cold - разбор CSV и сборка кеша, warm - открытие готового кеша;
+- latency - время одного вызова reco (теплые и холодные пользователи);
+- throughput - пользователей в секунду при пакетном reco_many;
+- workers - память воркеров, запущенных fork после загрузки модели,
+  как gunicorn с preload (rss/pss/shared/private из smaps_rollup).
+
+Результат - JSON для сравнения между коммитами:
+python -m benchmarks.run --data /tmp/kion --out bench.json
+Если в --data нет моделей, они генерируются.
+"""
+import argparse
+import json
+import multiprocessing
+import platform
+import shutil
+import subprocess
+import time
+import typing as tp
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.synthetic import INTERACTIONS_FILE, generate, load_specs
+from service.interactions import default_cache_dir, load_interactions
+from service.memory import memory_usage
+from service.registry import load_model
+from service.settings import ModelSpec
+
+
+def percentiles(values: tp.Sequence[float]) -> tp.Dict[str, float]:
+    values_us = np.asarray(values) * 1e6
+    return {f"p{q}_us": round(float(np.percentile(values_us, q)), 1)
+            for q in (50, 95, 99)}
+
+
+def bench_startup(spec: ModelSpec) -> tp.Dict[str, float]:
+    result = {}
+    variants = {"dill": spec.copy(update={"artifact_path": None}),
+                "artifact": spec}
+    for variant, variant_spec in variants.items():
+        started_at = time.perf_counter()
+        load_model(variant_spec)
+        result[f"{variant}_s"] = round(time.perf_counter() - started_at, 4)
+    return result
+
+
+def bench_interactions(path: Path) -> tp.Dict[str, float]:
+    shutil.rmtree(default_cache_dir(path), ignore_errors=True)
+    result = {}
+    for variant in ("cold", "warm"):
+        started_at = time.perf_counter()
+        load_interactions(path)
+        result[f"{variant}_s"] = round(time.perf_counter() - started_at, 4)
+    return result
+
+
+def bench_latency(
+    model: tp.Any,
+    user_ids: np.ndarray,
+    k_recos: int,
+) -> tp.Dict[str, float]:
+    durations = []
+    for user_id in user_ids:
+        started_at = time.perf_counter()
+        model.reco(user_id, k_recos)
+        durations.append(time.perf_counter() - started_at)
+    return percentiles(durations)
+
+
+def bench_throughput(
+    model: tp.Any,
+    user_ids: np.ndarray,
+    k_recos: int,
+    batch_size: int,
+) -> tp.Dict[str, float]:
+    started_at = time.perf_counter()
+    for start in range(0, len(user_ids), batch_size):
+        model.reco_many(user_ids[start:start + batch_size], k_recos)
+    duration = time.perf_counter() - started_at
+    return {"batch_size": batch_size,
+            "users_per_s": round(len(user_ids) / duration, 1)}
+
+
+def _worker(model: tp.Any, user_ids: np.ndarray, k_recos: int,
+            queue: multiprocessing.Queue) -> None:
+    for user_id in user_ids:
+        model.reco(user_id, k_recos)
+    queue.put(memory_usage())
+
+
+def bench_workers(
+    model: tp.Any,
+    user_ids: np.ndarray,
+    k_recos: int,
+    n_workers: int,
+) -> tp.List[tp.Dict[str, int]]:
+    """
+    Память воркеров в мегабайтах после обработки запросов
+    """
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+    workers = [context.Process(target=_worker,
+                               args=(model, user_ids, k_recos, queue))
+               for _ in range(n_workers)]
+    for worker in workers:
+        worker.start()
+    usages = [queue.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    return [{
+        "rss_mb": usage["Rss"] // 1024,
+        "pss_mb": usage["Pss"] // 1024,
+        "shared_mb": (usage["Shared_Clean"] + usage["Shared_Dirty"]) // 1024,
+        "private_mb": (usage["Private_Clean"]
+                       + usage["Private_Dirty"]) // 1024,
+    } for usage in usages if usage]
+
+
+def git_revision() -> tp.Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(
+    data: tp.Union[str, Path],
+    n_requests: int = 1000,
+    n_batch_users: int = 10_000,
+    batch_size: int = 256,
+    n_workers: int = 2,
+    k_recos: int = 10,
+    seed: int = 0,
+) -> tp.Dict[str, tp.Any]:
+    data = Path(data)
+    if not (data / "models.json").is_file():
+        generate(data, seed=seed)
+    specs = load_specs(data)
+    rng = np.random.default_rng(seed)
+
+    result: tp.Dict[str, tp.Any] = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "params": {"n_requests": n_requests, "n_batch_users": n_batch_users,
+                   "batch_size": batch_size, "n_workers": n_workers,
+                   "k_recos": k_recos},
+        "interactions": bench_interactions(data / INTERACTIONS_FILE),
+        "models": {},
+    }
+    for name, spec in specs.items():
+        startup = bench_startup(spec)
+        model = load_model(spec)
+        warm = model.warm_users()
+        # доля холодных пользователей - 10%
+        requests = rng.choice(warm, n_requests)
+        requests[rng.random(n_requests) < 0.1] = -1
+        result["models"][name] = {
+            "n_warm_users": len(warm),
+            "startup": startup,
+            "latency": bench_latency(model, requests, k_recos),
+            "throughput": bench_throughput(
+                model, rng.choice(warm, n_batch_users), k_recos, batch_size),
+            "workers": bench_workers(model, requests[:100], k_recos,
+                                     n_workers),
+        }
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", required=True)
+    parser.add_argument("--out")
+    parser.add_argument("--n-requests", type=int, default=1000)
+    parser.add_argument("--n-batch-users", type=int, default=10_000)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+    report = json.dumps(run(args.data, args.n_requests, args.n_batch_users,
+                            args.batch_size, args.workers), indent=2)
+    if args.out:
+        Path(args.out).write_text(report)
+    print(report)
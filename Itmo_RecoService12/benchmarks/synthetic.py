@@ -0,0 +1,193 @@
+"""
+Синтетический датасет в формате Kion и модели для бенчмарков.
+
+Взаимодействия повторяют interactions.csv Kion (user_id, item_id,
+last_watch_dt, total_dur, watched_pct): популярность айтемов и
+активность пользователей убывают по степенному закону. По ним строятся
+небольшие модели, совместимые с KionReco/KionRecoBM25 (dill модели и
+датасета + артефакт service.artifacts):
+- lightfm - LightFM (если установлен пакет lightfm), иначе als - ALS
+  из implicit, тот же путь расчета по векторам;
+- bm25 - item-KNN BM25Recommender (как BM25Recommender_0.085430);
+- userknn - user-KNN BM25Recommender (как userknn_BM25Recommender).
+
+Запуск: python -m benchmarks.synthetic --out /tmp/kion --n-users 20000
+"""
+import argparse
+import json
+import typing as tp
+from pathlib import Path
+
+import dill
+import numpy as np
+import pandas as pd
+from implicit.als import AlternatingLeastSquares
+from implicit.nearest_neighbours import BM25Recommender
+from rectools import Columns
+from rectools.dataset import Dataset
+from rectools.models import (
+    ImplicitALSWrapperModel,
+    ImplicitItemKNNWrapperModel,
+)
+from scipy import sparse
+
+from service.artifacts import export_model
+from service.make_reco import KionReco, KionRecoBM25
+from service.settings import ModelSpec
+
+INTERACTIONS_FILE = "interactions.csv"
+
+
+def make_interactions(
+    n_users: int = 10_000,
+    n_items: int = 2_000,
+    n_interactions: int = 100_000,
+    alpha: float = 1.0,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """
+    Взаимодействия в формате interactions.csv Kion
+    :param alpha: показатель степенного закона популярности айтемов
+    """
+    rng = np.random.default_rng(seed)
+    popularity = 1 / np.arange(1, n_items + 1) ** alpha
+    activity = 1 / np.arange(1, n_users + 1) ** 0.5
+    # id разрежены и перемешаны, как в Kion
+    user_ids = rng.choice(n_users * 10, n_users, replace=False)
+    item_ids = rng.choice(n_items * 10, n_items, replace=False)
+    df = pd.DataFrame({
+        "user_id": user_ids[rng.choice(n_users, n_interactions,
+                                       p=activity / activity.sum())],
+        "item_id": item_ids[rng.choice(n_items, n_interactions,
+                                       p=popularity / popularity.sum())],
+        "last_watch_dt": pd.Timestamp("2021-03-13") + pd.to_timedelta(
+            rng.integers(0, 160, n_interactions), unit="D"),
+        "total_dur": rng.integers(1, 20_000, n_interactions),
+        "watched_pct": rng.integers(0, 101, n_interactions).astype(float),
+    })
+    return df.drop_duplicates(["user_id", "item_id"]).reset_index(drop=True)
+
+
+def rectools_interactions(interactions: pd.DataFrame) -> pd.DataFrame:
+    """
+    Взаимодействия Kion в колонках rectools (Columns.Interactions)
+    """
+    return interactions.rename(columns={
+        "last_watch_dt": Columns.Datetime,
+    }).assign(**{Columns.Weight: 1})[Columns.Interactions]
+
+
+def make_dataset(interactions: pd.DataFrame) -> Dataset:
+    return Dataset.construct(rectools_interactions(interactions))
+
+
+def _dump(obj: tp.Any, path: Path) -> Path:
+    with open(path, "wb") as f:
+        dill.dump(obj, f)
+    return path
+
+
+def _vector_model(seed: int) -> tp.Tuple[str, tp.Any]:
+    try:
+        from lightfm import LightFM
+        from rectools.models import LightFMWrapperModel
+    except ImportError:
+        return "als", ImplicitALSWrapperModel(AlternatingLeastSquares(
+            factors=32, iterations=5, random_state=seed))
+    return "lightfm", LightFMWrapperModel(
+        LightFM(no_components=32, loss="warp", random_state=seed), epochs=5)
+
+
+def userknn_model(dataset: Dataset) -> BM25Recommender:
+    """
+    user-KNN BM25Recommender по датасету, как userknn_BM25Recommender
+    """
+    df = dataset.interactions.df
+    users_mapping = {v: k for k, v in enumerate(df[Columns.User].unique())}
+    # implicit>=0.5 считает близость между столбцами матрицы,
+    # поэтому пользователи идут по столбцам
+    matrix = sparse.csr_matrix((
+        np.ones(len(df), dtype=np.float32),
+        (df[Columns.Item], df[Columns.User].map(users_mapping)),
+    ))
+    model = BM25Recommender(K=50, K1=0.012, B=0.05)
+    model.fit(matrix, show_progress=False)
+    return model
+
+
+def build_models(
+    path: tp.Union[str, Path],
+    interactions: pd.DataFrame,
+    seed: int = 0,
+) -> tp.Dict[str, ModelSpec]:
+    """
+    Обучение моделей и сохранение dill-файлов и артефактов
+    :return: описания моделей для ServiceConfig.models
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    dataset = make_dataset(interactions)
+    dataset_path = _dump(dataset, path / "dataset.dill")
+
+    vector_name, vector_model = _vector_model(seed)
+    item_models = {
+        vector_name: vector_model,
+        "bm25": ImplicitItemKNNWrapperModel(BM25Recommender(K=50)),
+    }
+    specs = {}
+    for name, model in item_models.items():
+        model.fit(dataset)
+        model_path = _dump(model, path / f"{name}.dill")
+        export_model(KionReco(model_path, dataset_path), path / name)
+        specs[name] = ModelSpec(kind="KionReco", model_path=model_path,
+                                dataset_path=dataset_path,
+                                artifact_path=path / name)
+
+    model_path = _dump(userknn_model(dataset), path / "userknn.dill")
+    export_model(KionRecoBM25(model_path, dataset_path), path / "userknn")
+    specs["userknn"] = ModelSpec(kind="KionRecoBM25", model_path=model_path,
+                                 dataset_path=dataset_path,
+                                 artifact_path=path / "userknn")
+    return specs
+
+
+def generate(
+    path: tp.Union[str, Path],
+    n_users: int = 10_000,
+    n_items: int = 2_000,
+    n_interactions: int = 100_000,
+    alpha: float = 1.0,
+    seed: int = 0,
+) -> tp.Dict[str, ModelSpec]:
+    """
+    Датасет и модели в директории path. Описания моделей сохраняются в
+    models.json (формат переменной окружения MODELS сервиса)
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    interactions = make_interactions(n_users, n_items, n_interactions,
+                                     alpha, seed)
+    interactions.to_csv(path / INTERACTIONS_FILE, index=False)
+    specs = build_models(path, interactions, seed)
+    with open(path / "models.json", "w") as f:
+        json.dump({name: json.loads(spec.json())
+                   for name, spec in specs.items()}, f, indent=2)
+    return specs
+
+
+def load_specs(path: tp.Union[str, Path]) -> tp.Dict[str, ModelSpec]:
+    with open(Path(path) / "models.json") as f:
+        return {name: ModelSpec(**spec) for name, spec in json.load(f).items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--n-users", type=int, default=10_000)
+    parser.add_argument("--n-items", type=int, default=2_000)
+    parser.add_argument("--n-interactions", type=int, default=100_000)
+    parser.add_argument("--alpha", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    generate(args.out, args.n_users, args.n_items, args.n_interactions,
+             args.alpha, args.seed)
@@ -0,0 +1,52 @@
+"""
+Микро-бенчмарк поиска теплого пользователя: линейный проход np.where
+против UserIndex на масштабе Kion (~1М пользователей).
+
+Запуск: python -m benchmarks.user_index --n-users 1000000
+"""
+import argparse
+import json
+import timeit
+
+import numpy as np
+
+from service.user_index import UserIndex
+
+
+def scan(external_ids: np.ndarray, user_id: int) -> bool:
+    return len(np.where(external_ids == user_id)[0]) != 0
+
+
+def run(n_users: int, n_queries: int, seed: int = 42) -> dict:
+    rng = np.random.default_rng(seed)
+    # внешние id разрежены и перемешаны, как в IdMap rectools
+    external_ids = rng.choice(n_users * 2, size=n_users, replace=False)
+    queries = rng.integers(0, n_users * 2, size=n_queries)
+
+    started = timeit.default_timer()
+    index = UserIndex(external_ids)
+    build_s = timeit.default_timer() - started
+
+    scan_s = timeit.timeit(
+        lambda: [scan(external_ids, q) for q in queries], number=1)
+    index_s = timeit.timeit(
+        lambda: [index.lookup(q) for q in queries], number=1)
+    batch_s = timeit.timeit(lambda: index.lookup_many(queries), number=1)
+
+    return {
+        "n_users": n_users,
+        "n_queries": n_queries,
+        "build_s": round(build_s, 4),
+        "scan_us_per_query": round(scan_s / n_queries * 1e6, 2),
+        "index_us_per_query": round(index_s / n_queries * 1e6, 2),
+        "index_batch_us_per_query": round(batch_s / n_queries * 1e6, 3),
+        "speedup": round(scan_s / index_s, 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n-users", type=int, default=1_000_000)
+    parser.add_argument("--n-queries", type=int, default=200)
+    args = parser.parse_args()
+    print(json.dumps(run(args.n_users, args.n_queries), indent=2))
@@ -1,7 +1,7 @@
 from multiprocessing import cpu_count
 from os import getenv as env
 
-from service import log, settings
+from service import log, memory, metrics, settings
 
 # The socket to bind.
 host = env("HOST", "0.0.0.0")
@@ -72,6 +72,8 @@ limit_request_fields = env("GUNICORN_LIMIT_REQUEST_FIELDS", 64)
 limit_request_field_size = env("GUNICORN_LIMIT_REQUEST_FIELD_SIZE", 128)
 
 # Load application code before the worker processes are forked.
+# Models are then loaded once in the master and shared with workers
+# via copy-on-write (see when_ready below).
 preload_app = env("GUNICORN_PRELOAD_APP", False)
 
 # Disables the use of sendfile.
@@ -103,3 +105,30 @@ tmp_upload_dir = env("GUNICORN_TMP_UPLOAD_DIR", None)
 
 # Front-end’s IPs from which allowed to handle set secure headers.
 forwarded_allow_ips = env("GUNICORN_FORWARDER_ALLOW_IPS", "127.0.0.1")
+
+
+def on_starting(server):
+    """Drop metric snapshots left by the previous run."""
+    metrics_dir = settings.get_config().metrics_dir
+    if metrics_dir is not None:
+        metrics.clear(metrics_dir)
+
+
+def when_ready(server):
+    """Load models in the master before the workers are forked."""
+    if server.cfg.preload_app:
+        server.app.wsgi().state.models.warmup()
+        memory.freeze_gc()
+        server.log.info(f"Master memory: {memory.memory_report()}")
+
+
+def post_worker_init(worker):
+    """Report shared vs private memory of a freshly started worker."""
+    worker.log.info(f"Worker {worker.pid} memory: {memory.memory_report()}")
+
+
+def child_exit(server, worker):
+    """Keep counters of the exited worker, but drop its gauges."""
+    metrics_dir = settings.get_config().metrics_dir
+    if metrics_dir is not None:
+        metrics.mark_process_dead(worker.pid, metrics_dir)
@@ -0,0 +1,287 @@
+"""
+Приближенный поиск айтемов по скалярному произведению (ANN) для
+векторных моделей.
+
+IVFIndex - инвертированные списки: векторы айтемов разбиваются k-means
+на n_lists ячеек, запрос скорит центроиды, берет n_probe лучших ячеек
+и точно считает скоры только их айтемов. n_lists задается при
+построении, n_probe - при поиске: чем больше n_probe, тем выше recall
+и дольше запрос (n_probe = n_lists - точный поиск).
+
+Индекс строится офлайн по векторам айтемов модели и хранится в
+директории с массивами .npy и meta.json; при обслуживании массивы
+открываются через memory-map. Подключается к модели через
+ModelSpec.ann_path; в meta.json хранятся количество айтемов, размерность
+и версия модели, индекс другой модели или версии не подключается.
+
+Построение: python -m service.ann --model LightFM_0.078294 \
+    --out service/models/LightFM_0.078294/ivf --n-lists 256
+"""
+import argparse
+import json
+import typing as tp
+from pathlib import Path
+
+import numpy as np
+from scipy import sparse
+
+from .scorers import top_k
+from .settings import ModelSpec
+
+INDEX_VERSION = 1
+META_FILE = "meta.json"
+
+
+def assign_cells(
+    vectors: np.ndarray,
+    centroids: np.ndarray,
+    block_size: int = 65_536,
+) -> np.ndarray:
+    """
+    Ближайший (по евклидову расстоянию) центроид для каждого вектора
+    """
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    result = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), block_size):
+        block = vectors[start:start + block_size]
+        # |v - c|^2 = |v|^2 - 2 v.c + |c|^2, |v|^2 на выбор не влияет
+        result[start:start + len(block)] = np.argmin(
+            centroid_norms - 2 * block @ centroids.T, axis=1)
+    return result
+
+
+def kmeans(
+    vectors: np.ndarray,
+    n_clusters: int,
+    n_iter: int = 10,
+    seed: int = 0,
+) -> np.ndarray:
+    """
+    Центроиды k-means (алгоритм Ллойда, старт со случайных векторов)
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters,
+                                   replace=False)].astype(np.float32)
+    for _ in range(n_iter):
+        cells = assign_cells(vectors, centroids)
+        membership = sparse.csr_matrix(
+            (np.ones(len(vectors), dtype=np.float32),
+             (cells, np.arange(len(vectors)))),
+            shape=(n_clusters, len(vectors)))
+        counts = np.bincount(cells, minlength=n_clusters)
+        # пустые ячейки сохраняют прежний центроид
+        filled = counts > 0
+        centroids[filled] = (membership @ vectors)[filled] \
+            / counts[filled, np.newaxis]
+    return centroids
+
+
+class IVFIndex:
+    """
+    Индекс с инвертированными списками. Айтемы ячейки c лежат в
+    items[indptr[c]:indptr[c + 1]], их векторы - в тех же строках
+    vectors, так что кандидаты ячейки читаются одним срезом.
+    """
+    kind = "ivf"
+
+    def __init__(
+        self,
+        centroids: np.ndarray,
+        indptr: np.ndarray,
+        items: np.ndarray,
+        vectors: np.ndarray,
+        n_probe: int = 8,
+        model_version: tp.Optional[str] = None,
+    ) -> None:
+        self.centroids = centroids
+        self.indptr = indptr
+        self.items = items
+        self.vectors = vectors
+        self.n_probe = n_probe
+        # версия модели, по векторам которой построен индекс
+        self.model_version = model_version
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @property
+    def n_items(self) -> int:
+        return len(self.items)
+
+    @property
+    def dim(self) -> int:
+        return self.vectors.shape[1]
+
+    @classmethod
+    def build(
+        cls,
+        item_vectors: np.ndarray,
+        n_lists: tp.Optional[int] = None,
+        n_iter: int = 10,
+        n_probe: int = 8,
+        seed: int = 0,
+        model_version: tp.Optional[str] = None,
+    ) -> "IVFIndex":
+        """
+        Построение индекса по векторам айтемов
+        :param item_vectors: матрица [n_items, dim], строка - внутренний
+        id айтема
+        :param n_lists: количество ячеек (по умолчанию sqrt(n_items))
+        :param n_probe: количество просматриваемых ячеек по умолчанию
+        :param model_version: версия модели векторов
+        """
+        item_vectors = np.asarray(item_vectors, dtype=np.float32)
+        if n_lists is None:
+            n_lists = max(1, int(np.sqrt(len(item_vectors))))
+        n_lists = min(n_lists, len(item_vectors))
+        centroids = kmeans(item_vectors, n_lists, n_iter, seed)
+        cells = assign_cells(item_vectors, centroids)
+        order = np.argsort(cells, kind="stable").astype(np.int32)
+        indptr = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cells, minlength=n_lists), out=indptr[1:])
+        return cls(centroids, indptr, order, item_vectors[order],
+                   min(n_probe, n_lists), model_version)
+
+    def search(
+        self,
+        queries: np.ndarray,
+        k: int,
+        viewed: tp.Optional[tp.Sequence[np.ndarray]] = None,
+        n_probe: tp.Optional[int] = None,
+    ) -> np.ndarray:
+        """
+        Поиск айтемов с наибольшим скалярным произведением
+        :param queries: матрица [n_queries, dim] векторов пользователей
+        :param k: количество айтемов
+        :param viewed: айтемы, исключаемые для каждого запроса
+        :param n_probe: количество просматриваемых ячеек
+        :return: матрица [n_queries, k] внутренних id айтемов, -1 для
+        пустых позиций
+        """
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+        queries = np.asarray(queries, dtype=np.float32)
+        result = np.full((len(queries), k), -1, dtype=np.int32)
+        cell_scores = queries @ self.centroids.T
+        if n_probe < self.n_lists:
+            probes = np.argpartition(-cell_scores, n_probe - 1,
+                                     axis=1)[:, :n_probe]
+        else:
+            probes = np.tile(np.arange(self.n_lists), (len(queries), 1))
+        for i, query in enumerate(queries):
+            starts = self.indptr[probes[i]]
+            lengths = self.indptr[probes[i] + 1] - starts
+            positions = np.arange(lengths.sum()) \
+                + np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+            candidates = self.items[positions]
+            scores = self.vectors[positions] @ query
+            if viewed is not None and len(viewed[i]):
+                scores[np.isin(candidates, viewed[i])] = -np.inf
+            top = top_k(scores[np.newaxis], k)[0]
+            result[i] = np.where(top >= 0, candidates[top], -1)
+        return result
+
+    def save(self, path: tp.Union[str, Path]) -> Path:
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        for name in ("centroids", "indptr", "items", "vectors"):
+            np.save(path / f"{name}.npy", getattr(self, name))
+        # meta.json пишется последним: без него индекс не загружается
+        with open(path / META_FILE, "w") as f:
+            json.dump({"version": INDEX_VERSION, "kind": self.kind,
+                       "n_probe": self.n_probe, "n_items": self.n_items,
+                       "dim": self.dim,
+                       "model_version": self.model_version}, f)
+        return path
+
+    @classmethod
+    def load(
+        cls,
+        path: tp.Union[str, Path],
+        meta: dict,
+        mmap_mode: tp.Optional[tp.Literal["r", "r+", "w+", "c"]] = "r",
+    ) -> "IVFIndex":
+        path = Path(path)
+        centroids, indptr, items, vectors = (
+            np.load(path / f"{name}.npy", mmap_mode=mmap_mode)
+            for name in ("centroids", "indptr", "items", "vectors"))
+        return cls(centroids, indptr, items, vectors, n_probe=meta["n_probe"],
+                   model_version=meta.get("model_version"))
+
+
+INDEX_KINDS = {IVFIndex.kind: IVFIndex}
+
+
+def load_index(
+    path: tp.Union[str, Path],
+    n_probe: tp.Optional[int] = None,
+) -> IVFIndex:
+    """
+    Загрузка индекса по его meta.json
+    :param n_probe: переопределение n_probe, сохраненного при построении
+    """
+    path = Path(path)
+    with open(path / META_FILE) as f:
+        meta = json.load(f)
+    if meta.get("version") != INDEX_VERSION \
+            or meta.get("kind") not in INDEX_KINDS:
+        raise ValueError(f"Unsupported ANN index in {path}")
+    index = INDEX_KINDS[meta["kind"]].load(path, meta)
+    if n_probe is not None:
+        index.n_probe = n_probe
+    return index
+
+
+def check_index(
+    index: IVFIndex,
+    item_vectors: np.ndarray,
+    model_version: str,
+) -> None:
+    """
+    Проверка, что индекс построен по векторам этой версии модели
+    """
+    if (index.n_items, index.dim) != item_vectors.shape:
+        raise ValueError(
+            f"ANN index has {index.n_items} items of dim {index.dim}, "
+            f"model has {item_vectors.shape[0]} of dim "
+            f"{item_vectors.shape[1]}")
+    if index.model_version != model_version:
+        raise ValueError(
+            f"ANN index is built for model version {index.model_version}, "
+            f"model version is {model_version}")
+
+
+def build_model_index(
+    spec: ModelSpec,
+    path: tp.Union[str, Path],
+    n_lists: tp.Optional[int] = None,
+    n_iter: int = 10,
+    n_probe: int = 8,
+) -> IVFIndex:
+    """
+    Построение и сохранение индекса векторной модели из конфига
+    """
+    from .registry import load_model
+
+    # ann_path из описания может указывать на еще не построенный индекс
+    model = load_model(spec.copy(update={"ann_path": None}))
+    index = IVFIndex.build(model.scorer.item_vectors, n_lists=n_lists,
+                           n_iter=n_iter, n_probe=n_probe,
+                           model_version=model.version)
+    index.save(path)
+    return index
+
+
+if __name__ == "__main__":
+    from .settings import get_config
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", required=True)
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--n-lists", type=int)
+    parser.add_argument("--n-probe", type=int, default=8)
+    parser.add_argument("--n-iter", type=int, default=10)
+    args = parser.parse_args()
+    build_model_index(get_config().models[args.model], args.out,
+                      n_lists=args.n_lists, n_iter=args.n_iter,
+                      n_probe=args.n_probe)
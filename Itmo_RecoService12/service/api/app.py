@@ -2,20 +2,63 @@ import asyncio
 from concurrent.futures.thread import ThreadPoolExecutor
 from typing import Any, Dict
 
-import pandas as pd
 import uvloop
 from fastapi import FastAPI
 
 from .exception_handlers import add_exception_handlers
 from .middlewares import add_middlewares
 from .views import add_views
+from ..batching import ModelBatchers
+from ..cache import RecoCache
+from ..executors import ModelExecutors
+from ..first import FirstReco
+from ..interactions import load_interactions
 from ..log import app_logger, setup_logging
-from ..make_reco import KionReco
+from ..metrics import (
+    CACHE_BYTES,
+    CACHE_ENTRIES,
+    CACHE_EVICTIONS,
+    CACHE_HITS,
+    CACHE_MISSES,
+    EXECUTOR_QUEUED,
+    METRICS,
+    MetricsWriter,
+)
+from ..registry import ModelRegistry, ModelWatcher
 from ..settings import ServiceConfig
 
 __all__ = ("create_app",)
 
 
+def add_metrics(app: FastAPI, config: ServiceConfig) -> None:
+    """
+    Перенос статистики кеша и пулов в метрики и запуск сохранения
+    снимков метрик воркера
+    """
+    def collect() -> None:
+        cache = app.state.reco_cache
+        if cache is not None:
+            stats = cache.stats()
+            CACHE_ENTRIES.set(stats["entries"])
+            CACHE_BYTES.set(stats["bytes"])
+            for name, model_stats in stats["models"].items():
+                CACHE_HITS.set(model_stats["hits"], name)
+                CACHE_MISSES.set(model_stats["misses"], name)
+                CACHE_EVICTIONS.set(model_stats["evictions"], name)
+        for name, pool_stats in app.state.executors.stats().items():
+            EXECUTOR_QUEUED.set(pool_stats["queued"], name)
+
+    METRICS.add_collector("app", collect)
+    app.state.metrics_dir = config.metrics_dir
+    app.state.timing_sample_rate = config.timing_sample_rate
+    # как и наблюдатель моделей, запускается в каждом воркере
+    if config.metrics_dir is not None:
+        writer = MetricsWriter(METRICS, config.metrics_dir,
+                               interval=config.metrics_flush_interval)
+        app.add_event_handler("startup", writer.start)
+        app.add_event_handler("shutdown", writer.stop)
+
+
 def setup_asyncio(thread_name_prefix: str) -> None:
     uvloop.install()
 
@@ -36,19 +79,43 @@ def create_app(config: ServiceConfig) -> FastAPI:
     setup_asyncio(thread_name_prefix=config.service_name)
     app = FastAPI(debug=False)
     app.state.k_recs = config.k_recs
+    app.state.max_batch_size = config.max_batch_size
     app.state.items_path = config.items_path
-    # Импортируем из конфига наименование модели
-    app.state.models = config.models
+    # реестр моделей: модели грузятся при первом обращении
+    app.state.models = ModelRegistry(config.models)
+    if config.warmup_models:
+        app.state.models.warmup()
+    # кеш рекомендаций перед моделями
+    app.state.reco_cache = RecoCache(
+        max_entries=config.cache_max_entries,
+        max_bytes=config.cache_max_bytes,
+        ttl=config.cache_ttl,
+    ) if config.cache_enabled else None
+    # после подмены модели ее записи в кеше больше не нужны
+    if app.state.reco_cache is not None:
+        app.state.models.add_listener(app.state.reco_cache.invalidate)
+    # расчет рекомендаций в пулах, чтобы не блокировать event loop
+    app.state.executors = ModelExecutors(app.state.models)
+    app.state.models.add_listener(app.state.executors.reset)
+    app.add_event_handler("shutdown", app.state.executors.shutdown)
+    app.state.batchers = ModelBatchers(app.state.models, app.state.executors)
     # поднимаем и подготавливаем данные
-    a = pd.read_csv(config.items_path)[["user_id", "item_id"]]
-    app.state.item_list = list(a["item_id"].unique())
-    app.state.items = a.groupby("user_id").agg(
-        {"item_id": lambda x: sorted(list(x))}).reset_index()
+    app.state.first = FirstReco.from_user_items(load_interactions(
+        config.items_path, config.interactions_cache_dir))
 
     # инициализируем класс с рекомендациями
     # app.state.lightfm_0077652 = KionReco(config.lightfm_path,
     #                                      config.dataset_path)
 
+    # наблюдатель запускается в каждом воркере: потоки не переживают fork
+    if config.model_watch_interval is not None:
+        watcher = ModelWatcher(app.state.models,
+                               interval=config.model_watch_interval,
+                               k_recos=config.k_recs)
+        app.add_event_handler("startup", watcher.start)
+        app.add_event_handler("shutdown", watcher.stop)
+
+    add_metrics(app, config)
     add_views(app)
     add_middlewares(app)
     add_exception_handlers(app)
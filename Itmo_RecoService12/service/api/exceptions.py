@@ -54,3 +54,31 @@ class NotAuthorizedError(AppException):
         error_loc: tp.Optional[tp.Sequence[str]] = None,
     ):
         super().__init__(status_code, error_key, error_message, error_loc)
+
+
+class BatchTooLargeError(AppException):
+    """
+    Исключение при превышении размера пачки пользователей
+    """
+    def __init__(
+        self,
+        status_code: int = HTTPStatus.UNPROCESSABLE_ENTITY,
+        error_key: str = "batch_too_large",
+        error_message: str = "Too many users in batch",
+        error_loc: tp.Optional[tp.Sequence[str]] = None,
+    ):
+        super().__init__(status_code, error_key, error_message, error_loc)
+
+
+class ReloadInProgressError(AppException):
+    """
+    Исключение при повторной перезагрузке модели, пока идет предыдущая
+    """
+    def __init__(
+        self,
+        status_code: int = HTTPStatus.CONFLICT,
+        error_key: str = "reload_in_progress",
+        error_message: str = "Model is already reloading",
+        error_loc: tp.Optional[tp.Sequence[str]] = None,
+    ):
+        super().__init__(status_code, error_key, error_message, error_loc)
@@ -1,3 +1,4 @@
+import random
 import time
 
 from fastapi import FastAPI, Request
@@ -8,9 +9,12 @@ from starlette.middleware.base import (
 from starlette.middleware.cors import CORSMiddleware
 from starlette.responses import Response
 
+from service.api.views import model_exists
 from service.log import access_logger, app_logger
+from service.metrics import REQUEST_LATENCY, STAGE_LATENCY
 from service.models import Error
 from service.response import server_error
+from service.spans import DEBUG_HEADER, start_trace, stop_trace
 
 
 class AccessMiddleware(BaseHTTPMiddleware):
@@ -20,12 +24,35 @@ class AccessMiddleware(BaseHTTPMiddleware):
         request: Request,
         call_next: RequestResponseEndpoint,
     ) -> Response:
+        # замер этапов: по отладочному заголовку или для выборки запросов
+        debug = DEBUG_HEADER in request.headers
+        sample_rate = request.app.state.timing_sample_rate
+        trace = None
+        if debug or (sample_rate > 0 and random.random() < sample_rate):
+            trace, token = start_trace()
+
         started_at = time.perf_counter()
         response = await call_next(request)
         request_time = time.perf_counter() - started_at
 
+        if trace is not None:
+            stop_trace(token)
+            trace.add("total", request_time)
+            for stage, duration in trace.stages.items():
+                STAGE_LATENCY.observe(duration, stage)
+            if debug:
+                response.headers["Server-Timing"] = trace.server_timing()
+
         status_code = response.status_code
 
+        # параметры пути заполняет роутер в общем scope запроса
+        model_name = request.scope.get("path_params", {}).get("model_name")
+        if model_name is not None:
+            # произвольные названия из URL не размножают метки метрик
+            if not model_exists(request, model_name):
+                model_name = "unknown"
+            REQUEST_LATENCY.observe(request_time, model_name, status_code)
+
         access_logger.info(
             msg="",
             extra={
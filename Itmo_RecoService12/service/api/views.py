@@ -1,15 +1,23 @@
-from random import sample
-from typing import List
+from http import HTTPStatus
+from pathlib import Path
+from typing import Any, AsyncIterator, List, Optional
 
-from fastapi import APIRouter, FastAPI, Request, Depends, Security
+import numpy as np
+from fastapi import APIRouter, FastAPI, Request, Response, Depends, \
+    Query, Security
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.security.api_key import APIKeyQuery, APIKeyHeader, APIKey
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 
+from service.first import FIRST_MODEL
 from service.api.exceptions import UserNotFoundError, ModelNotFoundError, \
-    NotAuthorizedError
+    NotAuthorizedError, BatchTooLargeError, ReloadInProgressError
 from service.log import app_logger
+from service.metrics import CONTENT_TYPE, METRICS, REQUESTS_IN_FLIGHT
+from service.response import TimedJSONResponse
 from service.settings import ServiceConfig, get_config
+from service.spans import span
 
 
 class RecoResponse(BaseModel):
@@ -17,8 +25,33 @@ class RecoResponse(BaseModel):
     items: List[int]
 
 
+class BatchRecoRequest(BaseModel):
+    user_ids: List[int]
+
+
+class BatchRecoResponse(BaseModel):
+    recos: List[RecoResponse]
+
+
+class ReloadRequest(BaseModel):
+    """
+    Новые пути к файлам модели, не заданные берутся из текущего описания
+    """
+    model_path: Optional[Path] = None
+    dataset_path: Optional[Path] = None
+    table_path: Optional[Path] = None
+    artifact_path: Optional[Path] = None
+
+
+# заголовок ответа с версией модели, посчитавшей рекомендации
+MODEL_VERSION_HEADER = "X-Model-Version"
+# количество пользователей в выгрузке после курсора
+EXPORT_USERS_HEADER = "X-Export-Users"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
 sfg = Depends(get_config)
-router = APIRouter()
+router = APIRouter(default_response_class=TimedJSONResponse)
 
 API_KEY_NAME = "SECRET_TOKEN"
 
@@ -35,31 +68,36 @@ async def get_api_key(
 ):
     SECRET_TOKEN = config.secret_token
 
-    if api_key_query == SECRET_TOKEN:
-        return api_key_query
-    elif api_key_header == SECRET_TOKEN:
-        return api_key_header
-    if token is not None and token.credentials == SECRET_TOKEN:
-        return token.credentials
+    with span("auth"):
+        if api_key_query == SECRET_TOKEN:
+            return api_key_query
+        elif api_key_header == SECRET_TOKEN:
+            return api_key_header
+        if token is not None and token.credentials == SECRET_TOKEN:
+            return token.credentials
 
     raise NotAuthorizedError()
 
 
-def make_reco_first(items_, item_list_, user_id_, k_recs_=10) -> list:
+def model_exists(request: Request, model_name: str) -> bool:
+    return (model_name == FIRST_MODEL
+            or model_name in request.app.state.models)
+
+
+async def track_in_flight(
+    request: Request,
+    model_name: str,
+) -> AsyncIterator[None]:
     """
-    Формируем рекомендации для модели под названием first
+    Учет запросов к модели в обработке
     """
-    # формируем массив с рекомендациями
-    rec = items_[items_["user_id"] == user_id_]["item_id"].values
-    # проверяем на пустой результат
-    if len(rec) == 0:
-        rec = sample(item_list_, k=k_recs_)
-    else:
-        rec = rec[0][:k_recs_]
-        if len(rec) < k_recs_:
-            rec.extend(
-                sample(list(set(item_list_) - set(rec)), k=k_recs_ - len(rec)))
-    return rec
+    if not model_exists(request, model_name):
+        model_name = "unknown"
+    REQUESTS_IN_FLIGHT.inc(model_name)
+    try:
+        yield
+    finally:
+        REQUESTS_IN_FLIGHT.dec(model_name)
 
 
 @router.get(
@@ -71,15 +109,190 @@ async def health() -> str:
     return "I am alive"
 
 
+@router.get(
+    path="/metrics",
+    tags=["Health"],
+    response_class=PlainTextResponse,
+)
+async def metrics(request: Request) -> PlainTextResponse:
+    return PlainTextResponse(
+        METRICS.render(request.app.state.metrics_dir),
+        media_type=CONTENT_TYPE)
+
+
+@router.get(
+    path="/cache/stats",
+    tags=["Health"],
+)
+async def cache_stats(
+    request: Request,
+    api_key: APIKey = Depends(get_api_key)
+) -> dict:
+    cache = request.app.state.reco_cache
+    return {} if cache is None else cache.stats()
+
+
+@router.get(
+    path="/executors/stats",
+    tags=["Health"],
+)
+async def executors_stats(
+    request: Request,
+    api_key: APIKey = Depends(get_api_key)
+) -> dict:
+    return request.app.state.executors.stats()
+
+
+@router.get(
+    path="/batching/stats",
+    tags=["Health"],
+)
+async def batching_stats(
+    request: Request,
+    api_key: APIKey = Depends(get_api_key)
+) -> dict:
+    return request.app.state.batchers.stats()
+
+
+@router.get(
+    path="/admin/models",
+    tags=["Admin"],
+)
+async def models_status(
+    request: Request,
+    api_key: APIKey = Depends(get_api_key)
+) -> dict:
+    return request.app.state.models.status()
+
+
+@router.post(
+    path="/admin/models/{model_name}/reload",
+    tags=["Admin"],
+    status_code=HTTPStatus.ACCEPTED,
+    responses={404: {"description": "Model not found"},
+               401: {"description": "Authorization failed"},
+               409: {"description": "Model is already reloading"}},
+)
+async def reload_model(
+    request: Request,
+    model_name: str,
+    paths: Optional[ReloadRequest] = None,
+    api_key: APIKey = Depends(get_api_key)
+) -> dict:
+    app_logger.info(f"Reload request for model: {model_name}")
+    models = request.app.state.models
+    if model_name not in models:
+        raise ModelNotFoundError(error_message=f"Model {model_name} not found")
+
+    spec = models.specs[model_name]
+    if paths is not None:
+        spec = spec.copy(update=paths.dict(exclude_none=True))
+    # новая версия грузится и проверяется в фоне, до подмены запросы
+    # обслуживает текущая
+    if not models.reload_in_background(model_name, spec,
+                                       request.app.state.k_recs):
+        raise ReloadInProgressError(
+            error_message=f"Model {model_name} is already reloading")
+    return {"model": model_name, "status": "reloading"}
+
+
+async def export_lines(
+    request: Request,
+    model_name: str,
+    model: Any,
+    user_ids: np.ndarray,
+    k_recs: int,
+    block_size: int,
+) -> AsyncIterator[str]:
+    """
+    Строки NDJSON выгрузки. Следующий блок считается только после
+    отправки предыдущего (StreamingResponse ждет записи в сокет), поэтому
+    в памяти один блок при любом количестве пользователей.
+    """
+    for start in range(0, len(user_ids), block_size):
+        block = user_ids[start:start + block_size]
+        if model_name == FIRST_MODEL:
+            recos = model.reco_many(block, k_recs)
+        else:
+            # пакетный расчет в пуле модели, выдача та же, что у
+            # /reco/{model_name}/{user_id}
+            recos = await request.app.state.executors.call(
+                model_name, model, "reco_many", block, k_recs)
+        yield "".join(
+            f'{{"user_id": {user_id}, "items": '
+            f'[{", ".join(map(str, rec))}]}}\n'
+            for user_id, rec in zip(block.tolist(), recos))
+
+
+@router.get(
+    path="/reco/{model_name}/export",
+    tags=["Recommendations"],
+    response_class=StreamingResponse,
+    responses={200: {"content": {NDJSON_MEDIA_TYPE: {}}},
+               404: {"description": "Model not found"},
+               401: {"description": "Authorization failed"}},
+    dependencies=[Depends(track_in_flight)],
+)
+async def export_reco(
+    request: Request,
+    model_name: str,
+    cursor: Optional[int] = Query(
+        None, description="user_id последней полученной строки: "
+                          "выгрузка продолжается со следующего"),
+    limit: Optional[int] = Query(None, ge=1),
+    api_key: APIKey = Depends(get_api_key)
+) -> StreamingResponse:
+    """
+    Рекомендации всех теплых пользователей модели в формате NDJSON
+    (строка {"user_id": ..., "items": [...]}) по возрастанию user_id
+    """
+    app_logger.info(
+        f"Export request for model: {model_name}, cursor: {cursor}")
+
+    # проверка на существование модели, если нет - выдать ошибку
+    if not model_exists(request, model_name):
+        raise ModelNotFoundError(error_message=f"Model {model_name} not found")
+
+    if model_name == FIRST_MODEL:
+        model = request.app.state.first
+        version = model_name
+    else:
+        model = request.app.state.executors.model(model_name)
+        version = request.app.state.models.version(model_name)
+
+    # курсор - id пользователя, а не номер строки: после перезагрузки
+    # модели выгрузка продолжается с того же места
+    if model is None:
+        # модель загружена только в пуле процессов
+        user_ids = np.sort(await request.app.state.executors.call(
+            model_name, model, "warm_users"))
+    else:
+        user_ids = model.user_index.sorted_ids
+    if cursor is not None:
+        user_ids = user_ids[np.searchsorted(user_ids, cursor, side="right"):]
+    if limit is not None:
+        user_ids = user_ids[:limit]
+
+    return StreamingResponse(
+        export_lines(request, model_name, model, user_ids,
+                     request.app.state.k_recs,
+                     request.app.state.max_batch_size),
+        media_type=NDJSON_MEDIA_TYPE,
+        headers={MODEL_VERSION_HEADER: version,
+                 EXPORT_USERS_HEADER: str(len(user_ids))})
+
+
 @router.get(
     path="/reco/{model_name}/{user_id}",
     tags=["Recommendations"],
     response_model=RecoResponse,
     responses={404: {"description": "User/model not found"},
                401: {"description": "Authorization failed"}},
+    dependencies=[Depends(track_in_flight)],
 )
 async def get_reco(
     request: Request,
+    response: Response,
     model_name: str,
     user_id: int,
     api_key: APIKey = Depends(get_api_key)
@@ -87,7 +300,7 @@ async def get_reco(
     app_logger.info(f"Request for model: {model_name}, user_id: {user_id}")
 
     # проверка на существование модели, если нет - выдать ошибку
-    if model_name not in request.app.state.models:
+    if not model_exists(request, model_name):
         raise ModelNotFoundError(error_message=f"Model {model_name} not found")
 
     # проверка допустимости пользователя, если нет - ошибка
@@ -97,23 +310,98 @@ async def get_reco(
     k_recs = request.app.state.k_recs
 
     # обрабатываем запрос к модели first
-    if model_name == 'first':
-        # получаем данные по пользователям и позициям из настроек
-        items = request.app.state.items
-        item_list = request.app.state.item_list
-        rec = make_reco_first(items_=items,
-                              item_list_=item_list,
-                              user_id_=user_id,
-                              k_recs_=k_recs)
-        return RecoResponse(user_id=user_id, items=rec)
-
+    if model_name == FIRST_MODEL:
+        model = request.app.state.first
+        version = model_name
     # обрабатываем запрос к моделям
     else:
-        model = request.app.state.models.get(model_name)
-        return RecoResponse(user_id=user_id,
-                            items=list(model.reco(
-                                user_id=user_id,
-                                k_recos=k_recs)))
+        # для пула процессов модель в воркере не загружается
+        model = request.app.state.executors.model(model_name)
+        version = request.app.state.models.version(model_name)
+
+    # повторные запросы отдаются из кеша
+    cache = request.app.state.reco_cache
+    key = (model_name, version, user_id, k_recs)
+    with span("cache"):
+        rec = None if cache is None else cache.get(key)
+    if rec is None:
+        with span("scoring"):
+            if model_name == FIRST_MODEL:
+                rec = model.reco(user_id, k_recs)
+            # одновременные запросы считаются одной пачкой, если для
+            # модели включен микробатчинг
+            elif request.app.state.batchers.get(model_name) is not None:
+                rec = await request.app.state.batchers.get(model_name).reco(
+                    user_id, k_recs)
+            # расчет в пуле модели, event loop не блокируется
+            else:
+                rec = await request.app.state.executors.call(
+                    model_name, model, "reco", user_id, k_recs)
+        if cache is not None:
+            rec = cache.put(key, rec)
+    response.headers[MODEL_VERSION_HEADER] = version
+    with span("validation"):
+        return RecoResponse(user_id=user_id, items=list(rec))
+
+
+@router.post(
+    path="/reco/{model_name}/batch",
+    tags=["Recommendations"],
+    response_model=BatchRecoResponse,
+    responses={404: {"description": "User/model not found"},
+               401: {"description": "Authorization failed"},
+               422: {"description": "Batch is too large"}},
+    dependencies=[Depends(track_in_flight)],
+)
+async def get_reco_batch(
+    request: Request,
+    response: Response,
+    model_name: str,
+    batch: BatchRecoRequest,
+    api_key: APIKey = Depends(get_api_key)
+) -> BatchRecoResponse:
+    user_ids = batch.user_ids
+    app_logger.info(
+        f"Batch request for model: {model_name}, users: {len(user_ids)}")
+
+    # проверка на существование модели, если нет - выдать ошибку
+    if not model_exists(request, model_name):
+        raise ModelNotFoundError(error_message=f"Model {model_name} not found")
+
+    # проверка размера пачки
+    max_batch_size = request.app.state.max_batch_size
+    if len(user_ids) > max_batch_size:
+        raise BatchTooLargeError(
+            error_message=f"Batch size {len(user_ids)} exceeds "
+                          f"{max_batch_size}")
+
+    # проверка допустимости пользователей, если нет - ошибка
+    for user_id in user_ids:
+        if user_id > 10 ** 9:
+            raise UserNotFoundError(error_message=f"User {user_id} not found")
+    k_recs = request.app.state.k_recs
+
+    # обрабатываем запрос к модели first
+    if model_name == FIRST_MODEL:
+        version = model_name
+        with span("scoring"):
+            recos = request.app.state.first.reco_many(user_ids, k_recs)
+    # теплые пользователи считаются одним вызовом модели
+    else:
+        # для пула процессов модель в воркере не загружается
+        model = request.app.state.executors.model(model_name)
+        version = request.app.state.models.version(model_name)
+        with span("scoring"):
+            recos = await request.app.state.executors.call(
+                model_name, model, "reco_many", user_ids, k_recs)
+
+    response.headers[MODEL_VERSION_HEADER] = version
+
+    with span("validation"):
+        return BatchRecoResponse(recos=[
+            RecoResponse(user_id=user_id, items=list(rec))
+            for user_id, rec in zip(user_ids, recos)
+        ])
 
 
 def add_views(app: FastAPI) -> None:
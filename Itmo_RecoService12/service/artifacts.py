@@ -0,0 +1,151 @@
+"""
+Бинарный формат артефактов моделей вместо dill.
+
+Артефакт - директория версии модели с массивами NumPy (.npy) и
+манифестом manifest.json: тип модели, метаданные, dtype/shape и
+sha256 каждого массива. Массивы открываются через
+np.load(mmap_mode="r"), поэтому загрузка почти мгновенная, а страницы
+памяти разделяются воркерами gunicorn через page cache ОС.
+
+Экспорт: python -m service.artifacts --model userknn_BM25Recommender \
+    --out service/models/userknn_BM25Recommender/v1
+"""
+import argparse
+import hashlib
+import json
+import time
+import typing as tp
+from pathlib import Path
+
+import numpy as np
+
+FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+
+
+class ArtifactError(Exception):
+    """
+    Ошибка чтения артефакта: нет манифеста, другая версия формата или
+    не совпала контрольная сумма
+    """
+
+
+def file_sha256(path: Path, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_artifact(path: tp.Union[str, Path]) -> bool:
+    return (Path(path) / MANIFEST_FILE).is_file()
+
+
+def save_artifact(
+    path: tp.Union[str, Path],
+    kind: str,
+    arrays: tp.Dict[str, tp.Optional[np.ndarray]],
+    meta: tp.Optional[dict] = None,
+) -> Path:
+    """
+    Сохранение массивов и манифеста. Манифест пишется последним, так
+    что недописанная директория не считается артефактом
+    :param path: директория версии модели
+    :param kind: класс модели (KionReco, KionRecoBM25)
+    :param arrays: массивы, None пропускаются
+    :param meta: метаданные модели
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    manifest: tp.Dict[str, tp.Any] = {
+        "format_version": FORMAT_VERSION,
+        "kind": kind,
+        "created_at": int(time.time()),
+        "meta": meta or {},
+        "arrays": {},
+    }
+    for name, array in arrays.items():
+        if array is None:
+            continue
+        array = np.ascontiguousarray(array)
+        file_name = f"{name}.npy"
+        np.save(path / file_name, array)
+        manifest["arrays"][name] = {
+            "file": file_name,
+            "dtype": array.dtype.str,
+            "shape": list(array.shape),
+            "sha256": file_sha256(path / file_name),
+        }
+    with open(path / MANIFEST_FILE, "w") as f:
+        json.dump(manifest, f, indent=2)
+    return path
+
+
+def load_artifact(
+    path: tp.Union[str, Path],
+    mmap_mode: tp.Optional[tp.Literal["r", "r+", "w+", "c"]] = "r",
+    verify: bool = True,
+) -> tp.Tuple[dict, tp.Dict[str, np.ndarray]]:
+    """
+    Чтение артефакта
+    :param path: директория версии модели
+    :param mmap_mode: режим memory-map для np.load (None - читать в память)
+    :param verify: проверять sha256 массивов
+    :return: манифест и словарь массивов
+    """
+    path = Path(path)
+    if not is_artifact(path):
+        raise ArtifactError(f"No {MANIFEST_FILE} in {path}")
+    with open(path / MANIFEST_FILE) as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ArtifactError(
+            f"Unsupported artifact format {manifest.get('format_version')}")
+
+    arrays = {}
+    for name, info in manifest["arrays"].items():
+        file_path = path / info["file"]
+        if verify and file_sha256(file_path) != info["sha256"]:
+            raise ArtifactError(f"Checksum mismatch for {file_path}")
+        array = np.load(file_path, mmap_mode=mmap_mode)
+        if array.dtype.str != info["dtype"] \
+                or list(array.shape) != info["shape"]:
+            raise ArtifactError(f"Unexpected dtype/shape in {file_path}")
+        arrays[name] = array
+    return manifest, arrays
+
+
+def export_model(model: tp.Any, path: tp.Union[str, Path]) -> Path:
+    """
+    Экспорт загруженной модели KionReco/KionRecoBM25 в артефакт
+    """
+    arrays, meta = model.to_arrays()
+    return save_artifact(path, type(model).__name__, arrays, meta)
+
+
+def import_model(
+    path: tp.Union[str, Path],
+    verify: bool = True,
+) -> tp.Any:
+    """
+    Загрузка модели из артефакта
+    """
+    from .make_reco import KionReco, KionRecoBM25
+
+    kinds = {"KionReco": KionReco, "KionRecoBM25": KionRecoBM25}
+    manifest, arrays = load_artifact(path, verify=verify)
+    if manifest["kind"] not in kinds:
+        raise ArtifactError(f"Unknown model kind {manifest['kind']}")
+    return kinds[manifest["kind"]].from_arrays(arrays, manifest["meta"])
+
+
+if __name__ == "__main__":
+    from .registry import ModelRegistry
+    from .settings import get_config
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", required=True)
+    parser.add_argument("--out", required=True)
+    args = parser.parse_args()
+    export_model(ModelRegistry(get_config().models)[args.model], args.out)
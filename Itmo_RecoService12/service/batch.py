@@ -0,0 +1,118 @@
+"""
+Пакетный расчет рекомендаций для многих пользователей.
+
+Пользователи делятся на блоки, блоки считаются методом reco_many модели
+(как в сервисе: короткие списки дополняются популярным, холодные
+пользователи получают популярное) в пуле процессов service.executors, в
+каждом из которых модель загружена один раз. Результаты отдаются по мере
+готовности, но в порядке блоков; в работе одновременно не больше двух
+блоков на процесс, поэтому память родителя не растет с числом
+пользователей.
+
+memory_budget делится между процессами: для userknn (KionRecoBM25) он
+ограничивает плотную матрицу скоров блока (UserKNNScorer), остальные
+модели его не используют.
+"""
+import multiprocessing
+import os
+import typing as tp
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import numpy as np
+import numpy.typing as npt
+
+from .executors import _call_worker_model, _init_worker, _prepare_model
+from .registry import load_model
+from .settings import ModelSpec
+
+
+def recos_matrix(
+    recos: tp.Sequence[np.ndarray],
+    k_recos: int,
+) -> np.ndarray:
+    """
+    Списки рекомендаций в матрицу [len(recos), k_recos], -1 - пустая
+    позиция
+    """
+    result = np.full((len(recos), k_recos), -1, dtype=np.int32)
+    for row, rec in zip(result, recos):
+        row[:len(rec)] = rec
+    return result
+
+
+def _reco_block(user_ids: np.ndarray, k_recos: int) -> np.ndarray:
+    return recos_matrix(_call_worker_model("reco_many", user_ids, k_recos),
+                        k_recos)
+
+
+def warm_users(spec: ModelSpec) -> np.ndarray:
+    """
+    Теплые пользователи модели. Модель загружается в отдельном
+    процессе, чтобы не держать ее копию в вызывающем.
+    """
+    with ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker, initargs=(spec,)) as pool:
+        return np.asarray(pool.submit(_call_worker_model,
+                                      "warm_users").result())
+
+
+def iter_recos(
+    spec: ModelSpec,
+    k_recos: int = 10,
+    user_ids: tp.Optional[npt.ArrayLike] = None,
+    n_workers: tp.Optional[int] = None,
+    block_size: int = 10_000,
+    memory_budget: tp.Optional[int] = None,
+) -> tp.Generator[tp.Tuple[np.ndarray, np.ndarray], None, None]:
+    """
+    Рекомендации для пользователей блоками
+    :param spec: описание модели
+    :param k_recos: количество рекомендаций
+    :param user_ids: внешние id пользователей (по умолчанию все теплые
+    пользователи модели)
+    :param n_workers: количество процессов (по умолчанию - по числу
+    ядер), при 1 расчет идет в текущем процессе
+    :param block_size: пользователей в одном блоке
+    :param memory_budget: память на расчет скоров всех процессов, байт
+    (None - по умолчанию модели)
+    :return: пары (id пользователей блока, матрица [блок, k_recos]
+    внешних id айтемов, -1 - пустая позиция)
+    """
+    n_workers = n_workers or os.cpu_count() or 1
+    if n_workers <= 1:
+        model = _prepare_model(load_model(spec), memory_budget=memory_budget)
+        users = np.asarray(model.warm_users() if user_ids is None
+                           else user_ids)
+        for start in range(0, len(users), block_size):
+            block = users[start:start + block_size]
+            yield block, recos_matrix(model.reco_many(block, k_recos),
+                                      k_recos)
+        return
+
+    if memory_budget is not None:
+        memory_budget //= n_workers
+    # spawn: процессы не наследуют потоки и состояние родителя
+    with ProcessPoolExecutor(
+            max_workers=n_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(spec, None, memory_budget)) as pool:
+        users = np.asarray(
+            pool.submit(_call_worker_model, "warm_users").result()
+            if user_ids is None else user_ids)
+        starts = iter(range(0, len(users), block_size))
+        pending: tp.Deque[tp.Tuple[np.ndarray, Future]] = deque()
+        while True:
+            while len(pending) < 2 * n_workers:
+                start = next(starts, None)
+                if start is None:
+                    break
+                block = users[start:start + block_size]
+                pending.append(
+                    (block, pool.submit(_reco_block, block, k_recos)))
+            if not pending:
+                return
+            block, future = pending.popleft()
+            yield block, future.result()
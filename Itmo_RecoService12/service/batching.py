@@ -0,0 +1,128 @@
+"""
+Микробатчинг одиночных запросов рекомендаций.
+
+Одновременные запросы к модели копятся до max_batch_size пользователей
+или max_wait секунд и считаются одним векторным вызовом reco_many,
+после чего результат раздается ожидающим корутинам. Включается для
+модели в ModelSpec.batching.
+"""
+import asyncio
+import time
+import typing as tp
+
+import numpy as np
+
+from .executors import ModelExecutors
+from .metrics import BATCH_SIZE_BUCKETS, QUEUE_TIME_BUCKETS, Histogram
+from .registry import ModelRegistry
+
+# запрос в очереди: id пользователя, future с ответом и время постановки
+PendingRequest = tp.Tuple[int, asyncio.Future, float]
+
+
+class MicroBatcher:
+    """
+    Очередь запросов одной модели. Работает внутри event loop и не
+    требует блокировок: очередь меняется только из корутин и таймеров.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        registry: ModelRegistry,
+        executors: ModelExecutors,
+        max_batch_size: int = 64,
+        max_wait: float = 0.002,
+    ) -> None:
+        self.name = name
+        self.registry = registry
+        self.executors = executors
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batch_size = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_time = Histogram(QUEUE_TIME_BUCKETS)
+        # очереди и таймеры по длине выдачи k
+        self._pending: tp.Dict[int, tp.List[PendingRequest]] = {}
+        self._timers: tp.Dict[int, asyncio.TimerHandle] = {}
+        self._tasks: tp.Set[asyncio.Task] = set()
+
+    async def reco(self, user_id: int, k_recos: int = 10) -> np.ndarray:
+        """
+        Рекомендации для пользователя в составе ближайшей пачки
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(k_recos, [])
+        pending.append((user_id, future, time.perf_counter()))
+        if len(pending) >= self.max_batch_size:
+            self._flush(k_recos)
+        elif len(pending) == 1:
+            self._timers[k_recos] = loop.call_later(
+                self.max_wait, self._flush, k_recos)
+        return await future
+
+    def _flush(self, k_recos: int) -> None:
+        timer = self._timers.pop(k_recos, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(k_recos, [])
+        if batch:
+            # держим ссылку на задачу, иначе ее может собрать gc
+            task = asyncio.ensure_future(self._run(batch, k_recos))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: tp.List[PendingRequest], k_recos: int) -> None:
+        started_at = time.perf_counter()
+        for _, _, enqueued_at in batch:
+            self.queue_time.observe(started_at - enqueued_at)
+        self.batch_size.observe(len(batch))
+        try:
+            # модель берется в момент расчета: после горячей перезагрузки
+            # пачка считается новой версией
+            recos = await self.executors.call(
+                self.name, self.executors.model(self.name), "reco_many",
+                [user_id for user_id, _, _ in batch], k_recos)
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        # запрос мог быть отменен, пока пачка считалась
+        for (_, future, _), rec in zip(batch, recos):
+            if not future.done():
+                future.set_result(rec)
+
+    def stats(self) -> tp.Dict[str, tp.Any]:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait": self.max_wait,
+            "queued": sum(len(pending) for pending in self._pending.values()),
+            "batch_size": self.batch_size.snapshot(),
+            "queue_time": self.queue_time.snapshot(),
+        }
+
+
+class ModelBatchers:
+    """
+    Микробатчеры моделей, у которых включен batching
+    """
+
+    def __init__(
+        self,
+        registry: ModelRegistry,
+        executors: ModelExecutors,
+    ) -> None:
+        self._batchers = {
+            name: MicroBatcher(name, registry, executors,
+                               max_batch_size=spec.batch_max_size,
+                               max_wait=spec.batch_max_wait_ms / 1000)
+            for name, spec in registry.specs.items() if spec.batching
+        }
+
+    def get(self, name: str) -> tp.Optional[MicroBatcher]:
+        return self._batchers.get(name)
+
+    def stats(self) -> tp.Dict[str, tp.Dict[str, tp.Any]]:
+        return {name: batcher.stats()
+                for name, batcher in self._batchers.items()}
@@ -0,0 +1,118 @@
+import threading
+import time
+import typing as tp
+from collections import Counter, OrderedDict
+
+import numpy as np
+import numpy.typing as npt
+
+CacheKey = tp.Tuple[str, str, int, int]
+
+# примерный размер служебных структур на одну запись
+ENTRY_OVERHEAD_BYTES = 200
+
+
+class RecoCache:
+    """
+    Кеш рекомендаций в памяти процесса с вытеснением по LRU и TTL.
+
+    Ключ - (название модели, версия модели, id пользователя, k).
+    Рекомендации хранятся компактными массивами int32. Счетчики
+    попаданий, промахов и вытеснений ведутся по каждой модели.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 100_000,
+        max_bytes: tp.Optional[int] = None,
+        ttl: tp.Optional[float] = 300.0,
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.n_bytes = 0
+        self.hits: tp.Counter[str] = Counter()
+        self.misses: tp.Counter[str] = Counter()
+        self.evictions: tp.Counter[str] = Counter()
+        self._entries: tp.OrderedDict[
+            CacheKey, tp.Tuple[float, np.ndarray]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: CacheKey) -> tp.Optional[np.ndarray]:
+        model_name = key[0]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None \
+                    and entry[0] + self.ttl < time.monotonic():
+                self._pop(key)
+                self.evictions[model_name] += 1
+                entry = None
+            if entry is None:
+                self.misses[model_name] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits[model_name] += 1
+            return entry[1]
+
+    def put(self, key: CacheKey, recos: npt.ArrayLike) -> np.ndarray:
+        entry = np.asarray(recos, dtype=np.int32)
+        # запрещаем запись, чтобы вызывающий код не испортил кеш
+        entry.flags.writeable = False
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            self._entries[key] = (time.monotonic(), entry)
+            self.n_bytes += entry.nbytes + ENTRY_OVERHEAD_BYTES
+            while self._entries and (
+                    len(self._entries) > self.max_entries
+                    or (self.max_bytes is not None
+                        and self.n_bytes > self.max_bytes)):
+                evicted_key, (_, evicted) = self._entries.popitem(
+                    last=False)
+                self.n_bytes -= evicted.nbytes + ENTRY_OVERHEAD_BYTES
+                self.evictions[evicted_key[0]] += 1
+        return entry
+
+    def get_or_compute(
+        self,
+        key: CacheKey,
+        compute: tp.Callable[[], npt.ArrayLike],
+    ) -> np.ndarray:
+        recos = self.get(key)
+        if recos is None:
+            recos = self.put(key, compute())
+        return recos
+
+    def invalidate(self, model_name: tp.Optional[str] = None) -> None:
+        """
+        Удаление записей модели (или всех записей), например при
+        перезагрузке модели
+        """
+        with self._lock:
+            keys = [key for key in self._entries
+                    if model_name is None or key[0] == model_name]
+            for key in keys:
+                self._pop(key)
+
+    def stats(self) -> tp.Dict[str, tp.Any]:
+        with self._lock:
+            models = set(self.hits) | set(self.misses) | set(self.evictions)
+            return {
+                "entries": len(self._entries),
+                "bytes": self.n_bytes,
+                "models": {
+                    name: {
+                        "hits": self.hits[name],
+                        "misses": self.misses[name],
+                        "evictions": self.evictions[name],
+                    }
+                    for name in sorted(models)
+                },
+            }
+
+    def _pop(self, key: CacheKey) -> None:
+        _, recos = self._entries.pop(key)
+        self.n_bytes -= recos.nbytes + ENTRY_OVERHEAD_BYTES
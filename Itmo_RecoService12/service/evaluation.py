@@ -0,0 +1,193 @@
+"""
+Офлайн-оценка рекомендаций без pandas.
+
+Рекомендации - матрица [n_users, K] id айтемов без повторов в строке
+(-1 - пустая позиция, только в конце строки), взаимодействия - пары
+массивов (id пользователей, id айтемов) или CSR-матрица [пользователи,
+айтемы].
+Матрица попаданий [n_users, K] считается один раз, все метрики для
+всех k = 1..K получаются из ее кумулятивных сумм по строкам, без
+повторного расчета для каждого k.
+
+Определения совпадают с rectools.metrics (calc_metrics):
+- Precision@k, Recall@k, MAP@k - среднее по пользователям теста,
+  пользователи без рекомендаций дают 0;
+- MeanInvUserFreq@k и Serendipity@k - среднее по пользователям с
+  рекомендациями.
+"""
+import typing as tp
+
+import numpy as np
+from scipy import sparse
+
+Interactions = tp.Union[sparse.csr_matrix,
+                        tp.Tuple[np.ndarray, np.ndarray]]
+
+
+def as_pairs(
+    interactions: Interactions,
+) -> tp.Tuple[np.ndarray, np.ndarray]:
+    """
+    Пары (пользователь, айтем): строки CSR-матрицы - id пользователей,
+    столбцы - id айтемов
+    """
+    if sparse.issparse(interactions):
+        matrix = sparse.csr_matrix(interactions)
+        return (np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr)),
+                matrix.indices)
+    user_ids, item_ids = interactions
+    return np.asarray(user_ids), np.asarray(item_ids)
+
+
+def user_rows(users: np.ndarray, user_ids: np.ndarray) -> np.ndarray:
+    """
+    Строка матрицы рекомендаций для каждого id (-1 - пользователя нет)
+    """
+    if not len(users):
+        return np.full(len(user_ids), -1)
+    order = np.argsort(users, kind="stable")
+    # поиск по отсортированной копии быстрее, чем с sorter
+    sorted_users = users[order]
+    positions = np.minimum(np.searchsorted(sorted_users, user_ids),
+                           len(users) - 1)
+    return np.where(sorted_users[positions] == user_ids, order[positions],
+                    -1)
+
+
+def hit_matrix(
+    recos: np.ndarray,
+    users: np.ndarray,
+    interactions: Interactions,
+) -> np.ndarray:
+    """
+    Попадания рекомендаций во взаимодействия
+    :param recos: матрица [n_users, K] id айтемов, -1 - пустая позиция
+    :param users: id пользователей строк recos
+    :param interactions: тестовые взаимодействия
+    :return: булева матрица [n_users, K]
+    """
+    user_ids, item_ids = as_pairs(interactions)
+    rows = user_rows(np.asarray(users), user_ids)
+    found = rows >= 0
+    # пара (строка, айтем) кодируется одним int64
+    n_keys = int(max(recos.max(initial=-1), item_ids.max(initial=-1))) + 1
+    test_keys = rows[found].astype(np.int64) * n_keys + item_ids[found]
+    reco_keys = np.arange(len(recos), dtype=np.int64)[:, np.newaxis] \
+        * n_keys + recos
+    return (recos >= 0) & np.isin(reco_keys, test_keys)
+
+
+def row_means(values: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    """
+    Среднее по пользователям среднего значения первых k позиций строки
+    для всех k, пользователи без айтемов в первых k не учитываются
+    :return: массив [K]
+    """
+    sums = np.cumsum(np.where(valid, values, 0), axis=1)
+    counts = np.cumsum(valid, axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = sums / counts
+    n_users = (counts > 0).sum(axis=0)
+    return np.where(n_users > 0,
+                    np.where(counts > 0, means, 0).sum(axis=0)
+                    / np.maximum(n_users, 1), np.nan)
+
+
+def item_stats(
+    interactions: Interactions,
+) -> tp.Tuple[np.ndarray, np.ndarray, np.ndarray, int]:
+    """
+    Статистика айтемов по взаимодействиям
+    :return: id айтемов (по возрастанию), количество взаимодействий и
+    разных пользователей для каждого из них, количество пользователей
+    """
+    user_ids, item_ids = as_pairs(interactions)
+    users, user_codes = np.unique(user_ids, return_inverse=True)
+    items, item_codes = np.unique(item_ids, return_inverse=True)
+    # повторные пары (айтем, пользователь) схлопываются в одну ячейку
+    matrix = sparse.csr_matrix(
+        (np.ones(len(item_codes), dtype=np.int32),
+         (item_codes, user_codes)), shape=(len(items), len(users)))
+    return (items, np.bincount(item_codes, minlength=len(items)),
+            np.diff(matrix.indptr), len(users))
+
+
+def lookup(items: np.ndarray, recos: np.ndarray) -> np.ndarray:
+    """
+    Позиция каждого айтема рекомендаций в items (-1 - айтема нет)
+    """
+    if not len(items):
+        return np.full(recos.shape, -1)
+    positions = np.minimum(np.searchsorted(items, recos), len(items) - 1)
+    return np.where(items[positions] == recos, positions, -1)
+
+
+def calc_metrics(
+    recos: np.ndarray,
+    users: np.ndarray,
+    interactions: Interactions,
+    prev_interactions: tp.Optional[Interactions] = None,
+    n_catalog: tp.Optional[int] = None,
+) -> tp.Dict[str, float]:
+    """
+    Precision, Recall и MAP для k = 1..K, при заданных prev_interactions -
+    MeanInvUserFreq, при заданном еще и n_catalog - Serendipity
+    :param recos: матрица [n_users, K] id айтемов, -1 - пустая позиция
+    :param users: id пользователей строк recos
+    :param interactions: тестовые взаимодействия
+    :param prev_interactions: обучающие взаимодействия
+    :param n_catalog: размер каталога
+    :return: словарь {"Precision@1": ..., "MAP@10": ...}
+    """
+    recos = np.asarray(recos)
+    users = np.asarray(users)
+    k_max = recos.shape[1]
+    ranks = np.arange(1, k_max + 1)
+    hits = hit_matrix(recos, users, interactions)
+    valid = recos >= 0
+
+    # количество тестовых айтемов у пользователей строк recos
+    user_ids, _ = as_pairs(interactions)
+    test_users, liked = np.unique(user_ids, return_counts=True)
+    rows = user_rows(users, test_users)
+    n_liked = np.zeros(len(recos), dtype=np.int64)
+    n_liked[rows[rows >= 0]] = liked[rows >= 0]
+    in_test = n_liked > 0
+    n_test_users = max(len(test_users), 1)
+
+    # попаданий в первых k позициях, для всех k сразу
+    tp_at_k = np.cumsum(hits, axis=1)
+    # сумма precision@rank по позициям попаданий - числитель AP@k
+    ap_at_k = np.cumsum(np.where(hits, tp_at_k / ranks, 0), axis=1)
+    tp_at_k, ap_at_k = tp_at_k[in_test], ap_at_k[in_test]
+    liked_test = n_liked[in_test, np.newaxis]
+    values = {
+        "Precision": (tp_at_k / ranks).sum(axis=0) / n_test_users,
+        "Recall": (tp_at_k / liked_test).sum(axis=0) / n_test_users,
+        "MAP": (ap_at_k / liked_test).sum(axis=0) / n_test_users,
+    }
+
+    if prev_interactions is not None:
+        items, n_interactions, n_item_users, n_prev_users = \
+            item_stats(prev_interactions)
+        positions = lookup(items, recos)
+        known = positions >= 0
+        # холодные айтемы - как айтемы одного пользователя
+        n_item_users = np.where(known, n_item_users[positions], 1)
+        values["MeanInvUserFreq"] = row_means(
+            -np.log2(n_item_users / n_prev_users), valid)
+
+        if n_catalog is not None:
+            # ранг популярности: плотный ранг количества взаимодействий,
+            # 1 - самые популярные
+            levels = np.unique(n_interactions)[::-1]
+            rank_pop = np.searchsorted(-levels,
+                                       -n_interactions[positions]) + 1
+            proba_any = np.where(known,
+                                 (n_catalog + 1 - rank_pop) / n_catalog, 0)
+            proba_user = (n_catalog + 1 - ranks) / n_catalog
+            values["Serendipity"] = row_means(
+                np.maximum(proba_user - proba_any, 0) * hits, valid)
+
+    return {f"{name}@{k}": float(metric[k - 1])
+            for name, metric in values.items() for k in ranks}
@@ -0,0 +1,180 @@
+"""
+Пулы для расчета рекомендаций вне event loop.
+
+Вид пула задается для каждой модели в ModelSpec.executor:
+- thread - пул потоков, подходит для путей на NumPy/BLAS, отпускающих GIL;
+- process - пул процессов, в каждом из которых модель загружена заранее,
+  для путей на чистом Python (pandas, implicit similar_items);
+- inline - расчет прямо в event loop (как раньше).
+"""
+import asyncio
+import contextvars
+import multiprocessing
+import os
+import threading
+import typing as tp
+from concurrent.futures import (
+    Executor,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+
+from .log import app_logger
+from .registry import ModelRegistry, load_model
+from .settings import ModelSpec
+
+EXECUTOR_KINDS = ("thread", "process", "inline")
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+
+# модель, загруженная в процессе пула
+_worker_model: tp.Any = None
+
+
+def _prepare_model(
+    model: tp.Any,
+    name: tp.Optional[str] = None,
+    memory_budget: tp.Optional[int] = None,
+) -> tp.Any:
+    # название модели - для ее метрик (FALLBACKS и т.д.)
+    if name is not None:
+        model.name = name
+    # память блочного расчета скоров userknn (service.batch)
+    if memory_budget is not None and hasattr(model, "batch_memory_budget"):
+        model.batch_memory_budget = memory_budget
+    return model
+
+
+def _init_worker(
+    spec: ModelSpec,
+    name: tp.Optional[str] = None,
+    memory_budget: tp.Optional[int] = None,
+) -> None:
+    global _worker_model
+    _worker_model = _prepare_model(load_model(spec), name, memory_budget)
+
+
+def _call_worker_model(method: str, *args: tp.Any) -> tp.Any:
+    return getattr(_worker_model, method)(*args)
+
+
+class ModelExecutors:
+    """
+    Пулы расчета рекомендаций по моделям.
+
+    Пулы создаются при первом запросе к модели, то есть уже в воркере
+    gunicorn, а не в мастер-процессе. Для каждой модели считается
+    количество запросов в пуле, из которого получается глубина очереди.
+    """
+
+    def __init__(self, registry: ModelRegistry) -> None:
+        for name, spec in registry.specs.items():
+            if spec.executor not in EXECUTOR_KINDS:
+                raise ValueError(
+                    f"Unknown executor {spec.executor} for model {name}")
+        self.registry = registry
+        self.in_flight: tp.Dict[str, int] = {name: 0 for name in registry}
+        self._executors: tp.Dict[str, Executor] = {}
+        self._lock = threading.Lock()
+
+    def kind(self, name: str) -> str:
+        return self.registry.specs[name].executor
+
+    def model(self, name: str) -> tp.Any:
+        """
+        Модель для call: для пула процессов модель в воркере не нужна
+        и не загружается, у процессов пула своя копия
+        """
+        if self.kind(name) == "process":
+            return None
+        return self.registry[name]
+
+    def workers(self, name: str) -> int:
+        if self.kind(name) == "inline":
+            return 1
+        return self.registry.specs[name].executor_workers or DEFAULT_WORKERS
+
+    def executor(self, name: str) -> Executor:
+        executor = self._executors.get(name)
+        if executor is not None:
+            return executor
+        with self._lock:
+            if name not in self._executors:
+                spec = self.registry.specs[name]
+                if spec.executor == "process":
+                    # spawn: fork процесса с потоками event loop небезопасен
+                    self._executors[name] = ProcessPoolExecutor(
+                        max_workers=self.workers(name),
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=_init_worker, initargs=(spec, name))
+                else:
+                    self._executors[name] = ThreadPoolExecutor(
+                        max_workers=self.workers(name),
+                        thread_name_prefix=f"reco-{name}")
+                app_logger.info(
+                    f"Started {spec.executor} pool for model {name} "
+                    f"with {self.workers(name)} workers")
+            return self._executors[name]
+
+    async def call(
+        self,
+        name: str,
+        model: tp.Any,
+        method: str,
+        *args: tp.Any,
+    ) -> tp.Any:
+        """
+        Вызов метода модели в ее пуле
+        :param name: название модели
+        :param model: модель (для пула процессов не используется, там
+            своя копия модели)
+        :param method: название метода (reco, reco_many и т.д.)
+        """
+        kind = self.kind(name)
+        if kind == "inline":
+            return getattr(model, method)(*args)
+        loop = asyncio.get_running_loop()
+        func: tp.Callable[..., tp.Any]
+        if kind == "process":
+            func, args = _call_worker_model, (method, *args)
+        else:
+            # run_in_executor не переносит contextvars в поток, а с ними
+            # и замеры этапов (service.spans)
+            func, args = (contextvars.copy_context().run,
+                          (getattr(model, method), *args))
+        self.in_flight[name] += 1
+        try:
+            return await loop.run_in_executor(self.executor(name), func, *args)
+        finally:
+            self.in_flight[name] -= 1
+
+    def reset(self, name: str) -> None:
+        """
+        Пересоздание пула процессов после перезагрузки модели: процессы
+        держат свою копию старой версии. Запущенные задачи дорабатывают.
+        """
+        if self.kind(name) != "process":
+            return
+        with self._lock:
+            executor = self._executors.pop(name, None)
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executors, self._executors = self._executors, {}
+        for executor in executors.values():
+            executor.shutdown(wait=False)
+
+    def stats(self) -> tp.Dict[str, tp.Dict[str, tp.Any]]:
+        """
+        Пулы моделей: вид, размер, запросы в работе и в очереди
+        """
+        return {
+            name: {
+                "executor": self.kind(name),
+                "workers": self.workers(name),
+                "in_flight": self.in_flight[name],
+                "queued": max(0, self.in_flight[name] - self.workers(name)),
+            }
+            for name in self.registry
+        }
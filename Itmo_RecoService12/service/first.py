@@ -0,0 +1,100 @@
+import typing as tp
+
+import numpy as np
+
+from .interactions import UserItems
+from .user_index import UserIndex
+
+FIRST_MODEL = "first"
+
+
+class FirstReco:
+    """
+    Базовая модель first: первые k просмотренных пользователем айтемов
+    (по возрастанию id), недостающие позиции - случайные айтемы каталога.
+
+    Просмотры хранятся одним массивом items, айтемы пользователя с
+    внутренним id u лежат в items[indptr[u]:indptr[u + 1]]. Случайные
+    айтемы выбираются отбором с отклонением, поэтому запрос стоит O(k),
+    а не O(размер каталога).
+    """
+
+    def __init__(
+        self,
+        user_index: UserIndex,
+        indptr: np.ndarray,
+        items: np.ndarray,
+        catalogue: np.ndarray,
+        seed: tp.Optional[int] = None,
+    ) -> None:
+        self.user_index = user_index
+        self.indptr = indptr
+        self.items = items
+        self.catalogue = catalogue
+        self.rng = np.random.default_rng(seed)
+
+    @classmethod
+    def from_user_items(
+        cls,
+        user_items: UserItems,
+        seed: tp.Optional[int] = None,
+    ) -> "FirstReco":
+        # пользователи в user_items уже отсортированы: внутренний id -
+        # номер строки
+        return cls(UserIndex.from_arrays(
+            user_items.users, np.arange(len(user_items), dtype=np.int32)),
+            user_items.indptr, user_items.items, user_items.catalogue, seed)
+
+    @classmethod
+    def from_interactions(
+        cls,
+        user_ids: np.ndarray,
+        item_ids: np.ndarray,
+        seed: tp.Optional[int] = None,
+    ) -> "FirstReco":
+        """
+        Построение индекса по взаимодействиям
+        :param user_ids: внешние id пользователей
+        :param item_ids: внешние id айтемов
+        """
+        return cls.from_user_items(
+            UserItems.from_interactions(user_ids, item_ids), seed)
+
+    def sample(self, n: int, exclude: np.ndarray) -> np.ndarray:
+        """
+        n случайных различных айтемов каталога, кроме exclude
+        """
+        chosen = set(exclude.tolist())
+        n_free = len(self.catalogue) - len(chosen)
+        if n_free <= 2 * n:
+            # каталог почти исчерпан: отбор с отклонением буксует,
+            # а разность множеств здесь уже небольшая
+            free = self.catalogue[~np.isin(self.catalogue, exclude)]
+            return self.rng.permutation(free)[:n]
+        result: tp.List[int] = []
+        while len(result) < n:
+            for row in self.rng.integers(0, len(self.catalogue),
+                                         2 * (n - len(result))):
+                item_id = self.catalogue[row]
+                if item_id not in chosen:
+                    chosen.add(item_id)
+                    result.append(item_id)
+                    if len(result) == n:
+                        break
+        return np.asarray(result, dtype=self.catalogue.dtype)
+
+    def reco(self, user_id: int, k_recos: int = 10) -> np.ndarray:
+        is_warm, row = self.user_index.lookup(user_id)
+        if is_warm:
+            start = self.indptr[row]
+            recos = self.items[start:min(start + k_recos,
+                                         self.indptr[row + 1])]
+        else:
+            recos = self.items[:0]
+        if len(recos) < k_recos:
+            recos = np.concatenate(
+                [recos, self.sample(k_recos - len(recos), recos)])
+        return recos
+
+    def reco_many(self, user_ids, k_recos=10) -> tp.List[np.ndarray]:
+        return [self.reco(user_id, k_recos) for user_id in user_ids]
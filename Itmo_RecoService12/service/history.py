@@ -0,0 +1,125 @@
+import typing as tp
+from pathlib import Path
+
+import numpy as np
+from scipy import sparse
+
+INDPTR_FILE = "history_indptr.npy"
+INDICES_FILE = "history_indices.npy"
+WEIGHTS_FILE = "history_weights.npy"
+
+
+class HistoryStore:
+    """
+    История просмотров пользователей в формате CSR.
+
+    indptr[u]:indptr[u + 1] - границы истории пользователя u (внутренний
+    id) в массиве indices с id айтемов. Порядок айтемов внутри истории
+    совпадает с порядком взаимодействий в датасете. Веса
+    взаимодействий (weights) хранятся по желанию.
+    """
+
+    def __init__(
+        self,
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        weights: tp.Optional[np.ndarray] = None,
+    ) -> None:
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+
+    @classmethod
+    def from_interactions(
+        cls,
+        user_ids: np.ndarray,
+        item_ids: np.ndarray,
+        n_users: tp.Optional[int] = None,
+        weights: tp.Optional[np.ndarray] = None,
+    ) -> "HistoryStore":
+        """
+        Построение истории по массивам взаимодействий
+        :param user_ids: внутренние id пользователей
+        :param item_ids: внутренние id айтемов
+        :param n_users: количество пользователей (по умолчанию max + 1)
+        :param weights: веса взаимодействий
+        """
+        user_ids = np.asarray(user_ids)
+        item_ids = np.asarray(item_ids)
+        assert len(item_ids) < np.iinfo(np.int32).max
+        if n_users is None:
+            n_users = int(user_ids.max()) + 1 if len(user_ids) else 0
+        order = np.argsort(user_ids, kind="stable")
+        indptr = np.zeros(n_users + 1, dtype=np.int32)
+        np.cumsum(np.bincount(user_ids, minlength=n_users),
+                  out=indptr[1:])
+        if weights is not None:
+            weights = np.asarray(weights, dtype=np.float32)[order]
+        return cls(indptr, item_ids[order].astype(np.int32), weights)
+
+    def save(self, path: tp.Union[str, Path]) -> None:
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / INDPTR_FILE, self.indptr)
+        np.save(path / INDICES_FILE, self.indices)
+        if self.weights is not None:
+            np.save(path / WEIGHTS_FILE, self.weights)
+
+    @classmethod
+    def load(
+        cls,
+        path: tp.Union[str, Path],
+        mmap_mode: tp.Optional[tp.Literal["r", "r+", "w+", "c"]] = "r",
+    ) -> "HistoryStore":
+        path = Path(path)
+        weights = None
+        if (path / WEIGHTS_FILE).is_file():
+            weights = np.load(path / WEIGHTS_FILE, mmap_mode=mmap_mode)
+        return cls(np.load(path / INDPTR_FILE, mmap_mode=mmap_mode),
+                   np.load(path / INDICES_FILE, mmap_mode=mmap_mode),
+                   weights)
+
+    def __len__(self) -> int:
+        return len(self.indptr) - 1
+
+    def get(self, user_id: int) -> np.ndarray:
+        """
+        История пользователя, для неизвестного - пустой массив
+        """
+        if not 0 <= user_id < len(self):
+            return self.indices[:0]
+        return self.indices[self.indptr[user_id]:self.indptr[user_id + 1]]
+
+    def gather(
+        self,
+        user_ids: np.ndarray,
+    ) -> tp.Tuple[np.ndarray, np.ndarray]:
+        """
+        Истории нескольких пользователей подряд
+        :param user_ids: внутренние id пользователей
+        :return: айтемы всех историй и длины историй по пользователям
+        """
+        user_ids = np.asarray(user_ids)
+        starts = self.indptr[user_ids]
+        lengths = self.indptr[user_ids + 1] - starts
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        return self.indices[offsets + np.arange(lengths.sum())], lengths
+
+    def union(self, user_ids: np.ndarray) -> np.ndarray:
+        """
+        Объединение историй пользователей (уникальные id айтемов)
+        """
+        return np.unique(self.gather(user_ids)[0])
+
+    def to_csr(self, n_items: int) -> sparse.csr_matrix:
+        """
+        Матрица пользователь x айтем (веса или единицы) поверх массивов
+        истории без копирования; повторные взаимодействия суммируются
+        при умножении матриц
+        """
+        weights = self.weights
+        if weights is None:
+            weights = np.ones(len(self.indices), dtype=np.float32)
+        return sparse.csr_matrix(
+            (weights, self.indices, self.indptr),
+            shape=(len(self), n_items))
@@ -0,0 +1,174 @@
+"""
+Загрузка взаимодействий (interactions.csv Kion) при старте сервиса.
+
+Из CSV читаются только user_id и item_id в int32, просмотры
+группируются по пользователям одной сортировкой (UserItems). Результат
+сохраняется в кеш - директорию с массивами .npy и meta.json с размером
+и временем изменения исходного файла. Следующие запуски открывают кеш
+через np.load(mmap_mode="r") без разбора CSV; при изменении CSV кеш
+пересобирается.
+"""
+import json
+import os
+import time
+import typing as tp
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .log import app_logger
+
+COLUMNS = ("user_id", "item_id")
+META_FILE = "meta.json"
+ARRAYS = ("users", "indptr", "items", "catalogue")
+
+
+class UserItems:
+    """
+    Просмотры, сгруппированные по пользователям.
+
+    users - отсортированные внешние id пользователей, айтемы i-го
+    пользователя лежат в items[indptr[i]:indptr[i + 1]] по возрастанию
+    id. catalogue - отсортированные id всех айтемов.
+    """
+
+    def __init__(
+        self,
+        users: np.ndarray,
+        indptr: np.ndarray,
+        items: np.ndarray,
+        catalogue: np.ndarray,
+    ) -> None:
+        self.users = users
+        self.indptr = indptr
+        self.items = items
+        self.catalogue = catalogue
+
+    @classmethod
+    def from_interactions(
+        cls,
+        user_ids: np.ndarray,
+        item_ids: np.ndarray,
+    ) -> "UserItems":
+        """
+        Группировка взаимодействий одной сортировкой по паре
+        (пользователь, айтем)
+        :param user_ids: внешние id пользователей
+        :param item_ids: внешние id айтемов
+        """
+        user_ids = np.asarray(user_ids)
+        item_ids = np.asarray(item_ids)
+        order = np.lexsort((item_ids, user_ids))
+        sorted_users = user_ids[order]
+        # начала групп пользователей в отсортированном массиве
+        starts = np.flatnonzero(np.r_[True, sorted_users[1:]
+                                      != sorted_users[:-1]]) \
+            if len(sorted_users) else np.zeros(0, dtype=np.int64)
+        indptr = np.append(starts, len(sorted_users)).astype(np.int64)
+        return cls(sorted_users[starts], indptr, item_ids[order],
+                   np.unique(item_ids))
+
+    def __len__(self) -> int:
+        return len(self.users)
+
+    def save(self, path: tp.Union[str, Path]) -> None:
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        for name in ARRAYS:
+            np.save(path / f"{name}.npy", getattr(self, name))
+
+    @classmethod
+    def load(
+        cls,
+        path: tp.Union[str, Path],
+        mmap_mode: tp.Optional[tp.Literal["r", "r+", "w+", "c"]] = "r",
+    ) -> "UserItems":
+        path = Path(path)
+        return cls(*(np.load(path / f"{name}.npy", mmap_mode=mmap_mode)
+                     for name in ARRAYS))
+
+
+def read_interactions(
+    path: tp.Union[str, Path],
+) -> tp.Tuple[np.ndarray, np.ndarray]:
+    """
+    Чтение user_id и item_id из CSV в int32
+    """
+    df = pd.read_csv(path, usecols=list(COLUMNS),
+                     dtype={column: np.int32 for column in COLUMNS})
+    return df["user_id"].values, df["item_id"].values
+
+
+def source_stamp(path: Path) -> tp.Dict[str, int]:
+    stat = path.stat()
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def default_cache_dir(path: Path) -> Path:
+    return path.with_name(f"{path.stem}_cache")
+
+
+def load_interactions(
+    path: tp.Union[str, Path],
+    cache_dir: tp.Optional[tp.Union[str, Path]] = None,
+) -> UserItems:
+    """
+    Взаимодействия из кеша, если он собран по текущей версии CSV, иначе
+    из CSV с сохранением кеша
+    :param path: interactions.csv
+    :param cache_dir: директория кеша (по умолчанию <имя CSV>_cache
+    рядом с CSV)
+    """
+    path = Path(path)
+    cache_dir = default_cache_dir(path) if cache_dir is None \
+        else Path(cache_dir)
+    stamp = source_stamp(path)
+    started_at = time.perf_counter()
+    try:
+        with open(cache_dir / META_FILE) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        meta = None
+    if meta is not None and meta.get("source") == stamp:
+        user_items = UserItems.load(cache_dir)
+        app_logger.info(
+            f"Interactions loaded from cache {cache_dir}: "
+            f"{len(user_items)} users, "
+            f"{time.perf_counter() - started_at:.3f}s")
+        return user_items
+
+    user_items = UserItems.from_interactions(*read_interactions(path))
+    try:
+        save_cache(user_items, cache_dir, stamp)
+    except OSError as e:
+        # без кеша сервис работает, просто следующий старт будет долгим
+        app_logger.warning(f"Failed to save interactions cache: {e}")
+    app_logger.info(
+        f"Interactions loaded from {path}: {len(user_items)} users, "
+        f"{time.perf_counter() - started_at:.3f}s")
+    return user_items
+
+
+def save_cache(
+    user_items: UserItems,
+    cache_dir: Path,
+    stamp: tp.Dict[str, int],
+) -> None:
+    """
+    Массивы пишутся во временную директорию и переименовываются
+    целиком, поэтому воркеры, стартующие одновременно, не читают
+    недописанный кеш
+    """
+    tmp_dir = cache_dir.with_name(f"{cache_dir.name}.{os.getpid()}.tmp")
+    user_items.save(tmp_dir)
+    with open(tmp_dir / META_FILE, "w") as f:
+        json.dump({"source": stamp, "created_at": int(time.time())}, f)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    # старый meta.json удаляется первым, новый переносится последним:
+    # кеш без него считается невалидным
+    (cache_dir / META_FILE).unlink(missing_ok=True)
+    for name in ARRAYS:
+        os.replace(tmp_dir / f"{name}.npy", cache_dir / f"{name}.npy")
+    os.replace(tmp_dir / META_FILE, cache_dir / META_FILE)
+    tmp_dir.rmdir()
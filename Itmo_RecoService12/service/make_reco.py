@@ -1,19 +1,44 @@
-import json
-from collections import Counter
+import inspect
+import typing as tp
+from functools import cached_property
 from pathlib import Path
 
 import dill
 import numpy as np
 import pandas as pd
 from rectools import Columns
+from scipy import sparse
+
+from .history import HistoryStore
+from .log import app_logger
+from .metrics import FALLBACKS
+from .neighbours import top_neighbours
+from .popular import Popularity, shared_popularity
+from .scorers import (
+    Scorer,
+    UserKNNScorer,
+    VectorScorer,
+    csr_from_arrays,
+    csr_to_arrays,
+    make_scorer,
+    top_k,
+)
+from .spans import span
+from .user_index import UserIndex
 
 
 class KionReco:
     """
     Класс, содержащий методы получения рекомендаций по датасету Kion
     """
+    # название модели в метриках, задается реестром моделей
+    name = "unknown"
 
-    def __init__(self, model_name_, dataset_):
+    def __init__(
+        self,
+        model_name_: tp.Union[str, Path],
+        dataset_: tp.Union[str, Path],
+    ) -> None:
         assert Path(
             model_name_).is_file()  # проверка на наличие файла с моделью
         assert Path(
@@ -24,14 +49,227 @@ class KionReco:
         # подгружаем датасет
         with open(Path(dataset_), 'rb') as f:
             self.dataset = dill.load(f)
+        # версия модели - время изменения файла, входит в ключ кеша
+        self.version = str(int(Path(model_name_).stat().st_mtime))
+
+        interactions = self.dataset.interactions.df
+        self.user_ids = self.dataset.user_id_map.external_ids
+        self.item_ids = self.dataset.item_id_map.external_ids
+        # индекс теплых пользователей строится один раз при загрузке
+        self.user_index = UserIndex(self.user_ids)
+        # история просмотров по внутренним id пользователей
+        self.history = HistoryStore.from_interactions(
+            interactions[Columns.User].values,
+            interactions[Columns.Item].values,
+            n_users=self.dataset.user_id_map.size,
+            weights=interactions[Columns.Weight].values)
+        # векторные модели (LightFM, ALS) считаются на векторах,
+        # извлеченных один раз при загрузке, остальные - через rectools
+        self.scorer: tp.Optional[Scorer] = None
+        if hasattr(self.model, "get_vectors"):
+            self.scorer = VectorScorer(
+                *self.get_vectors(),
+                self.history.to_csr(self.dataset.item_id_map.size))
+        # популярное во внутренних id айтемов, одно на файл датасета
+        self.popular = shared_popularity(
+            dataset_, interactions[Columns.Item].values,
+            self.dataset.item_id_map.size)
 
-        self.sorted_top = self.dataset.interactions.df[
-            [Columns.Item]].value_counts().reset_index()[Columns.Item].values
+    def _base_arrays(self) -> tp.Dict[str, np.ndarray]:
+        """
+        Общие для всех моделей массивы: id, история и популярное
+        """
+        return {
+            "user_ids": np.asarray(self.user_ids),
+            "item_ids": np.asarray(self.item_ids),
+            "user_sorted_ids": self.user_index.sorted_ids,
+            "user_internal_ids": self.user_index.internal_ids,
+            "history_indptr": self.history.indptr,
+            "history_indices": self.history.indices,
+            "history_weights": self.history.weights,
+            "popular": np.asarray(self.popular.items),
+        }
+
+    def get_vectors(self) -> tp.Tuple[np.ndarray, np.ndarray]:
+        """
+        Векторы пользователей и айтемов векторной модели rectools во
+        внутренних id датасета (float32). Смещения LightFM входят в
+        векторы дополнительными столбцами, так что скор - скалярное
+        произведение
+        """
+        # LightFM принимает датасет (признаки), ALS - нет
+        if "dataset" in inspect.signature(
+                self.model.get_vectors).parameters:
+            user_vectors, item_vectors = self.model.get_vectors(
+                self.dataset)
+        else:
+            user_vectors, item_vectors = self.model.get_vectors()
+        return user_vectors.astype(np.float32), \
+            item_vectors.astype(np.float32)
+
+    def to_arrays(self) -> tp.Tuple[tp.Dict[str, np.ndarray], dict]:
+        """
+        Состояние модели в виде массивов для артефакта
+        :return: словарь массивов и метаданные для манифеста
+        """
+        arrays = self._base_arrays()
+        if hasattr(self.model, "get_vectors"):
+            # LightFM/ALS: векторы со смещениями
+            arrays["user_vectors"], arrays["item_vectors"] = \
+                self.get_vectors()
+            scorer = "vectors"
+        elif hasattr(getattr(self.model, "model", None), "similarity"):
+            # обертка rectools над implicit ItemItemRecommender
+            arrays.update(csr_to_arrays("similarity",
+                                        self.model.model.similarity))
+            scorer = "knn"
+        else:
+            raise TypeError(
+                f"Unsupported model {type(self.model).__name__}")
+        return arrays, {"scorer": scorer, "version": self.version}
+
+    @classmethod
+    def from_arrays(
+        cls,
+        arrays: tp.Dict[str, np.ndarray],
+        meta: dict,
+    ) -> "KionReco":
+        """
+        Создание модели из массивов артефакта без rectools и dill
+        :param arrays: массивы (обычно memory-mapped)
+        :param meta: метаданные из манифеста
+        """
+        reco = cls.__new__(cls)
+        reco._load_arrays(arrays, meta)
+        return reco
+
+    def _load_arrays(
+        self,
+        arrays: tp.Dict[str, np.ndarray],
+        meta: dict,
+    ) -> None:
+        """
+        Общее для всех моделей состояние из массивов артефакта
+        """
+        self.model = None
+        self.dataset = None
+        self.version = meta["version"]
+        self.user_ids = arrays["user_ids"]
+        self.item_ids = arrays["item_ids"]
+        self.user_index = UserIndex.from_arrays(arrays["user_sorted_ids"],
+                                                arrays["user_internal_ids"])
+        self.history = HistoryStore(arrays["history_indptr"],
+                                    arrays["history_indices"],
+                                    arrays.get("history_weights"))
+        self.popular = Popularity(arrays["popular"])
+        self.scorer = None
+        if meta.get("scorer") is not None:
+            self.scorer = make_scorer(
+                meta["scorer"], arrays,
+                self.history.to_csr(len(self.item_ids)))
 
     def check_user(self, user_id) -> bool:
-        return False if len(np.where(
-            self.dataset.user_id_map.external_ids == user_id)[0]) == 0 \
-            else True
+        return self.user_index.lookup(user_id)[0]
+
+    def lookup_user(self, user_id) -> tp.Tuple[bool, int]:
+        """
+        Проверка пользователя с получением его внутреннего id
+        :param user_id: внешний идентификатор пользователя
+        :return: признак теплого пользователя и внутренний id (-1 для
+        холодного)
+        """
+        return self.user_index.lookup(user_id)
+
+    def warm_users(self) -> np.ndarray:
+        """
+        Внешние идентификаторы всех теплых пользователей
+        """
+        return self.user_ids
+
+    def popular_reco(self, k_recos=10) -> np.ndarray:
+        """
+        Популярное во внешних id айтемов для холодных пользователей
+        """
+        return self.item_ids[self.popular.top(k_recos)]
+
+    def fill_popular(self, row, recos, k_recos=10) -> np.ndarray:
+        """
+        Дополнение рекомендаций теплого пользователя популярным, кроме
+        просмотренного им
+        :param row: внутренний id пользователя
+        :param recos: рекомендации во внутренних id айтемов
+        :return: рекомендации во внутренних id айтемов
+        """
+        if len(recos) >= k_recos:
+            return recos
+        with span("popular_fill"):
+            return self.popular.fill(recos, k_recos,
+                                     exclude=self.history.get(row))
+
+    def _scorer_reco(self, user_rows, k_recos) -> np.ndarray:
+        """
+        Рекомендации скорера во внешних id айтемов (-1 - пустая позиция)
+        """
+        recos = self.scorer.recommend(np.asarray(user_rows), k_recos)
+        return np.where(recos >= 0, self.item_ids[recos], -1).astype(np.int32)
+
+    def reco_batch(self, user_ids, k_recos=10) -> np.ndarray:
+        """
+        Получение К рекомендаций для пачки теплых пользователей одним
+        вызовом модели
+        :param user_ids: идентификаторы теплых пользователей
+        :param k_recos: количество рекомендаций
+        :return: матрица [len(user_ids), k_recos] int32, недостающие
+        позиции заполнены -1
+        """
+        result = np.full((len(user_ids), k_recos), -1, dtype=np.int32)
+        if len(user_ids) == 0:
+            return result
+        if self.scorer is not None:
+            rows = self.user_index.lookup_many(user_ids)
+            result[rows >= 0] = self._scorer_reco(rows[rows >= 0], k_recos)
+            return result
+        df_recos = self.model.recommend(
+            users=user_ids,
+            dataset=self.dataset,
+            k=k_recos,
+            filter_viewed=True
+        )
+        rows = pd.Index(user_ids).get_indexer(df_recos[Columns.User])
+        cols = df_recos[Columns.Rank].values - 1
+        result[rows, cols] = df_recos[Columns.Item].values
+        return result
+
+    def reco_many(self, user_ids, k_recos=10) -> tp.List[np.ndarray]:
+        """
+        Получение К рекомендаций для пачки пользователей: теплые
+        пользователи считаются одним вызовом модели, холодные
+        получают популярное
+        :param user_ids: идентификаторы пользователей
+        :param k_recos: количество рекомендаций
+        :return: список массивов рекомендаций в порядке user_ids
+        """
+        user_ids = np.asarray(user_ids)
+        with span("check_user"):
+            rows = self.user_index.lookup_many(user_ids)
+        warm = rows >= 0
+        if not warm.all():
+            FALLBACKS.inc(self.name, "cold", amount=int((~warm).sum()))
+        result = [self.popular_reco(k_recos)] * len(user_ids)
+        if self.scorer is None:
+            with span("model"):
+                warm_recos = self.reco_batch(user_ids[warm], k_recos)
+            for pos, recos in zip(np.flatnonzero(warm), warm_recos):
+                result[pos] = recos[recos >= 0]
+            return result
+        # короткие списки скорера дополняются популярным
+        with span("model"):
+            warm_recos = self.scorer.recommend(rows[warm], k_recos)
+        for pos, row, recos in zip(np.flatnonzero(warm), rows[warm],
+                                   warm_recos):
+            recos = self.fill_popular(row, recos[recos >= 0], k_recos)
+            result[pos] = self.item_ids[recos]
+        return result
 
     def reco_recommend(self, user_id, k_recos=10) -> np.ndarray:
         """
@@ -40,6 +278,8 @@ class KionReco:
         :param k_recos: количество рекомендаций
         :return:
         """
+        if self.scorer is not None:
+            return self.reco(user_id, k_recos)
         if self.check_user(user_id):
             # рекомендации для теплого пользователя (который попал в обучение)
             df_recos = self.model.recommend(
@@ -50,7 +290,8 @@ class KionReco:
             )
             return df_recos[Columns.Item].values
         else:
-            return self.sorted_top[:k_recos]
+            FALLBACKS.inc(self.name, "cold")
+            return self.popular_reco(k_recos)
 
     def reco(self, user_id, k_recos=10) -> np.ndarray:
         """
@@ -59,55 +300,204 @@ class KionReco:
         :param k_recos: количество рекомендаций
         :return:
         """
-        if self.check_user(user_id):
+        with span("check_user"):
+            is_warm, row = self.user_index.lookup(user_id)
+        if is_warm and self.scorer is not None:
+            with span("model"):
+                recos = self.scorer.recommend(np.asarray([row]), k_recos)[0]
+            recos = self.fill_popular(row, recos[recos >= 0], k_recos)
+            return self.item_ids[recos]
+        if is_warm:
             # рекомендации для теплого пользователя (который попал в обучение)
-            df_recos = self.model.predict(
-                users=[user_id],
-                dataset=self.dataset,
-                k=k_recos,
-                filter_viewed=True
-            )
-            return df_recos
+            with span("model"):
+                df_recos = self.model.recommend(
+                    users=[user_id],
+                    dataset=self.dataset,
+                    k=k_recos,
+                    filter_viewed=True
+                )
+            return df_recos[Columns.Item].values
         else:
-            return self.sorted_top[:k_recos]
+            FALLBACKS.inc(self.name, "cold")
+            return self.popular_reco(k_recos)
+
+
+def split_similar(recs) -> tp.Tuple[np.ndarray, np.ndarray]:
+    """
+    Приведение результата implicit similar_items к паре массивов
+    (идентификаторы, близости): implicit<0.5 возвращает список пар,
+    более новые версии - кортеж массивов
+    """
+    if isinstance(recs, tuple) and len(recs) == 2 \
+            and isinstance(recs[0], np.ndarray):
+        ids, sims = recs
+    else:
+        ids = [idx for idx, _ in recs]
+        sims = [sim for _, sim in recs]
+    return np.asarray(ids, dtype=np.int32), np.asarray(sims, dtype=np.float32)
 
 
 class KionRecoBM25(KionReco):
-    def __init__(self, model_name_, dataset_):
+    # объем матрицы скоров одного блока пакетного расчета, байт
+    batch_memory_budget = 256 << 20
+
+    def __init__(
+        self,
+        model_name_: tp.Union[str, Path],
+        dataset_: tp.Union[str, Path],
+        n_neighbours: int = 50,
+    ) -> None:
         super().__init__(model_name_, dataset_)
-        cnt = Counter(self.dataset.interactions.df['item_id'].values)
-        self.idf = pd.DataFrame.from_dict(cnt, orient='index',
-                                          columns=['doc_freq']).reset_index()
-        n = self.dataset.interactions.df.shape[0]
-        self.idf['idf'] = self.idf['doc_freq'].apply(
-            lambda x: np.log((1 + n) / (1 + x) + 1))
+        self.n_neighbours = n_neighbours
+        interactions = self.dataset.interactions.df
+        n = interactions.shape[0]
 
-        self.users_inv_mapping = dict(
-            enumerate(self.dataset.interactions.df['user_id'].unique()))
+        # состояние для расчета хранится в массивах NumPy: они не
+        # отслеживаются GC и при preload не копируются в воркеры
+        item_ids = interactions['item_id'].values
+        n_items = item_ids.max() + 1 if len(item_ids) else 0
+        # строки модели implicit -> id пользователей датасета и обратно
+        self.users_inv = interactions['user_id'].unique().astype(np.int32)
+        self.users_rows = np.full(self.users_inv.max() + 1, -1,
+                                  dtype=np.int32)
+        self.users_rows[self.users_inv] = np.arange(len(self.users_inv))
+        # idf в виде плотного массива по внутренним id айтемов
+        self.idf_dense = np.log(
+            (1 + n) / (1 + np.bincount(item_ids, minlength=n_items)) + 1)
+        # близости пользователей из модели implicit
+        self.similarity = sparse.csr_matrix(self.model.similarity)
+        # таблица соседей (service.neighbours) строится при экспорте в
+        # артефакт, здесь соседи выбираются из строки similarity
+        self.neighbour_ids: tp.Optional[np.ndarray] = None
+        self.neighbour_sims: tp.Optional[np.ndarray] = None
 
-        self.users_mapping = {v: k for k, v in self.users_inv_mapping.items()}
+    # словари и DataFrame для make_reco_pandas строятся только при
+    # обращении, чтобы не держать миллионы python-объектов в каждой модели
+    @cached_property
+    def idf(self) -> pd.DataFrame:
+        doc_freq = np.bincount(self.history.indices,
+                               minlength=len(self.idf_dense))
+        items = np.flatnonzero(doc_freq)
+        return pd.DataFrame({'index': items,
+                             'doc_freq': doc_freq[items],
+                             'idf': self.idf_dense[items]})
 
-        self.items_inv_mapping = dict(
-            enumerate(self.dataset.interactions.df['item_id'].unique()))
+    @cached_property
+    def users_inv_mapping(self) -> tp.Dict[int, int]:
+        return dict(enumerate(self.users_inv.tolist()))
+
+    @cached_property
+    def users_mapping(self) -> tp.Dict[int, int]:
+        return {v: k for k, v in self.users_inv_mapping.items()}
+
+    @cached_property
+    def items_inv_mapping(self) -> tp.Dict[int, int]:
+        return dict(enumerate(
+            self.dataset.interactions.df['item_id'].unique()))
+
+    @cached_property
+    def items_mapping(self) -> tp.Dict[int, int]:
+        return {v: k for k, v in self.items_inv_mapping.items()}
+
+    @cached_property
+    def batch_scorer(self) -> UserKNNScorer:
+        """
+        Пакетный расчет make_reco для многих пользователей
+        """
+        return UserKNNScorer(*self.neighbour_table(), self.users_rows,
+                             self.history, self.idf_dense,
+                             memory_budget=self.batch_memory_budget)
+
+    @cached_property
+    def mapper(self):
+        return self.generate_implicit_recs_mapper()
+
+    def neighbour_table(self) -> tp.Tuple[np.ndarray, np.ndarray]:
+        """
+        Соседи всех пользователей модели: матрицы [n_users, n_neighbours]
+        внутренних id пользователей датасета (-1 - пустая позиция) и
+        близостей, строка - номер пользователя в модели implicit
+        """
+        if self.neighbour_ids is not None:
+            return self.neighbour_ids, self.neighbour_sims
+        rows, sims = top_neighbours(self.similarity, self.n_neighbours,
+                                    n_rows=len(self.users_inv))
+        return np.where(rows >= 0, self.users_inv[rows], -1), sims
 
-        self.items_mapping = {v: k for k, v in self.items_inv_mapping.items()}
+    def to_arrays(self) -> tp.Tuple[tp.Dict[str, np.ndarray], dict]:
+        arrays = self._base_arrays()
+        # в артефакт идет только таблица соседей: при обслуживании
+        # соседи пользователя - одна ее строка
+        arrays["neighbour_ids"], arrays["neighbour_sims"] = \
+            self.neighbour_table()
+        arrays["users_inv"] = self.users_inv
+        arrays["users_rows"] = self.users_rows
+        arrays["idf"] = self.idf_dense
+        return arrays, {"scorer": None, "version": self.version,
+                        "n_neighbours": self.n_neighbours}
 
-        watched = self.dataset.interactions.df.groupby('user_id').agg(
-            {'item_id': list})
-        self.watched = {k: v['item_id'] for k, v in
-                        json.loads(watched.T.to_json()).items()}
-        self.mapper = self.generate_implicit_recs_mapper()
+    @classmethod
+    def from_arrays(
+        cls,
+        arrays: tp.Dict[str, np.ndarray],
+        meta: dict,
+    ) -> "KionRecoBM25":
+        """
+        Создание модели из массивов артефакта; make_reco_pandas в этом
+        режиме недоступен, так как модель implicit не загружается.
+        Артефакты без таблицы соседей читают соседей из similarity
+        """
+        reco: KionRecoBM25 = cls.__new__(cls)
+        reco._load_arrays(arrays, meta)
+        reco.n_neighbours = meta["n_neighbours"]
+        reco.neighbour_ids = arrays.get("neighbour_ids")
+        reco.neighbour_sims = arrays.get("neighbour_sims")
+        reco.similarity = csr_from_arrays("similarity", arrays) \
+            if "similarity_data" in arrays else None
+        reco.users_inv = arrays["users_inv"]
+        reco.users_rows = arrays["users_rows"]
+        reco.idf_dense = arrays["idf"]
+        return reco
 
-    def generate_implicit_recs_mapper(self):
-        def _recs_mapper(user):
+    def generate_implicit_recs_mapper(
+        self,
+    ) -> tp.Callable[[int], tp.Tuple[tp.List[int], tp.List[float]]]:
+        def _recs_mapper(user: int) -> tp.Tuple[tp.List[int],
+                                                tp.List[float]]:
             user_id = self.users_mapping[user]
-            recs = self.model.similar_items(user_id, N=50)
-            users = [self.users_inv_mapping[user] for user, _ in recs]
-            sims = [sim for _, sim in recs]
-            return users, sims
+            recs = self.model.similar_items(user_id, N=self.n_neighbours)
+            rows, sims = split_similar(recs)
+            users = [self.users_inv_mapping[row] for row in rows.tolist()]
+            return users, list(sims)
 
         return _recs_mapper
 
+    def neighbours(self, user_id) -> tp.Tuple[np.ndarray, np.ndarray]:
+        """
+        Поиск близких пользователей
+        :param user_id: идентификатор пользователя
+        :return: id близких пользователей (int32) и близости (float32)
+        """
+        if not 0 <= user_id < len(self.users_rows) \
+                or self.users_rows[user_id] < 0:
+            raise KeyError(user_id)
+        row = self.users_rows[user_id]
+        if self.neighbour_ids is not None:
+            # строка таблицы соседей
+            ids = self.neighbour_ids[row]
+            found = ids >= 0
+            return ids[found], self.neighbour_sims[row][found]
+        if row >= self.similarity.shape[0]:
+            return self.users_inv[:0], np.array([], dtype=np.float32)
+        # строка матрицы близостей по убыванию близости (при равенстве -
+        # по возрастанию строки, как в таблице соседей)
+        start, end = self.similarity.indptr[row], \
+            self.similarity.indptr[row + 1]
+        rows = self.similarity.indices[start:end]
+        sims = self.similarity.data[start:end]
+        best = np.lexsort((rows, -sims))[:self.n_neighbours]
+        return self.users_inv[rows[best]], sims[best].astype(np.float32)
+
     def make_reco_slow(self, user_id, k_recos=10) -> np.ndarray:
         recs = pd.DataFrame({
             'user_id': self.dataset.interactions.df[
@@ -124,8 +514,8 @@ class KionRecoBM25(KionReco):
         recs = recs[~(recs['user_id'] == recs['similar_user_id'])]
 
         #     # join watched items
-        recs = recs.merge(self.watched, left_on=['similar_user_id'],
-                          right_on=['user_id'], how='left')
+        recs['item_id'] = recs['similar_user_id'].map(
+            lambda x: self.history.get(x).tolist())
         recs = recs.explode('item_id')
         # drop duplicates pairs user_id-item_id
         # keep with the largest similiarity
@@ -142,7 +532,7 @@ class KionRecoBM25(KionReco):
         recs['rank'] = recs.groupby('user_id').cumcount() + 1
         return recs[recs['rank'] <= k_recos]['item_id'].values
 
-    def make_reco(self, user_id, k_recos=10):
+    def make_reco_pandas(self, user_id, k_recos=10):
         try:
             recss = {}
             # находим близких пользователей
@@ -153,7 +543,7 @@ class KionRecoBM25(KionReco):
             recss['similarity'] = recss['similarity'][1:]
 
             # извлекаем просмотренные фильмы близких пользователей
-            recss['item_id'] = [self.watched.get(f"{x}") for x in
+            recss['item_id'] = [self.history.get(x).tolist() for x in
                                 recss['similar_user_id']]
 
             # объединяем с idf
@@ -170,12 +560,82 @@ class KionRecoBM25(KionReco):
 
             # если рекомендаций меньше
             if len(recos) < k_recos:
-                recos = pd.DataFrame(np.append(recos, self.sorted_top),
-                                     columns=['recos'])['recos'].unique()[:k_recos]
-        except:
-            recos = self.sorted_top[:k_recos]
+                recos = self.popular.fill(recos.astype(np.int32), k_recos)
+        except Exception as e:  # pylint: disable=W0703
+            # ошибка расчета не должна ронять запрос, но должна быть видна
+            app_logger.warning(
+                f"Model {self.name} failed for user {user_id}: {e!r}")
+            FALLBACKS.inc(self.name, "error")
+            recos = self.popular.top(k_recos)
         return recos
 
+    def make_reco(self, user_id, k_recos=10,
+                  filter_viewed=False) -> np.ndarray:
+        """
+        Рекомендации userknn на массивах: ранг айтема - максимум
+        similarity * idf по соседям, которые его смотрели
+        (совпадает с ранжированием make_reco_pandas)
+        :param user_id: внутренний идентификатор пользователя датасета
+        :param k_recos: количество рекомендаций
+        :param filter_viewed: исключать ли просмотренное пользователем
+        (в том числе из дополнения популярным)
+        :return: внутренние id айтемов
+        """
+        try:
+            with span("neighbours"):
+                similar_users, similarity = self.neighbours(user_id)
+        except KeyError:
+            # пользователя нет в матрице близости модели
+            FALLBACKS.inc(self.name, "cold")
+            return self.popular.top(k_recos)
+
+        # удаляем самого себя
+        similar_users, similarity = similar_users[1:], similarity[1:]
+
+        with span("model"):
+            # извлекаем просмотренные фильмы близких пользователей
+            items, lengths = self.history.gather(similar_users)
+            rank_idf = np.repeat(similarity, lengths) * self.idf_dense[items]
+
+            # лучший скор айтема среди всех соседей
+            scores = np.full(len(self.idf_dense), -np.inf)
+            np.maximum.at(scores, items, rank_idf)
+            if filter_viewed:
+                scores[self.history.get(user_id)] = -np.inf
+            # при равных скорах - по возрастанию id, как в reco_batch
+            candidates = np.flatnonzero(scores > -np.inf)
+            top = top_k(scores[candidates][np.newaxis], k_recos)[0]
+            recos = candidates[top[top >= 0]]
+
+        # если рекомендаций меньше - дополняем популярным
+        if len(recos) < k_recos:
+            with span("popular_fill"):
+                recos = self.popular.fill(
+                    recos, k_recos,
+                    exclude=self.history.get(user_id) if filter_viewed
+                    else None)
+        return recos
+
+    def reco_batch(self, user_ids, k_recos=10) -> np.ndarray:
+        """
+        То же, что make_reco для каждого теплого пользователя, но одним
+        блочным расчетом (batch_scorer)
+        """
+        result = np.full((len(user_ids), k_recos), -1, dtype=np.int32)
+        # make_reco работает во внутренних id пользователей датасета
+        internal_ids = self.user_index.lookup_many(user_ids)
+        warm = np.flatnonzero(internal_ids >= 0)
+        with span("model"):
+            recos = self.batch_scorer.recommend(internal_ids[warm], k_recos,
+                                                filter_viewed=False)
+        for row, row_recos in zip(warm, recos):
+            # если рекомендаций меньше - дополняем популярным
+            row_recos = row_recos[row_recos >= 0]
+            if len(row_recos) < k_recos:
+                row_recos = self.popular.fill(row_recos, k_recos)
+            result[row, :len(row_recos)] = self.item_ids[row_recos]
+        return result
+
     def reco(self, user_id, k_recos=10) -> np.ndarray:
         """
         Получение К рекомендаций для пользователя
@@ -183,9 +643,11 @@ class KionRecoBM25(KionReco):
         :param k_recos: количество рекомендаций
         :return:
         """
-        if self.check_user(user_id):
+        with span("check_user"):
+            is_warm, internal_id = self.lookup_user(user_id)
+        if is_warm:
             # рекомендации для теплого пользователя (который попал в обучение)
-            df_recos = self.make_reco(user_id, k_recos)
-            return df_recos
+            return self.item_ids[self.make_reco(internal_id, k_recos)]
         else:
-            return self.sorted_top[:k_recos]
+            FALLBACKS.inc(self.name, "cold")
+            return self.popular_reco(k_recos)
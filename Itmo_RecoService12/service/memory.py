@@ -0,0 +1,60 @@
+"""
+Учет памяти процессов при работе под gunicorn с preload_app.
+
+При preload модели загружаются в мастере до fork, и воркеры делят
+страницы памяти по copy-on-write. Чтобы страницы не копировались,
+состояние моделей хранится в больших массивах NumPy, а остальные
+объекты мастера выводятся из-под GC через gc.freeze(): иначе проход
+сборщика мусора пишет в заголовки объектов и "пачкает" общие страницы.
+"""
+import gc
+import os
+import typing as tp
+
+SMAPS_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty",
+                "Private_Clean", "Private_Dirty", "Swap")
+
+
+def freeze_gc() -> None:
+    """
+    Вызывается в мастере перед fork воркеров
+    """
+    gc.collect()
+    gc.freeze()
+
+
+def memory_usage(pid: tp.Optional[int] = None) -> tp.Dict[str, int]:
+    """
+    Память процесса в килобайтах из /proc/<pid>/smaps_rollup (Linux)
+    :param pid: id процесса, по умолчанию текущий
+    :return: Rss, Pss, Shared_* и Private_*; пустой словарь, если
+    smaps_rollup недоступен
+    """
+    path = f"/proc/{pid or os.getpid()}/smaps_rollup"
+    try:
+        with open(path) as f:
+            return parse_smaps(f)
+    except OSError:
+        return {}
+
+
+def parse_smaps(lines: tp.Iterable[str]) -> tp.Dict[str, int]:
+    """
+    Поля SMAPS_FIELDS из текста smaps_rollup, в килобайтах
+    """
+    usage: tp.Dict[str, int] = {}
+    for line in lines:
+        name, _, value = line.partition(":")
+        if name in SMAPS_FIELDS:
+            usage[name] = int(value.split()[0])
+    return usage
+
+
+def memory_report(pid: tp.Optional[int] = None) -> str:
+    usage = memory_usage(pid)
+    if not usage:
+        return "memory usage is unavailable"
+    shared = usage["Shared_Clean"] + usage["Shared_Dirty"]
+    private = usage["Private_Clean"] + usage["Private_Dirty"]
+    return (f"rss={usage['Rss'] // 1024}MB pss={usage['Pss'] // 1024}MB "
+            f"shared={shared // 1024}MB private={private // 1024}MB")
@@ -0,0 +1,410 @@
+"""
+Метрики сервиса в текстовом формате Prometheus.
+
+Метрики живут в памяти процесса. Если задан metrics_dir, каждый воркер
+gunicorn периодически сохраняет снимок своих метрик в файл
+metrics_<pid>.json, а /metrics суммирует снимки всех воркеров. Счетчики
+и гистограммы завершившихся воркеров сохраняются, их gauge удаляются
+(mark_process_dead в хуке child_exit).
+"""
+import bisect
+import json
+import os
+import threading
+import typing as tp
+from pathlib import Path
+
+# границы корзин гистограмм
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+QUEUE_TIME_BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1,
+                      0.25, 0.5, 1.0)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+
+METRICS_FILE_PATTERN = "metrics_{pid}.json"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = tp.Tuple[str, ...]
+
+
+class Histogram:
+    """
+    Гистограмма с фиксированными границами корзин, как в Prometheus:
+    корзина le считает наблюдения со значением не больше le
+    """
+
+    def __init__(self, buckets: tp.Sequence[float]) -> None:
+        self.buckets = tuple(sorted(buckets))
+        # последняя корзина - +Inf
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self) -> tp.Dict[str, tp.Any]:
+        """
+        Накопленные значения корзин, сумма и количество наблюдений
+        """
+        with self._lock:
+            cumulative, total = {}, 0
+            for le, count in zip((*self.buckets, "+Inf"), self.counts):
+                total += count
+                cumulative[str(le)] = total
+            return {"buckets": cumulative, "sum": self.sum,
+                    "count": self.count}
+
+
+class Metric:
+    """
+    Метрика с метками: значение хранится для каждого набора значений
+    меток
+    """
+    kind = ""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tp.Sequence[str] = (),
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: tp.Dict[LabelValues, tp.Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: tp.Sequence[tp.Any]) -> LabelValues:
+        assert len(labels) == len(self.labelnames), self.name
+        return tuple(str(label) for label in labels)
+
+    def samples(self) -> tp.List[tp.Tuple[tp.Dict[str, str], tp.Any]]:
+        with self._lock:
+            items = list(self._values.items())
+        return [(dict(zip(self.labelnames, key)), self._dump(value))
+                for key, value in items]
+
+    def get(self, *labels: tp.Any) -> tp.Any:
+        return self._values.get(self._key(labels))
+
+    def remove(self, *labels: tp.Any) -> None:
+        with self._lock:
+            self._values.pop(self._key(labels), None)
+
+    def _dump(self, value: tp.Any) -> tp.Any:
+        return value
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels: tp.Any, amount: float = 1.0) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set(self, value: float, *labels: tp.Any) -> None:
+        """
+        Значение счетчика, который ведется в другом месте (кеш и т.п.)
+        """
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+
+class Gauge(Counter):
+    """
+    Текущее значение. mode - как объединять значения воркеров:
+    sum, max или all (значение каждого воркера с меткой pid)
+    """
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tp.Sequence[str] = (),
+        mode: str = "sum",
+    ) -> None:
+        assert mode in ("sum", "max", "all")
+        super().__init__(name, documentation, labelnames)
+        self.mode = mode
+
+    def dec(self, *labels: tp.Any, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+
+class LabeledHistogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tp.Sequence[str] = (),
+        buckets: tp.Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+
+    def observe(self, value: float, *labels: tp.Any) -> None:
+        key = self._key(labels)
+        histogram = self._values.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._values.setdefault(
+                    key, Histogram(self.buckets))
+        histogram.observe(value)
+
+    def _dump(self, value: Histogram) -> tp.Dict[str, tp.Any]:
+        return value.snapshot()
+
+
+class MetricsRegistry:
+    """
+    Набор метрик процесса. Коллекторы вызываются перед каждым снимком
+    и переносят в метрики состояние других объектов (кеша, пулов);
+    коллектор с тем же названием заменяет прежний
+    """
+
+    def __init__(self) -> None:
+        self.metrics: tp.Dict[str, Metric] = {}
+        self.collectors: tp.Dict[str, tp.Callable[[], None]] = {}
+
+    def register(self, metric: tp.Any) -> tp.Any:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def add_collector(
+        self,
+        name: str,
+        collector: tp.Callable[[], None],
+    ) -> None:
+        self.collectors[name] = collector
+
+    def snapshot(self) -> tp.Dict[str, tp.Any]:
+        for collector in self.collectors.values():
+            collector()
+        pid = str(os.getpid())
+        snapshot = {}
+        for name, metric in self.metrics.items():
+            mode = getattr(metric, "mode", None)
+            samples = metric.samples()
+            if mode == "all":
+                samples = [({**labels, "pid": pid}, value)
+                           for labels, value in samples]
+            snapshot[name] = {"kind": metric.kind, "mode": mode,
+                              "help": metric.documentation,
+                              "samples": samples}
+        return snapshot
+
+    def write(self, path: tp.Union[str, Path]) -> None:
+        """
+        Снимок метрик процесса в файл в директории path
+        """
+        _dump(self.snapshot(),
+              Path(path) / METRICS_FILE_PATTERN.format(pid=os.getpid()))
+
+    def render(self, path: tp.Optional[tp.Union[str, Path]] = None) -> str:
+        """
+        Метрики в текстовом формате Prometheus
+        :param path: директория снимков воркеров (None - только текущий
+            процесс)
+        """
+        if path is None:
+            return render(self.snapshot())
+        self.write(path)
+        snapshots = []
+        for file_path in sorted(Path(path).glob(
+                METRICS_FILE_PATTERN.format(pid="*"))):
+            try:
+                with open(file_path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):  # файл удален во время чтения
+                continue
+        return render(merge(snapshots))
+
+
+class MetricsWriter:
+    """
+    Периодическое сохранение снимка метрик воркера, чтобы /metrics,
+    обработанный другим воркером, видел свежие значения
+    """
+
+    def __init__(
+        self,
+        registry: MetricsRegistry,
+        path: tp.Union[str, Path],
+        interval: float = 5.0,
+    ) -> None:
+        self.registry = registry
+        self.path = Path(path)
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: tp.Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.registry.write(self.path)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name="metrics-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.registry.write(self.path)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.registry.write(self.path)
+
+
+def _dump(snapshot: tp.Dict[str, tp.Any], file_path: Path) -> None:
+    tmp_path = file_path.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(snapshot, f)
+    # атомарная замена: читатель не увидит недописанный файл
+    os.replace(tmp_path, file_path)
+
+
+def merge(
+    snapshots: tp.Iterable[tp.Dict[str, tp.Any]],
+) -> tp.Dict[str, tp.Any]:
+    """
+    Объединение снимков метрик нескольких процессов
+    """
+    merged: tp.Dict[str, tp.Any] = {}
+    for snapshot in snapshots:
+        for name, family in snapshot.items():
+            target = merged.setdefault(
+                name, {**family, "samples": {}})["samples"]
+            for labels, value in family["samples"]:
+                key = tuple(sorted(labels.items()))
+                if key not in target:
+                    target[key] = (labels, value)
+                    continue
+                current = target[key][1]
+                if family["kind"] == "histogram":
+                    value = {
+                        "buckets": {le: count + current["buckets"][le]
+                                    for le, count in value["buckets"].items()},
+                        "sum": value["sum"] + current["sum"],
+                        "count": value["count"] + current["count"],
+                    }
+                elif family["mode"] == "max":
+                    value = max(value, current)
+                else:
+                    value = value + current
+                target[key] = (labels, value)
+    for family in merged.values():
+        family["samples"] = list(family["samples"].values())
+    return merged
+
+
+def _format_labels(labels: tp.Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for name, value in labels.items():
+        value = value.replace("\\", r"\\").replace('"', r"\"") \
+            .replace("\n", r"\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def render(snapshot: tp.Dict[str, tp.Any]) -> str:
+    """
+    Снимок метрик в текстовом формате Prometheus
+    """
+    lines = []
+    for name, family in sorted(snapshot.items()):
+        lines.append(f"# HELP {name} {family['help']}")
+        lines.append(f"# TYPE {name} {family['kind']}")
+        for labels, value in family["samples"]:
+            if family["kind"] != "histogram":
+                lines.append(f"{name}{_format_labels(labels)} {float(value)}")
+                continue
+            for le, count in value["buckets"].items():
+                lines.append(f"{name}_bucket"
+                             f"{_format_labels({**labels, 'le': le})} "
+                             f"{float(count)}")
+            lines.append(f"{name}_sum{_format_labels(labels)} "
+                         f"{float(value['sum'])}")
+            lines.append(f"{name}_count{_format_labels(labels)} "
+                         f"{float(value['count'])}")
+    return "\n".join(lines) + "\n"
+
+
+def mark_process_dead(pid: int, path: tp.Union[str, Path]) -> None:
+    """
+    Удаление gauge завершившегося воркера: его запросы в обработке и
+    модели больше не актуальны, счетчики и гистограммы остаются
+    """
+    file_path = Path(path) / METRICS_FILE_PATTERN.format(pid=pid)
+    try:
+        with open(file_path) as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return
+    _dump({name: family for name, family in snapshot.items()
+           if family["kind"] != "gauge"}, file_path)
+
+
+def clear(path: tp.Union[str, Path]) -> None:
+    """
+    Удаление снимков прошлого запуска сервиса
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    for file_path in path.glob(METRICS_FILE_PATTERN.format(pid="*")):
+        file_path.unlink()
+
+
+METRICS = MetricsRegistry()
+
+REQUEST_LATENCY = METRICS.register(LabeledHistogram(
+    "reco_request_duration_seconds",
+    "Request latency by model and status code",
+    ("model", "status")))
+REQUESTS_IN_FLIGHT = METRICS.register(Gauge(
+    "reco_requests_in_flight",
+    "Requests being processed by model",
+    ("model",)))
+MODEL_INFO = METRICS.register(Gauge(
+    "reco_model_info",
+    "Loaded model versions",
+    ("model", "version"), mode="max"))
+MODEL_LOAD_SECONDS = METRICS.register(Gauge(
+    "reco_model_load_seconds",
+    "Duration of the last model (re)load in the worker",
+    ("model",), mode="all"))
+FALLBACKS = METRICS.register(Counter(
+    "reco_fallback_total",
+    "Users served popular items instead of model recommendations",
+    ("model", "reason")))
+STAGE_LATENCY = METRICS.register(LabeledHistogram(
+    "reco_stage_duration_seconds",
+    "Duration of request stages in sampled requests (service.spans)",
+    ("stage",)))
+CACHE_HITS = METRICS.register(Counter(
+    "reco_cache_hits_total", "Recommendation cache hits", ("model",)))
+CACHE_MISSES = METRICS.register(Counter(
+    "reco_cache_misses_total", "Recommendation cache misses", ("model",)))
+CACHE_EVICTIONS = METRICS.register(Counter(
+    "reco_cache_evictions_total", "Recommendation cache evictions",
+    ("model",)))
+CACHE_ENTRIES = METRICS.register(Gauge(
+    "reco_cache_entries", "Entries in the recommendation cache"))
+CACHE_BYTES = METRICS.register(Gauge(
+    "reco_cache_bytes", "Approximate size of the recommendation cache"))
+EXECUTOR_QUEUED = METRICS.register(Gauge(
+    "reco_executor_queued", "Scoring calls waiting for a pool worker",
+    ("model",)))
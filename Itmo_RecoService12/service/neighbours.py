@@ -0,0 +1,102 @@
+"""
+Таблица ближайших соседей пользователей для userknn.
+
+Для каждой строки матрицы близостей implicit (пользователя модели)
+заранее выбираются n лучших соседей: строки матрицы обрабатываются
+блоками в пуле потоков, внутри блока - одной сортировкой плотной
+матрицы [строки блока, длина строки] без цикла по пользователям.
+Результат - матрицы [n_rows, n] id соседей (int32, -1 - пустая
+позиция) и близостей (float32), которые сохраняются в артефакт модели
+и открываются через memory-map: запрос читает одну строку, модель
+implicit не нужна.
+"""
+import os
+import typing as tp
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from scipy import sparse
+
+
+def _block_top(
+    similarity: sparse.csr_matrix,
+    start: int,
+    end: int,
+    ids: np.ndarray,
+    sims: np.ndarray,
+    max_width: int = 512,
+) -> None:
+    n = ids.shape[1]
+    indptr = similarity.indptr[start:end + 1]
+    lengths = np.diff(indptr)
+    # короткие строки блока укладываются в плотную матрицу
+    # [строки, max(длина)] и сортируются все сразу по второй оси
+    short = np.flatnonzero(lengths <= max_width)
+    width = int(lengths[short].max()) if len(short) else 0
+    if width:
+        short_lengths = lengths[short]
+        positions = np.arange(short_lengths.sum()) + np.repeat(
+            indptr[short] - np.cumsum(short_lengths) + short_lengths,
+            short_lengths)
+        rows = np.repeat(np.arange(len(short)), short_lengths)
+        rank = np.arange(len(positions)) \
+            - np.repeat(np.cumsum(short_lengths) - short_lengths,
+                        short_lengths)
+        data = np.full((len(short), width), -np.inf,
+                       dtype=similarity.data.dtype)
+        cols = np.full((len(short), width), -1, dtype=np.int32)
+        data[rows, rank] = similarity.data[positions]
+        cols[rows, rank] = similarity.indices[positions]
+        # устойчивая сортировка: при равных близостях - по возрастанию
+        # столбца (индексы строк CSR отсортированы)
+        order = np.argsort(-data, axis=1, kind="stable")[:, :n]
+        top = np.take_along_axis(data, order, axis=1)
+        found = np.isfinite(top)
+        ids[start + short, :order.shape[1]] = np.where(
+            found, np.take_along_axis(cols, order, axis=1), -1)
+        sims[start + short, :order.shape[1]] = np.where(found, top, 0)
+    # редкие длинные строки - по одной
+    for row in np.flatnonzero(lengths > max_width):
+        lo, hi = indptr[row], indptr[row + 1]
+        data = similarity.data[lo:hi]
+        best = np.argsort(-data, kind="stable")[:n]
+        ids[start + row, :len(best)] = similarity.indices[lo:hi][best]
+        sims[start + row, :len(best)] = data[best]
+
+
+def top_neighbours(
+    similarity: sparse.csr_matrix,
+    n: int,
+    n_rows: tp.Optional[int] = None,
+    block_size: int = 16_384,
+    n_threads: tp.Optional[int] = None,
+) -> tp.Tuple[np.ndarray, np.ndarray]:
+    """
+    n лучших элементов каждой строки матрицы близостей (при равных
+    близостях - по возрастанию столбца)
+    :param similarity: матрица близостей пользователей модели
+    :param n: количество соседей
+    :param n_rows: количество строк результата (по умолчанию - строк
+    матрицы), строки за пределами матрицы пустые
+    :param block_size: строк матрицы в одном блоке
+    :param n_threads: потоков (по умолчанию - по числу ядер)
+    :return: матрицы [n_rows, n] столбцов (int32, -1 - пустая позиция)
+    и близостей (float32)
+    """
+    similarity = sparse.csr_matrix(similarity)
+    if not similarity.has_sorted_indices:
+        similarity = similarity.sorted_indices()
+    n_rows = similarity.shape[0] if n_rows is None else n_rows
+    ids = np.full((n_rows, n), -1, dtype=np.int32)
+    sims = np.zeros((n_rows, n), dtype=np.float32)
+    n_filled = min(n_rows, similarity.shape[0])
+    blocks = [(start, min(start + block_size, n_filled))
+              for start in range(0, n_filled, block_size)]
+    # сортировка NumPy отпускает GIL, блоки пишут в разные строки
+    with ThreadPoolExecutor(n_threads or os.cpu_count()) as pool:
+        for _ in pool.map(
+                lambda block: _block_top(similarity, block[0], block[1],
+                                         ids, sims),
+                blocks):
+            pass
+    return ids, sims
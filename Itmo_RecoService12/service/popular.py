@@ -0,0 +1,104 @@
+"""
+Популярные айтемы для холодных пользователей и коротких списков.
+
+Популярность считается один раз на датасет: модели с одним и тем же
+файлом датасета получают общий объект (shared_popularity). Дополнение
+списка рекомендаций идет по префиксу популярного с проверкой по
+небольшому множеству уже выбранных (и, по желанию, просмотренных)
+айтемов, без DataFrame и проходов по всему каталогу.
+"""
+import threading
+import typing as tp
+from pathlib import Path
+
+import numpy as np
+
+
+class Popularity:
+    """
+    Айтемы по убыванию количества взаимодействий (при равенстве - по
+    возрастанию id)
+    """
+
+    def __init__(self, items: np.ndarray) -> None:
+        self.items = items
+
+    @classmethod
+    def from_interactions(
+        cls,
+        item_ids: np.ndarray,
+        n_items: tp.Optional[int] = None,
+    ) -> "Popularity":
+        """
+        :param item_ids: внутренние id айтемов взаимодействий
+        :param n_items: количество айтемов (по умолчанию max + 1)
+        """
+        item_ids = np.asarray(item_ids)
+        counts = np.bincount(item_ids, minlength=n_items or 0)
+        order = np.argsort(-counts, kind="stable")
+        return cls(order[counts[order] > 0].astype(np.int32))
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def top(self, k: int) -> np.ndarray:
+        return self.items[:k]
+
+    def fill(
+        self,
+        recos: np.ndarray,
+        k: int,
+        exclude: tp.Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """
+        Дополнение рекомендаций популярным до k айтемов
+        :param recos: рекомендации модели (без повторов)
+        :param k: нужная длина списка
+        :param exclude: айтемы, которые нельзя добавлять (например,
+        просмотренные пользователем)
+        :return: recos и недостающие популярные айтемы не из recos и
+        exclude; короче k, только если популярное закончилось
+        """
+        n_missing = k - len(recos)
+        if n_missing <= 0:
+            return recos[:k]
+        skip = set(recos.tolist())
+        if exclude is not None:
+            skip.update(exclude.tolist())
+        # среди первых n_missing + len(skip) популярных айтемов хотя бы
+        # n_missing не попадают в skip
+        extra = []
+        for item_id in self.items[:n_missing + len(skip)].tolist():
+            if item_id not in skip:
+                extra.append(item_id)
+                if len(extra) == n_missing:
+                    break
+        return np.concatenate(
+            [recos, np.asarray(extra, dtype=self.items.dtype)])
+
+
+_shared: tp.Dict[tp.Tuple[str, int], Popularity] = {}
+_shared_lock = threading.Lock()
+
+
+def shared_popularity(
+    dataset_path: tp.Union[str, Path],
+    item_ids: np.ndarray,
+    n_items: tp.Optional[int] = None,
+) -> Popularity:
+    """
+    Общая популярность для всех моделей, загруженных из одной версии
+    файла датасета
+    :param dataset_path: файл датасета
+    :param item_ids: внутренние id айтемов взаимодействий датасета
+    :param n_items: количество айтемов датасета
+    """
+    path = Path(dataset_path).resolve()
+    key = (str(path), path.stat().st_mtime_ns)
+    with _shared_lock:
+        if key not in _shared:
+            # популярность прошлых версий датасета больше не нужна
+            for old_key in [k for k in _shared if k[0] == key[0]]:
+                del _shared[old_key]
+            _shared[key] = Popularity.from_interactions(item_ids, n_items)
+        return _shared[key]
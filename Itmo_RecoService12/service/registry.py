@@ -0,0 +1,380 @@
+import json
+import threading
+import time
+import typing as tp
+from pathlib import Path
+
+from .log import app_logger
+from .metrics import MODEL_INFO, MODEL_LOAD_SECONDS
+from .settings import ModelSpec
+
+# сколько теплых пользователей проверять, если canary_user_ids не заданы
+N_CANARY_USERS = 3
+
+
+class ModelReloadError(Exception):
+    """
+    Новая версия модели не прошла проверку на канареечных пользователях
+    """
+
+
+def load_model(spec: ModelSpec) -> tp.Any:
+    """
+    Загрузка модели по ее описанию из конфига
+    """
+    # импорт внутри функции: rectools и модели нужны только при загрузке
+    from .artifacts import import_model, is_artifact
+    from .make_reco import KionReco, KionRecoBM25
+    from .topk_table import KionRecoTable
+
+    # бинарный артефакт в приоритете, dill - запасной вариант
+    if spec.artifact_path is not None and is_artifact(spec.artifact_path):
+        model = import_model(spec.artifact_path, verify=spec.verify_artifact)
+    elif spec.kind == "KionReco":
+        model = KionReco(spec.model_path, spec.dataset_path)
+    elif spec.kind == "KionRecoBM25":
+        model = KionRecoBM25(spec.model_path, spec.dataset_path)
+    elif spec.kind == "KionRecoTable":
+        model = KionRecoTable(spec.table_path)
+    else:
+        raise ValueError(f"Unknown model kind {spec.kind}")
+
+    if spec.ann_path is not None:
+        from .ann import check_index, load_index
+        from .scorers import VectorScorer
+
+        if not isinstance(getattr(model, "scorer", None), VectorScorer):
+            raise ValueError("ANN index requires a vector model")
+        index = load_index(spec.ann_path, spec.ann_n_probe)
+        check_index(index, model.scorer.item_vectors, model.version)
+        model.scorer.index = index
+    return model
+
+
+def check_model(
+    model: tp.Any,
+    user_ids: tp.Sequence[int],
+    k_recos: int = 10,
+) -> None:
+    """
+    Прогрев и проверка модели: для каждого пользователя рекомендации
+    должны считаться без ошибок, быть непустыми и не длиннее k_recos
+    """
+    for user_id in user_ids:
+        recos = model.reco(user_id=user_id, k_recos=k_recos)
+        if not 0 < len(recos) <= k_recos:
+            raise ModelReloadError(
+                f"Unexpected {len(recos)} recos for user {user_id}")
+
+
+def spec_version(spec: ModelSpec) -> str:
+    """
+    Версия модели по ее файлам, без загрузки (совпадает с model.version)
+    """
+    from .artifacts import MANIFEST_FILE, is_artifact
+    from .topk_table import ITEMS_FILE
+
+    if spec.artifact_path is not None and is_artifact(spec.artifact_path):
+        with open(Path(spec.artifact_path) / MANIFEST_FILE) as f:
+            return json.load(f)["meta"]["version"]
+    if spec.kind == "KionRecoTable":
+        return str(int((Path(spec.table_path) / ITEMS_FILE).stat().st_mtime))
+    return str(int(Path(spec.model_path).stat().st_mtime))
+
+
+def spec_stamp(spec: ModelSpec) -> tp.Tuple[float, ...]:
+    """
+    Времена изменения файлов модели: по ним наблюдатель замечает новую
+    версию. У артефакта смотрим на манифест, он пишется последним.
+    """
+    from .ann import META_FILE as ANN_META_FILE
+    from .artifacts import MANIFEST_FILE
+    from .topk_table import ITEMS_FILE
+
+    paths = [spec.model_path, spec.dataset_path]
+    if spec.artifact_path is not None:
+        paths.append(Path(spec.artifact_path) / MANIFEST_FILE)
+    if spec.table_path is not None:
+        paths.append(Path(spec.table_path) / ITEMS_FILE)
+    if spec.ann_path is not None:
+        paths.append(Path(spec.ann_path) / ANN_META_FILE)
+    return tuple(Path(path).stat().st_mtime
+                 if path is not None and Path(path).exists() else 0.0
+                 for path in paths)
+
+
+class ModelRegistry:
+    """
+    Реестр моделей сервиса.
+
+    Хранит только описания моделей; сама модель загружается при первом
+    обращении или явным вызовом warmup. Отключенные модели не
+    загружаются и не видны сервису.
+
+    reload загружает новую версию рядом со старой, проверяет ее и
+    подменяет одним присваиванием. Запросы в обработке держат ссылку на
+    старую модель, она освобождается после их завершения. Модель пула
+    процессов (executor="process") после проверки в реестре не остается:
+    ее загружают только процессы пула.
+    """
+
+    def __init__(self, specs: tp.Dict[str, ModelSpec]) -> None:
+        self.specs = {name: spec for name, spec in specs.items()
+                      if spec.enabled}
+        self.errors: tp.Dict[str, str] = {}
+        self._models: tp.Dict[str, tp.Any] = {}
+        self._versions: tp.Dict[str, tp.Tuple[ModelSpec, str]] = {}
+        self._locks = {name: threading.Lock() for name in self.specs}
+        self._reload_locks = {name: threading.Lock() for name in self.specs}
+        self._listeners: tp.List[tp.Callable[[str], None]] = []
+
+    def __contains__(self, name: object) -> bool:
+        return name in self.specs
+
+    def __iter__(self) -> tp.Iterator[str]:
+        return iter(self.specs)
+
+    def __len__(self) -> int:
+        return len(self.specs)
+
+    def __getitem__(self, name: str) -> tp.Any:
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        # повторная проверка под блокировкой: модель грузится один раз
+        with self._locks[name]:
+            if name not in self._models:
+                started_at = time.perf_counter()
+                model = load_model(self.specs[name])
+                self._register(name, model, time.perf_counter() - started_at)
+                self._models[name] = model
+                app_logger.info(
+                    f"Model {name} loaded in "
+                    f"{time.perf_counter() - started_at:.1f}s")
+            return self._models[name]
+
+    def get(self, name: str, default: tp.Any = None) -> tp.Any:
+        return self[name] if name in self else default
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    def version(self, name: str) -> str:
+        """
+        Версия модели. Незагруженная модель (например, считаемая в пуле
+        процессов) не загружается: версия читается по файлам ее описания
+        один раз на описание, как и модель в процессах пула
+        """
+        model = self._models.get(name)
+        if model is not None:
+            return model.version
+        spec = self.specs[name]
+        cached = self._versions.get(name)
+        if cached is None or cached[0] is not spec:
+            cached = self._versions[name] = (spec, spec_version(spec))
+        return cached[1]
+
+    def _version(self, name: str) -> tp.Optional[str]:
+        """
+        Версия загруженной модели или уже прочитанная по файлам, без
+        чтения файлов
+        """
+        model = self._models.get(name)
+        if model is not None:
+            return model.version
+        cached = self._versions.get(name)
+        return None if cached is None else cached[1]
+
+    def warmup(self, names: tp.Optional[tp.Iterable[str]] = None) -> None:
+        """
+        Загрузка моделей заранее (по умолчанию всех включенных)
+        """
+        for name in self.specs if names is None else names:
+            self[name]
+
+    @staticmethod
+    def _register(name: str, model: tp.Any, load_time: float) -> None:
+        """
+        Название модели для ее метрик и метрики загрузки
+        """
+        model.name = name
+        MODEL_INFO.set(1, name, model.version)
+        MODEL_LOAD_SECONDS.set(load_time, name)
+
+    def add_listener(self, listener: tp.Callable[[str], None]) -> None:
+        """
+        Обработчик, вызываемый с названием модели после ее подмены
+        (например, сброс кеша рекомендаций)
+        """
+        self._listeners.append(listener)
+
+    def reload(
+        self,
+        name: str,
+        spec: tp.Optional[ModelSpec] = None,
+        k_recos: int = 10,
+    ) -> tp.Any:
+        """
+        Загрузка новой версии модели и подмена текущей. При ошибке
+        загрузки или проверки продолжает работать старая версия
+        :param name: название модели
+        :param spec: новое описание модели (по умолчанию текущее)
+        :param k_recos: длина выдачи для проверки
+        :return: новая модель (модель пула процессов проверяется и в
+            реестре не остается)
+        """
+        with self._reload_locks[name]:
+            return self._reload(name, spec or self.specs[name], k_recos)
+
+    def _reload(self, name: str, spec: ModelSpec, k_recos: int) -> tp.Any:
+        # вызывается под self._reload_locks[name]
+        started_at = time.perf_counter()
+        try:
+            model = load_model(spec)
+            model.name = name
+            load_time = time.perf_counter() - started_at
+            user_ids = spec.canary_user_ids
+            if not user_ids and hasattr(model, "warm_users"):
+                user_ids = list(model.warm_users()[:N_CANARY_USERS])
+            check_model(model, user_ids, k_recos)
+        except Exception as e:
+            self.errors[name] = repr(e)
+            app_logger.warning(f"Model {name} reload failed: {e!r}")
+            raise
+        old_version = self._version(name)
+        if old_version is not None:
+            MODEL_INFO.remove(name, old_version)
+        self._register(name, model, load_time)
+        self.specs[name] = spec
+        self._versions[name] = (spec, model.version)
+        if spec.executor == "process":
+            # модель считается в пуле процессов: в воркере она нужна
+            # только для проверки, пул пересоздается обработчиком
+            # (ModelExecutors.reset) и загрузит новую версию сам
+            self._models.pop(name, None)
+        else:
+            self._models[name] = model
+        self.errors.pop(name, None)
+        for listener in self._listeners:
+            listener(name)
+        app_logger.info(
+            f"Model {name} reloaded in "
+            f"{time.perf_counter() - started_at:.1f}s: "
+            f"{old_version} -> {model.version}")
+        return model
+
+    def reload_in_background(
+        self,
+        name: str,
+        spec: tp.Optional[ModelSpec] = None,
+        k_recos: int = 10,
+    ) -> bool:
+        """
+        Перезагрузка модели в отдельном потоке
+        :return: False, если перезагрузка этой модели уже идет
+        """
+        # блокировка берется здесь, а отпускается потоком: проверка и
+        # запуск перезагрузки атомарны
+        lock = self._reload_locks[name]
+        if not lock.acquire(blocking=False):
+            return False
+        spec = spec or self.specs[name]
+
+        def target() -> None:
+            try:
+                self._reload(name, spec, k_recos)
+            except Exception:  # ошибка уже записана в errors
+                pass
+            finally:
+                lock.release()
+
+        try:
+            threading.Thread(target=target, name=f"reload-{name}",
+                             daemon=True).start()
+        except Exception:
+            lock.release()
+            raise
+        return True
+
+    def is_reloading(self, name: str) -> bool:
+        return self._reload_locks[name].locked()
+
+    def status(self) -> tp.Dict[str, tp.Dict[str, tp.Any]]:
+        """
+        Состояние моделей: загружена ли, версия, идет ли перезагрузка
+        и последняя ошибка перезагрузки
+        """
+        return {
+            name: {
+                "loaded": self.is_loaded(name),
+                "version": self._version(name),
+                "reloading": self.is_reloading(name),
+                "error": self.errors.get(name),
+            }
+            for name in self.specs
+        }
+
+
+class ModelWatcher:
+    """
+    Наблюдатель за файлами моделей: раз в interval секунд сравнивает
+    времена изменения файлов загруженных моделей и при изменении
+    перезагружает модель через реестр
+    """
+
+    def __init__(
+        self,
+        registry: ModelRegistry,
+        interval: float = 10.0,
+        k_recos: int = 10,
+    ) -> None:
+        self.registry = registry
+        self.interval = interval
+        self.k_recos = k_recos
+        self._stamps = {name: (spec, spec_stamp(spec))
+                        for name, spec in registry.specs.items()}
+        self._stop = threading.Event()
+        self._thread: tp.Optional[threading.Thread] = None
+
+    def check(self) -> tp.List[str]:
+        """
+        Один проход наблюдателя
+        :return: названия перезагруженных моделей
+        """
+        reloaded = []
+        for name, spec in self.registry.specs.items():
+            stamp = spec_stamp(spec)
+            old_spec, old_stamp = self._stamps.get(name, (None, None))
+            if stamp == old_stamp:
+                continue
+            # запоминаем сразу: битые файлы не перезагружаем по кругу
+            self._stamps[name] = (spec, stamp)
+            # незагруженная модель и так прочитает новые файлы (кроме
+            # модели пула процессов: ее процессы держат старую версию),
+            # а новое описание модели уже загружено через reload
+            in_use = (self.registry.is_loaded(name)
+                      or spec.executor == "process")
+            if not in_use or spec is not old_spec:
+                continue
+            try:
+                self.registry.reload(name, k_recos=self.k_recos)
+                reloaded.append(name)
+            except Exception:  # ошибка уже записана в реестре
+                pass
+        return reloaded
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name="model-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.check()
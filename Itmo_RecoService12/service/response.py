@@ -7,6 +7,7 @@ from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 
 from service.models import Error
+from service.spans import span
 
 
 class EnhancedJSONEncoder(json.JSONEncoder):
@@ -34,6 +35,16 @@ class DataclassJSONResponse(JSONResponse):
         ).encode("utf-8")
 
 
+class TimedJSONResponse(JSONResponse):
+    """
+    JSONResponse с замером времени сериализации ответа
+    """
+
+    def render(self, content: tp.Any) -> bytes:
+        with span("render"):
+            return super().render(content)
+
+
 def create_response(
     status_code: int,
     message: tp.Optional[str] = None,
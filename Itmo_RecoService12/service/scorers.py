@@ -0,0 +1,315 @@
+"""
+Расчет рекомендаций на массивах NumPy без обращения к rectools.
+
+Скореры работают во внутренних id пользователей и айтемов датасета и
+возвращают матрицу [n_users, k] внутренних id айтемов, где недостающие
+позиции заполнены -1.
+"""
+import typing as tp
+
+import numpy as np
+from scipy import sparse
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Построчный top-K по матрице скоров через argpartition. При равных
+    скорах выбираются и идут первыми айтемы с меньшим индексом, поэтому
+    результат не зависит от размера пачки.
+    :param scores: матрица [n_users, n_items], -inf - недопустимый айтем
+    :param k: количество рекомендаций
+    :return: матрица [n_users, k] индексов айтемов, -1 для пустых позиций
+    """
+    n_rows, n_cols = scores.shape
+    k_top = min(k, n_cols)
+    result = np.full((n_rows, k), -1, dtype=np.int32)
+    if k_top == 0 or n_rows == 0:
+        return result
+    if k_top < n_cols:
+        top = np.argpartition(-scores, k_top - 1, axis=1)[:, :k_top]
+        # argpartition выбирает из равных k-му скору произвольные
+        # айтемы: такие строки (обычно их мало) выбираются заново
+        kth = np.take_along_axis(scores, top, axis=1).min(axis=1)
+        ties = np.flatnonzero(
+            (scores == kth[:, np.newaxis]).sum(axis=1)
+            > (np.take_along_axis(scores, top, axis=1)
+               == kth[:, np.newaxis]).sum(axis=1))
+        for row in ties:
+            greater = np.flatnonzero(scores[row] > kth[row])
+            equal = np.flatnonzero(scores[row] == kth[row])
+            top[row] = np.concatenate(
+                [greater, equal[:k_top - len(greater)]])
+        top.sort(axis=1)
+    else:
+        top = np.tile(np.arange(n_cols), (n_rows, 1))
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind="stable")
+    top = np.take_along_axis(top, order, axis=1)
+    top_scores = np.take_along_axis(top_scores, order, axis=1)
+    result[:, :k_top] = np.where(np.isneginf(top_scores), -1, top)
+    return result
+
+
+def csr_rows(
+    matrix: sparse.csr_matrix,
+    rows: np.ndarray,
+) -> tp.Tuple[np.ndarray, np.ndarray]:
+    """
+    Координаты ненулевых элементов строк rows CSR-матрицы без
+    построения подматрицы
+    :return: номера строк в rows и столбцы
+    """
+    starts = matrix.indptr[rows]
+    lengths = matrix.indptr[rows + 1] - starts
+    # позиции элементов строки j: starts[j] + 0..lengths[j] - 1
+    positions = np.arange(lengths.sum()) \
+        + np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return np.repeat(np.arange(len(rows)), lengths), \
+        matrix.indices[positions]
+
+
+class KNNScorer:
+    """
+    Item-KNN (implicit ItemItemRecommender): скор айтема - взвешенная
+    история пользователя, умноженная на матрицу близости айтемов.
+    Рекомендуются только айтемы с ненулевым скором, как в implicit.
+    """
+
+    def __init__(
+        self,
+        similarity: sparse.csr_matrix,
+        user_items: sparse.csr_matrix,
+    ) -> None:
+        self.similarity = similarity
+        self.user_items = user_items
+
+    def recommend(
+        self,
+        user_rows: np.ndarray,
+        k: int,
+        filter_viewed: bool = True,
+    ) -> np.ndarray:
+        user_items = self.user_items[user_rows]
+        scores = (user_items @ self.similarity).tocsr()
+        dense = np.full(scores.shape, -np.inf)
+        rows = np.repeat(np.arange(scores.shape[0]), np.diff(scores.indptr))
+        dense[rows, scores.indices] = scores.data
+        if filter_viewed:
+            viewed = user_items.tocoo()
+            dense[viewed.row, viewed.col] = -np.inf
+        return top_k(dense, k)
+
+
+class VectorScorer:
+    """
+    Модели с векторами пользователей и айтемов (LightFM, ALS):
+    скор - скалярное произведение векторов. Смещения LightFM входят
+    в векторы дополнительными столбцами.
+
+    Векторы хранятся в float32; для одного пользователя скоры считаются
+    одним произведением матрицы айтемов на вектор, просмотренное
+    исключается по строке CSR-истории, top-K - через argpartition.
+    С индексом index (service.ann) скоры считаются только для
+    айтемов-кандидатов индекса.
+    """
+
+    def __init__(
+        self,
+        user_vectors: np.ndarray,
+        item_vectors: np.ndarray,
+        user_items: tp.Optional[sparse.csr_matrix] = None,
+        index: tp.Optional[tp.Any] = None,
+    ) -> None:
+        # массивы нужного типа (в том числе memory-mapped) не копируются
+        self.user_vectors = np.asarray(user_vectors, dtype=np.float32)
+        self.item_vectors = np.ascontiguousarray(item_vectors,
+                                                 dtype=np.float32)
+        self.user_items = user_items
+        self.index = index
+
+    def viewed(self, user_rows: np.ndarray) -> tp.List[np.ndarray]:
+        indptr = self.user_items.indptr
+        return [self.user_items.indices[indptr[row]:indptr[row + 1]]
+                for row in user_rows]
+
+    def recommend(
+        self,
+        user_rows: np.ndarray,
+        k: int,
+        filter_viewed: bool = True,
+    ) -> np.ndarray:
+        user_rows = np.asarray(user_rows)
+        if self.index is not None:
+            viewed = self.viewed(user_rows) \
+                if filter_viewed and self.user_items is not None else None
+            return self.index.search(self.user_vectors[user_rows], k,
+                                     viewed=viewed)
+        if len(user_rows) == 1:
+            scores = (self.item_vectors
+                      @ self.user_vectors[user_rows[0]])[np.newaxis]
+        else:
+            scores = self.user_vectors[user_rows] @ self.item_vectors.T
+        if filter_viewed and self.user_items is not None:
+            rows, cols = csr_rows(self.user_items, user_rows)
+            scores[rows, cols] = -np.inf
+        return top_k(scores, k)
+
+
+class UserKNNScorer:
+    """
+    User-KNN (userknn) для пачек пользователей: скор айтема - близость
+    соседа, который его смотрел, умноженная на idf айтема. По соседям
+    скоры агрегируются:
+    - max - максимум, как в KionRecoBM25.make_reco и make_reco_pandas,
+      поэтому пакетный расчет совпадает с онлайн-рекомендациями;
+    - sum - сумма, то есть (S @ R) * idf, где S - разреженная матрица
+      близостей соседей, R - матрица просмотров (классический userknn).
+    Пользователи считаются блоками: плотная матрица скоров блока
+    [пользователи, айтемы] занимает не больше memory_budget байт.
+    Работает во внутренних id пользователей и айтемов датасета.
+    """
+
+    def __init__(
+        self,
+        neighbour_ids: np.ndarray,
+        neighbour_sims: np.ndarray,
+        users_rows: np.ndarray,
+        history: tp.Any,
+        idf: np.ndarray,
+        aggregate: str = "max",
+        memory_budget: int = 256 << 20,
+    ) -> None:
+        """
+        :param neighbour_ids: таблица соседей [строки модели, n]
+        (service.neighbours) по убыванию близости, первый сосед - сам
+        пользователь
+        :param neighbour_sims: близости соседей
+        :param users_rows: строка таблицы для внутреннего id
+        пользователя (-1 - пользователя нет в модели)
+        :param history: HistoryStore с просмотрами
+        :param idf: idf по внутренним id айтемов
+        """
+        if aggregate not in ("max", "sum"):
+            raise ValueError(f"Unknown aggregate {aggregate}")
+        self.neighbour_ids = neighbour_ids
+        self.neighbour_sims = neighbour_sims
+        self.users_rows = users_rows
+        self.history = history
+        self.idf = idf
+        self.aggregate = aggregate
+        self.memory_budget = memory_budget
+        self.viewed = None
+        if aggregate == "sum":
+            self.viewed = sparse.csr_matrix(
+                (np.ones(len(history.indices), dtype=np.float32),
+                 history.indices, history.indptr),
+                shape=(len(history), len(idf)))
+
+    @property
+    def block_size(self) -> int:
+        # матрица скоров и служебные массивы того же порядка
+        return max(1, self.memory_budget // (8 * len(self.idf)))
+
+    def _scores(self, user_ids: np.ndarray) -> np.ndarray:
+        rows = self.users_rows[user_ids]
+        # первый сосед - сам пользователь, как в make_reco
+        neighbours = self.neighbour_ids[rows, 1:]
+        sims = self.neighbour_sims[rows, 1:]
+        # float64, как в make_reco: иначе округление меняет порядок
+        # близких скоров
+        scores = np.full((len(user_ids), len(self.idf)), -np.inf)
+        if self.aggregate == "max":
+            # соседи идут по убыванию близости, а idf > 0, поэтому
+            # максимум similarity * idf дает первый сосед, смотревший
+            # айтем: записываем соседей с конца, ближние перезаписывают
+            # дальних (без np.maximum.at)
+            for column in range(neighbours.shape[1] - 1, -1, -1):
+                found = np.flatnonzero(neighbours[:, column] >= 0)
+                items, lengths = self.history.gather(
+                    neighbours[found, column])
+                scores[np.repeat(found, lengths), items] = np.repeat(
+                    sims[found, column], lengths) * self.idf[items]
+            return scores
+        valid = neighbours >= 0
+        similarity = sparse.csr_matrix(
+            (sims[valid], (np.nonzero(valid)[0], neighbours[valid])),
+            shape=(len(user_ids), len(self.history)))
+        sums = (similarity @ self.viewed).tocsr()
+        sums_rows = np.repeat(np.arange(len(user_ids)), np.diff(sums.indptr))
+        scores[sums_rows, sums.indices] = sums.data * self.idf[sums.indices]
+        return scores
+
+    def recommend(
+        self,
+        user_ids: np.ndarray,
+        k: int,
+        filter_viewed: bool = True,
+    ) -> np.ndarray:
+        """
+        :param user_ids: внутренние id пользователей датасета,
+        пользователи не из модели получают пустые строки
+        :return: матрица [len(user_ids), k] внутренних id айтемов, -1
+        для пустых позиций
+        """
+        user_ids = np.asarray(user_ids)
+        result = np.full((len(user_ids), k), -1, dtype=np.int32)
+        in_range = (user_ids >= 0) & (user_ids < len(self.users_rows))
+        known = np.flatnonzero(in_range)
+        known = known[self.users_rows[user_ids[known]] >= 0]
+        for start in range(0, len(known), self.block_size):
+            positions = known[start:start + self.block_size]
+            scores = self._scores(user_ids[positions])
+            if filter_viewed:
+                items, lengths = self.history.gather(user_ids[positions])
+                scores[np.repeat(np.arange(len(positions)), lengths),
+                       items] = -np.inf
+            result[positions] = top_k(scores, k)
+        return result
+
+
+def csr_to_arrays(
+    prefix: str,
+    matrix: sparse.csr_matrix,
+) -> tp.Dict[str, np.ndarray]:
+    # типы индексов не меняем: scipy требует их совпадения, иначе
+    # при загрузке массивы будут скопированы
+    matrix = sparse.csr_matrix(matrix)
+    return {
+        f"{prefix}_data": matrix.data,
+        f"{prefix}_indices": matrix.indices,
+        f"{prefix}_indptr": matrix.indptr,
+        f"{prefix}_shape": np.asarray(matrix.shape, dtype=np.int64),
+    }
+
+
+def csr_from_arrays(
+    prefix: str,
+    arrays: tp.Dict[str, np.ndarray],
+) -> sparse.csr_matrix:
+    """
+    Сборка CSR-матрицы поверх сохраненных массивов без копирования
+    """
+    return sparse.csr_matrix(
+        (arrays[f"{prefix}_data"], arrays[f"{prefix}_indices"],
+         arrays[f"{prefix}_indptr"]),
+        shape=tuple(arrays[f"{prefix}_shape"]))
+
+
+# скореры моделей KionReco
+Scorer = tp.Union[KNNScorer, VectorScorer]
+
+
+def make_scorer(
+    kind: str,
+    arrays: tp.Dict[str, np.ndarray],
+    user_items: sparse.csr_matrix,
+) -> Scorer:
+    """
+    Создание скорера по типу из манифеста артефакта
+    """
+    if kind == "knn":
+        return KNNScorer(csr_from_arrays("similarity", arrays), user_items)
+    if kind == "vectors":
+        return VectorScorer(arrays["user_vectors"], arrays["item_vectors"],
+                            user_items)
+    raise ValueError(f"Unknown scorer kind {kind}")
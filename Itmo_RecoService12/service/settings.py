@@ -1,11 +1,12 @@
 from functools import lru_cache
 from pathlib import Path
+from typing import Dict, List, Optional
 
-from pydantic import BaseSettings, Field
-
-from .make_reco import KionReco, KionRecoBM25
+from pydantic import BaseModel, BaseSettings, Field
 
 BASE_DIR = Path(__file__).resolve().parent
+MODELS_DIR = Path.cwd().joinpath("service", "models")
+DATA_DIR = Path.cwd().joinpath("service", "data")
 
 
 class Config(BaseSettings):
@@ -27,37 +28,87 @@ class LogConfig(Config):
         }
 
 
+class ModelSpec(BaseModel):
+    """
+    Описание модели: класс и пути к артефактам
+    """
+    kind: str = "KionReco"
+    model_path: Optional[Path] = None
+    dataset_path: Optional[Path] = None
+    table_path: Optional[Path] = None
+    # артефакт из массивов NumPy (service.artifacts), если он есть,
+    # загружается вместо dill
+    artifact_path: Optional[Path] = None
+    verify_artifact: bool = True
+    enabled: bool = True
+    # пользователи для проверки новой версии при перезагрузке
+    # (по умолчанию несколько теплых пользователей модели)
+    canary_user_ids: List[int] = []
+    # где считать рекомендации: thread, process или inline
+    # (service.executors) и размер пула (None - по умолчанию)
+    executor: str = "thread"
+    executor_workers: Optional[int] = None
+    # микробатчинг одиночных запросов (service.batching): пачка
+    # считается при batch_max_size пользователях или через
+    # batch_max_wait_ms миллисекунд после первого запроса
+    batching: bool = False
+    batch_max_size: int = 64
+    batch_max_wait_ms: float = 2.0
+    # индекс приближенного поиска для векторных моделей (service.ann) и
+    # количество просматриваемых ячеек (None - из индекса)
+    ann_path: Optional[Path] = None
+    ann_n_probe: Optional[int] = None
+
+
 class ServiceConfig(Config):
     service_name: str = "reco_service"
     k_recs: int = 10
+    # максимальное количество пользователей в пакетном запросе
+    max_batch_size: int = 1000
+    # кеш рекомендаций: размер, объем в байтах и время жизни записи
+    cache_enabled: bool = True
+    cache_max_entries: int = 100_000
+    cache_max_bytes: Optional[int] = None
+    cache_ttl: Optional[float] = 300.0
     # путь до данных дня поднятия в app.py
     items_path = Path.cwd().joinpath("service", "data", "kion_train",
                                      "kion_train",
                                      "interactions.csv")
-    models = {
-        "LightFM_0.078294": KionReco(Path.cwd().joinpath("service", "models",
-                                                         "LightFM_0.078294.dill"),
-                                     Path.cwd().joinpath("service",
-                                                         "data",
-                                                         "dataset_LightFM_0.078294.dill")),
-        "BM25Recommender_0.085430": KionReco(
-            Path.cwd().joinpath("service", "models",
-                                "BM25Recommender_0.095432.dill"),
-            Path.cwd().joinpath("service",
-                                "data",
-                                "dataset_BM25Recommender_0.095432.dill")),
-        "userknn_BM25Recommender": KionRecoBM25(
-            Path.cwd().joinpath("service", "models",
-                                "userknn_BM25Recommender.dill"),
-            Path.cwd().joinpath("service",
-                                "data",
-                                "dataset_userknn_BM25Recommender.dill"))}
+    # кеш сгруппированных взаимодействий (service.interactions); None -
+    # директория interactions_cache рядом с items_path
+    interactions_cache_dir: Optional[Path] = None
+    # описания моделей: сами модели загружаются реестром при первом
+    # обращении (или при старте, если включен warmup_models)
+    models: Dict[str, ModelSpec] = {
+        "LightFM_0.078294": ModelSpec(
+            kind="KionReco",
+            model_path=MODELS_DIR / "LightFM_0.078294.dill",
+            dataset_path=DATA_DIR / "dataset_LightFM_0.078294.dill"),
+        "BM25Recommender_0.085430": ModelSpec(
+            kind="KionReco",
+            model_path=MODELS_DIR / "BM25Recommender_0.095432.dill",
+            dataset_path=DATA_DIR / "dataset_BM25Recommender_0.095432.dill"),
+        "userknn_BM25Recommender": ModelSpec(
+            kind="KionRecoBM25",
+            model_path=MODELS_DIR / "userknn_BM25Recommender.dill",
+            dataset_path=DATA_DIR / "dataset_userknn_BM25Recommender.dill"),
+    }
+    warmup_models: bool = False
+    # период проверки файлов моделей для горячей перезагрузки, секунды
+    # (None - наблюдатель выключен)
+    model_watch_interval: Optional[float] = None
+    # директория снимков метрик воркеров gunicorn (service.metrics);
+    # None - /metrics отдает метрики только своего процесса
+    metrics_dir: Optional[Path] = None
+    metrics_flush_interval: float = 5.0
+    # доля запросов, для которых замеряются этапы (service.spans)
+    timing_sample_rate: float = 0.0
     log_config: LogConfig
     secret_token: str = Field(None, env="SECRET_TOKEN")
 
 
 @lru_cache()
-def get_config() -> Config:
+def get_config() -> ServiceConfig:
     return ServiceConfig(
         log_config=LogConfig(),
     )
@@ -0,0 +1,88 @@
+"""
+Замеры времени этапов обработки запроса.
+
+    with span("scoring"):
+        ...
+
+Замер включается только для запросов, по которым начата трассировка
+(start_trace): с отладочным заголовком или попавших в выборку. Без
+трассировки span возвращает общий пустой контекстный менеджер, так что
+в обычных запросах расходы - одно чтение contextvar.
+"""
+import contextvars
+import time
+import typing as tp
+
+# заголовок запроса, включающий Server-Timing в ответе
+DEBUG_HEADER = "X-Debug-Timing"
+
+
+class Trace:
+    """
+    Длительности этапов одного запроса, повторные этапы суммируются
+    """
+
+    def __init__(self) -> None:
+        self.stages: tp.Dict[str, float] = {}
+
+    def add(self, name: str, duration: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + duration
+
+    def server_timing(self) -> str:
+        """
+        Значение заголовка Server-Timing (длительности в миллисекундах)
+        """
+        return ", ".join(f"{name};dur={duration * 1000:.3f}"
+                         for name, duration in self.stages.items())
+
+
+_trace: contextvars.ContextVar[tp.Optional[Trace]] = contextvars.ContextVar(
+    "trace", default=None)
+
+
+class _Span:
+    __slots__ = ("trace", "name", "started_at")
+
+    def __init__(self, trace: Trace, name: str) -> None:
+        self.trace = trace
+        self.name = name
+        self.started_at = 0.0
+
+    def __enter__(self) -> "_Span":
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: tp.Any) -> None:
+        self.trace.add(self.name, time.perf_counter() - self.started_at)
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoSpan":
+        return self
+
+    def __exit__(self, *exc_info: tp.Any) -> None:
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name: str) -> tp.Union[_Span, _NoSpan]:
+    """
+    Замер этапа name в текущей трассировке
+    """
+    trace = _trace.get()
+    if trace is None:
+        return _NO_SPAN
+    return _Span(trace, name)
+
+
+def start_trace() -> tp.Tuple[Trace, contextvars.Token]:
+    trace = Trace()
+    return trace, _trace.set(trace)
+
+
+def stop_trace(token: contextvars.Token) -> None:
+    _trace.reset(token)
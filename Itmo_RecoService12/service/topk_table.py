@@ -0,0 +1,154 @@
+"""
+Предрассчитанная таблица top-K рекомендаций.
+
+Офлайн-режим materialize прогоняет модель KionReco по всем теплым
+пользователям и сохраняет компактную бинарную таблицу:
+индекс пользователей (UserIndex) и матрицу item id int32 размера
+[n_users, k_max]. В режиме обслуживания таблица открывается через
+memory-map, поэтому все воркеры gunicorn делят одни и те же страницы
+памяти, а запрос сводится к поиску в индексе и срезу строки.
+
+Запуск: python -m service.topk_table --model LightFM_0.078294 \
+    --out service/data/topk/LightFM_0.078294 --k-max 100
+"""
+import argparse
+import json
+import typing as tp
+from pathlib import Path
+
+import numpy as np
+
+from .make_reco import KionReco
+from .metrics import FALLBACKS
+from .popular import Popularity
+from .spans import span
+from .user_index import UserIndex
+
+# 2: популярное во внешних id айтемов, как и сами рекомендации
+TABLE_VERSION = 2
+ITEMS_FILE = "items.npy"
+POPULAR_FILE = "popular.npy"
+META_FILE = "meta.json"
+
+
+def materialize(
+    model: tp.Any,
+    path: tp.Union[str, Path],
+    k_max: int = 100,
+    batch_size: int = 10_000,
+) -> Path:
+    """
+    Расчет рекомендаций для всех теплых пользователей модели и
+    сохранение их в виде таблицы
+    :param model: модель KionReco/KionRecoBM25
+    :param path: директория для таблицы
+    :param k_max: максимальное количество рекомендаций на пользователя
+    :param batch_size: размер пачки пользователей для одного вызова модели
+    :return: путь к директории с таблицей
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    user_ids = np.asarray(model.warm_users())
+    index = UserIndex(user_ids)
+
+    # строки таблицы идут в порядке внутренних id индекса
+    # open_memmap в numpy не аннотирован
+    items = np.lib.format.open_memmap(  # type: ignore[no-untyped-call]
+        path / ITEMS_FILE, mode="w+", dtype=np.int32,
+        shape=(len(user_ids), k_max))
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        items[start:start + len(batch)] = model.reco_batch(batch, k_max)
+    items.flush()
+    del items
+
+    index.save(path)
+    np.save(path / POPULAR_FILE,
+            np.asarray(model.popular_reco(k_max), dtype=np.int32))
+    with open(path / META_FILE, "w") as f:
+        json.dump({
+            "version": TABLE_VERSION,
+            "n_users": len(user_ids),
+            "k_max": k_max,
+        }, f)
+    return path
+
+
+class KionRecoTable(KionReco):
+    """
+    Режим обслуживания модели по предрассчитанной таблице top-K
+    """
+
+    # модель и датасет не загружаются, поэтому KionReco.__init__ не нужен
+    def __init__(  # pylint: disable=super-init-not-called
+        self,
+        path: tp.Union[str, Path],
+    ) -> None:
+        path = Path(path)
+        assert (path / META_FILE).is_file()  # проверка на наличие таблицы
+        with open(path / META_FILE) as f:
+            self.meta = json.load(f)
+        assert self.meta["version"] == TABLE_VERSION
+        self.k_max = self.meta["k_max"]
+        self.version = str(int((path / ITEMS_FILE).stat().st_mtime))
+
+        self.user_index = UserIndex.load(path, mmap_mode="r")
+        self.items = np.load(path / ITEMS_FILE, mmap_mode="r")
+        self.popular = Popularity(np.load(path / POPULAR_FILE))
+        # рекомендации берутся из таблицы, а не из скорера
+        self.scorer = None
+
+    def warm_users(self) -> np.ndarray:
+        return self.user_index.sorted_ids
+
+    def popular_reco(self, k_recos=10) -> np.ndarray:
+        # популярное таблицы уже во внешних id айтемов
+        return self.popular.top(k_recos)
+
+    def reco_batch(self, user_ids, k_recos=10) -> np.ndarray:
+        rows = self.user_index.lookup_many(user_ids)
+        result = np.full((len(rows), k_recos), -1, dtype=np.int32)
+        width = min(k_recos, self.k_max)
+        result[rows >= 0, :width] = self.items[rows[rows >= 0], :width]
+        # короткие строки дополняются популярным, как в reco
+        short = np.flatnonzero((rows >= 0) & (result < 0).any(axis=1))
+        if len(short):
+            with span("popular_fill"):
+                for row in short:
+                    recos = result[row][result[row] >= 0]
+                    recos = self.popular.fill(recos, k_recos)
+                    result[row, :len(recos)] = recos
+        return result
+
+    def reco(self, user_id, k_recos=10) -> np.ndarray:
+        """
+        Получение К рекомендаций для пользователя
+        :param user_id: идентификатор пользователя
+        :param k_recos: количество рекомендаций (не больше k_max таблицы)
+        :return:
+        """
+        is_warm, row = self.user_index.lookup(user_id)
+        if not is_warm:
+            FALLBACKS.inc(self.name, "cold")
+            return self.popular_reco(k_recos)
+        recos = self.items[row, :k_recos]
+        recos = recos[recos >= 0]
+        # если рекомендаций меньше - дополняем популярным
+        if len(recos) < k_recos:
+            with span("popular_fill"):
+                recos = self.popular.fill(recos, k_recos)
+        return recos
+
+
+if __name__ == "__main__":
+    from .registry import ModelRegistry
+    from .settings import get_config
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", required=True)
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--k-max", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    args = parser.parse_args()
+    materialize(ModelRegistry(get_config().models)[args.model], args.out,
+                k_max=args.k_max, batch_size=args.batch_size)
@@ -0,0 +1,88 @@
+import typing as tp
+from pathlib import Path
+
+import numpy as np
+import numpy.typing as npt
+
+
+class UserIndex:
+    """
+    Индекс внешних идентификаторов пользователей.
+
+    Хранит отсортированный массив внешних id и соответствующие им
+    внутренние номера строк датасета. Поиск идет через np.searchsorted
+    за O(log n) вместо полного прохода по всем пользователям.
+    """
+
+    def __init__(self, external_ids: np.ndarray) -> None:
+        external_ids = np.asarray(external_ids)
+        order = np.argsort(external_ids, kind="stable")
+        self.sorted_ids = external_ids[order]
+        self.internal_ids = order.astype(np.int32)
+
+    @classmethod
+    def from_arrays(
+        cls,
+        sorted_ids: np.ndarray,
+        internal_ids: np.ndarray,
+    ) -> "UserIndex":
+        """
+        Создание индекса из уже отсортированных массивов (например,
+        memory-mapped файлов) без повторной сортировки
+        """
+        index = cls.__new__(cls)
+        index.sorted_ids = sorted_ids
+        index.internal_ids = internal_ids
+        return index
+
+    def save(self, path: tp.Union[str, Path]) -> None:
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / "user_sorted_ids.npy", self.sorted_ids)
+        np.save(path / "user_internal_ids.npy", self.internal_ids)
+
+    @classmethod
+    def load(
+        cls,
+        path: tp.Union[str, Path],
+        mmap_mode: tp.Optional[tp.Literal["r", "r+", "w+", "c"]] = "r",
+    ) -> "UserIndex":
+        path = Path(path)
+        return cls.from_arrays(
+            np.load(path / "user_sorted_ids.npy", mmap_mode=mmap_mode),
+            np.load(path / "user_internal_ids.npy", mmap_mode=mmap_mode),
+        )
+
+    def __len__(self) -> int:
+        return len(self.sorted_ids)
+
+    def __contains__(self, user_id: tp.Any) -> bool:
+        return self.lookup(user_id)[0]
+
+    def lookup(self, user_id: tp.Any) -> tp.Tuple[bool, int]:
+        """
+        Поиск пользователя в индексе
+        :param user_id: внешний идентификатор пользователя
+        :return: признак теплого пользователя и его внутренний id
+        (-1 для холодного)
+        """
+        pos = int(np.searchsorted(self.sorted_ids, user_id))
+        if pos < len(self.sorted_ids) and self.sorted_ids[pos] == user_id:
+            return True, int(self.internal_ids[pos])
+        return False, -1
+
+    def lookup_many(self, user_ids: npt.ArrayLike) -> np.ndarray:
+        """
+        Векторный поиск пачки пользователей
+        :param user_ids: внешние идентификаторы пользователей
+        :return: массив внутренних id, -1 для холодных пользователей
+        """
+        users = np.asarray(user_ids)
+        result = np.full(len(users), -1, dtype=np.int32)
+        if len(self.sorted_ids) == 0 or len(users) == 0:
+            return result
+        pos = np.searchsorted(self.sorted_ids, users)
+        pos[pos == len(self.sorted_ids)] = 0
+        found = self.sorted_ids[pos] == users
+        result[found] = self.internal_ids[pos[found]]
+        return result
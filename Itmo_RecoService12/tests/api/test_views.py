@@ -1,11 +1,17 @@
+import json
 from http import HTTPStatus
 from os import getenv
 
+import pytest
 from starlette.testclient import TestClient
 
+from service.api.app import create_app
+from service.registry import load_model
 from service.settings import ServiceConfig
 
 GET_RECO_PATH = "/reco/{model_name}/{user_id}"
+GET_RECO_BATCH_PATH = "/reco/{model_name}/batch"
+GET_RECO_EXPORT_PATH = "/reco/{model_name}/export"
 
 
 # подняться до родителя через cd
@@ -74,3 +80,107 @@ def test_get_reco_unauthorized(
         response = client.get(path)
     assert response.status_code == HTTPStatus.UNAUTHORIZED
     assert response.json()["errors"][0]["error_key"] == "authorisation_failed"
+
+
+def make_client(config: ServiceConfig) -> TestClient:
+    client = TestClient(app=create_app(config))
+    client.headers = dict(Authorization=f"Bearer {getenv('SECRET_TOKEN')}")
+    return client
+
+
+def test_get_reco_batch_success(itemknn_config: ServiceConfig) -> None:
+    # длиннее, чем находит item-KNN по 10 соседям
+    config = itemknn_config.copy(update={"k_recs": 30})
+    model = load_model(config.models["itemknn"])
+    cold_user_id = 10 ** 8
+    user_ids = [*model.warm_users()[:5].tolist(), cold_user_id]
+    client = make_client(config)
+    with client:
+        response = client.post(
+            GET_RECO_BATCH_PATH.format(model_name="itemknn"),
+            json={"user_ids": user_ids})
+        expected = [client.get(GET_RECO_PATH.format(
+            model_name="itemknn", user_id=user_id)).json()
+            for user_id in user_ids]
+    assert response.status_code == HTTPStatus.OK
+    recos = response.json()["recos"]
+    assert [reco["user_id"] for reco in recos] == user_ids
+    # выдача та же, что у /reco, холодный пользователь получает популярное
+    assert recos == expected
+    assert recos[-1]["items"] == model.popular_reco(30).tolist()
+
+
+def test_get_reco_batch_too_large(itemknn_config: ServiceConfig) -> None:
+    config = itemknn_config.copy(update={"max_batch_size": 3})
+    client = make_client(config)
+    with client:
+        response = client.post(
+            GET_RECO_BATCH_PATH.format(model_name="itemknn"),
+            json={"user_ids": [1, 2, 3, 4]})
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+    assert response.json()["errors"][0]["error_key"] == "batch_too_large"
+
+
+def test_export_reco_resumes_from_cursor(
+    itemknn_config: ServiceConfig,
+) -> None:
+    path = GET_RECO_EXPORT_PATH.format(model_name="itemknn")
+    client = make_client(itemknn_config)
+    with client:
+        response = client.get(path, params={"limit": 10})
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        cursor = lines[4]["user_id"]
+        resumed = client.get(path, params={"cursor": cursor, "limit": 5})
+        # курсор между id пользователей и после последнего
+        between = client.get(path, params={"cursor": cursor + 0.5})
+        after = client.get(path, params={"cursor": 10 ** 8})
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert response.headers["X-Export-Users"] == "10"
+    user_ids = [line["user_id"] for line in lines]
+    assert user_ids == sorted(user_ids)
+    assert all(len(line["items"]) == itemknn_config.k_recs
+               for line in lines)
+    resumed_lines = [json.loads(line) for line in resumed.text.splitlines()]
+    assert resumed_lines == lines[5:]
+    assert between.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+    assert after.status_code == HTTPStatus.OK
+    assert after.text == ""
+    assert after.headers["X-Export-Users"] == "0"
+
+
+def test_export_reco_for_unknown_model(
+    itemknn_config: ServiceConfig,
+) -> None:
+    path = GET_RECO_EXPORT_PATH.format(model_name="some_model")
+    client = make_client(itemknn_config)
+    with client:
+        response = client.get(path)
+    assert response.status_code == HTTPStatus.NOT_FOUND
+    assert response.json()["errors"][0]["error_key"] == "model_not_found"
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_export_reco_matches_get_reco(
+    itemknn_config: ServiceConfig,
+    executor: str,
+) -> None:
+    spec = itemknn_config.models["itemknn"].copy(
+        update={"executor": executor})
+    config = itemknn_config.copy(update={
+        # длиннее, чем находит item-KNN по 10 соседям
+        "k_recs": 30,
+        "models": {"itemknn": spec},
+    })
+    client = make_client(config)
+    with client:
+        response = client.get(GET_RECO_EXPORT_PATH.format(
+            model_name="itemknn"))
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        expected = [client.get(GET_RECO_PATH.format(
+            model_name="itemknn", user_id=line["user_id"])).json()
+            for line in lines]
+    assert response.status_code == HTTPStatus.OK
+    assert int(response.headers["X-Export-Users"]) == len(lines) > 0
+    # короткие списки скорера дополняются популярным, как в /reco
+    assert lines == expected
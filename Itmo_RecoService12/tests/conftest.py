@@ -1,10 +1,18 @@
 # pylint: disable=redefined-outer-name
+import typing as tp
+from pathlib import Path
+
 import pytest
 from fastapi import FastAPI
 from starlette.testclient import TestClient
 
+from benchmarks import synthetic
 from service.api.app import create_app
-from service.settings import ServiceConfig, get_config
+from service.artifacts import export_model
+from service.make_reco import KionReco
+from service.registry import ModelRegistry
+from service.settings import ModelSpec, ServiceConfig, get_config
+from tests.helpers import dump_itemknn
 
 
 @pytest.fixture
@@ -21,3 +29,48 @@ def app(service_config: ServiceConfig,) -> FastAPI:
 @pytest.fixture
 def client(app: FastAPI) -> TestClient:
     return TestClient(app=app)
+
+
+@pytest.fixture
+def itemknn_artifact(tmp_path: Path) -> Path:
+    """
+    Артефакт item-KNN модели на тестовых данных
+    """
+    export_model(KionReco(*dump_itemknn(tmp_path)), tmp_path / "artifact")
+    return tmp_path / "artifact"
+
+
+@pytest.fixture
+def itemknn_registry(
+    itemknn_artifact: Path,
+) -> tp.Callable[..., ModelRegistry]:
+    """
+    Реестр с одной моделью itemknn из артефакта, параметры описания
+    модели (executor, batching и т.д.) передаются аргументами
+    """
+    def make(**options: tp.Any) -> ModelRegistry:
+        return ModelRegistry({"itemknn": ModelSpec(
+            artifact_path=itemknn_artifact, **options)})
+    return make
+
+
+@pytest.fixture
+def itemknn_config(
+    tmp_path: Path,
+    itemknn_artifact: Path,
+    service_config: ServiceConfig,
+) -> ServiceConfig:
+    """
+    Конфиг сервиса на синтетических данных (тех же, что у
+    itemknn_artifact) с единственной моделью itemknn
+    """
+    items_path = tmp_path / "interactions.csv"
+    synthetic.make_interactions(n_users=60, n_items=40,
+                                n_interactions=600).to_csv(items_path,
+                                                           index=False)
+    return service_config.copy(update={
+        "items_path": items_path,
+        "interactions_cache_dir": tmp_path / "cache",
+        "models": {"itemknn": ModelSpec(artifact_path=itemknn_artifact,
+                                        executor_workers=1)},
+    })
@@ -0,0 +1,63 @@
+import typing as tp
+from pathlib import Path
+
+import dill
+import pandas as pd
+from implicit.als import AlternatingLeastSquares
+from implicit.nearest_neighbours import CosineRecommender
+from rectools.dataset import Dataset
+from rectools.models import (
+    ImplicitALSWrapperModel,
+    ImplicitItemKNNWrapperModel,
+)
+
+from benchmarks import synthetic
+from benchmarks.synthetic import rectools_interactions, userknn_model
+
+
+def make_interactions(
+    n_users: int = 60,
+    n_items: int = 40,
+    n_interactions: int = 600,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """
+    Небольшие синтетические взаимодействия в колонках rectools
+    """
+    return rectools_interactions(synthetic.make_interactions(
+        n_users, n_items, n_interactions, seed=seed))
+
+
+def dump_itemknn(path: Path) -> tp.Tuple[Path, Path]:
+    dataset = Dataset.construct(make_interactions())
+    model = ImplicitItemKNNWrapperModel(model=CosineRecommender(K=10))
+    model.fit(dataset)
+    model_path, dataset_path = path / "model.dill", path / "dataset.dill"
+    with open(model_path, "wb") as f:
+        dill.dump(model, f)
+    with open(dataset_path, "wb") as f:
+        dill.dump(dataset, f)
+    return model_path, dataset_path
+
+
+def dump_als(path: Path) -> tp.Tuple[Path, Path]:
+    dataset = Dataset.construct(make_interactions())
+    model = ImplicitALSWrapperModel(AlternatingLeastSquares(
+        factors=8, iterations=3, random_state=0))
+    model.fit(dataset)
+    model_path, dataset_path = path / "als.dill", path / "dataset.dill"
+    with open(model_path, "wb") as f:
+        dill.dump(model, f)
+    with open(dataset_path, "wb") as f:
+        dill.dump(dataset, f)
+    return model_path, dataset_path
+
+
+def dump_userknn(path: Path) -> tp.Tuple[Path, Path]:
+    dataset = Dataset.construct(make_interactions(n_users=80, n_items=60))
+    model_path, dataset_path = path / "userknn.dill", path / "dataset.dill"
+    with open(model_path, "wb") as f:
+        dill.dump(userknn_model(dataset), f)
+    with open(dataset_path, "wb") as f:
+        dill.dump(dataset, f)
+    return model_path, dataset_path
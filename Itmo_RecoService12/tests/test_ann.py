@@ -0,0 +1,97 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+from scipy import sparse
+
+from service.ann import IVFIndex, build_model_index, load_index
+from service.artifacts import export_model
+from service.make_reco import KionReco
+from service.registry import load_model
+from service.scorers import VectorScorer
+from service.settings import ModelSpec
+from tests.helpers import dump_als, dump_itemknn
+
+
+def _scorer(n_users: int = 50, n_items: int = 500) -> VectorScorer:
+    rng = np.random.default_rng(0)
+    user_items = sparse.random(n_users, n_items, density=0.05,
+                               format="csr", random_state=0,
+                               dtype=np.float32)
+    return VectorScorer(rng.normal(size=(n_users, 8)),
+                        rng.normal(size=(n_items, 8)), user_items)
+
+
+def test_ivf_full_probe_matches_exact() -> None:
+    scorer = _scorer()
+    index = IVFIndex.build(scorer.item_vectors, n_lists=16)
+    rows = np.arange(len(scorer.user_vectors))
+
+    exact = scorer.recommend(rows, 10)
+    found = index.search(scorer.user_vectors[rows], 10,
+                         viewed=scorer.viewed(rows), n_probe=16)
+
+    np.testing.assert_array_equal(found, exact)
+    for row, recos in zip(rows, found):
+        assert not set(scorer.viewed(np.array([row]))[0]) & set(recos)
+    # меньше ячеек - меньше кандидатов, но без просмотренного
+    partial = index.search(scorer.user_vectors[rows], 10,
+                           viewed=scorer.viewed(rows), n_probe=2)
+    for row, recos in zip(rows, partial):
+        assert not set(scorer.viewed(np.array([row]))[0]) & set(recos)
+
+
+def test_load_model_with_ann_index(tmp_path: Path) -> None:
+    model = KionReco(*dump_als(tmp_path))
+    artifact = export_model(model, tmp_path / "artifact")
+    assert isinstance(model.scorer, VectorScorer)
+    IVFIndex.build(model.scorer.item_vectors, n_lists=4, n_probe=1,
+                   model_version=model.version).save(tmp_path / "ivf")
+    assert load_index(tmp_path / "ivf").n_probe == 1
+
+    spec = ModelSpec(artifact_path=artifact, ann_path=tmp_path / "ivf",
+                     ann_n_probe=4)
+    loaded = load_model(spec)
+    assert loaded.scorer.index.n_probe == 4
+    users = loaded.warm_users()
+    # все ячейки - тот же результат, что и точный расчет
+    for user_id, recos in zip(users, loaded.reco_many(users, 10)):
+        np.testing.assert_array_equal(recos, model.reco(user_id, 10))
+
+    with pytest.raises(ValueError):
+        load_model(ModelSpec(model_path=dump_itemknn(tmp_path)[0],
+                             dataset_path=tmp_path / "dataset.dill",
+                             ann_path=tmp_path / "ivf"))
+
+
+def test_load_model_rejects_other_index(tmp_path: Path) -> None:
+    model = KionReco(*dump_als(tmp_path))
+    artifact = export_model(model, tmp_path / "artifact")
+    spec = ModelSpec(artifact_path=artifact, ann_path=tmp_path / "ivf")
+    assert isinstance(model.scorer, VectorScorer)
+    vectors = np.asarray(model.scorer.item_vectors)
+
+    # индекс другой версии модели
+    IVFIndex.build(vectors, n_lists=4,
+                   model_version="0").save(tmp_path / "ivf")
+    with pytest.raises(ValueError, match="version"):
+        load_model(spec)
+    # индекс другого каталога
+    IVFIndex.build(vectors[:-1], n_lists=4,
+                   model_version=model.version).save(tmp_path / "ivf")
+    with pytest.raises(ValueError, match="items"):
+        load_model(spec)
+
+
+def test_build_model_index(tmp_path: Path) -> None:
+    model = KionReco(*dump_als(tmp_path))
+    # ann_path модели указывает на еще не построенный индекс
+    spec = ModelSpec(artifact_path=export_model(model, tmp_path / "artifact"),
+                     ann_path=tmp_path / "ivf")
+    index = build_model_index(spec, spec.ann_path, n_lists=4)
+
+    assert index.model_version == model.version
+    assert isinstance(model.scorer, VectorScorer)
+    assert index.n_items == len(model.scorer.item_vectors)
+    loaded = load_model(spec)
+    assert loaded.scorer.index.n_lists == 4
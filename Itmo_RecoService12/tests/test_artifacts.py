@@ -0,0 +1,65 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+from rectools import Columns
+
+from service.artifacts import (
+    MANIFEST_FILE,
+    ArtifactError,
+    export_model,
+    import_model,
+)
+from service.make_reco import KionReco, KionRecoBM25
+from tests.helpers import dump_itemknn, dump_userknn
+
+
+def test_itemknn_artifact_matches_rectools(tmp_path: Path) -> None:
+    model = KionReco(*dump_itemknn(tmp_path))
+    export_model(model, tmp_path / "artifact")
+    loaded = import_model(tmp_path / "artifact")
+
+    assert loaded.model is None
+    assert isinstance(loaded.history.indices, np.memmap)
+    users = model.warm_users()
+    # сравниваем скоры по позициям: айтемы с равным скором implicit
+    # может расставить в другом порядке
+    scores = (loaded.scorer.user_items @ loaded.scorer.similarity).toarray()
+    items_inv = {item_id: i for i, item_id in enumerate(loaded.item_ids)}
+    expected = model.model.recommend(users=users, dataset=model.dataset,
+                                     k=10, filter_viewed=True)
+    for user_id, recos in zip(users, loaded.reco_batch(users, 10)):
+        row = loaded.lookup_user(user_id)[1]
+        user_expected = expected[expected[Columns.User] == user_id]
+        recos = recos[recos >= 0]
+        assert len(recos) == len(user_expected)
+        np.testing.assert_allclose(
+            [scores[row, items_inv[item_id]] for item_id in recos],
+            user_expected[Columns.Score], rtol=1e-6)
+    np.testing.assert_array_equal(loaded.reco(-1, 10),
+                                  model.item_ids[model.popular.top(10)])
+
+
+def test_userknn_artifact_matches_dill(tmp_path: Path) -> None:
+    model = KionRecoBM25(*dump_userknn(tmp_path))
+    export_model(model, tmp_path / "artifact")
+    loaded = import_model(tmp_path / "artifact")
+
+    for user_id in model.users_inv:
+        np.testing.assert_array_equal(loaded.make_reco(user_id, 10),
+                                      model.make_reco(user_id, 10))
+
+
+def test_artifact_checksum(tmp_path: Path) -> None:
+    model = KionReco(*dump_itemknn(tmp_path))
+    path = export_model(model, tmp_path / "artifact")
+    with open(path / MANIFEST_FILE) as f:
+        manifest = json.load(f)
+    with open(path / manifest["arrays"]["popular"]["file"], "r+b") as f:
+        f.seek(-1, 2)
+        f.write(b"\xff")
+
+    with pytest.raises(ArtifactError):
+        import_model(path)
+    import_model(path, verify=False)
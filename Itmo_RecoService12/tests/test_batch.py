@@ -0,0 +1,57 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from service.artifacts import export_model
+from service.batch import iter_recos, recos_matrix
+from service.make_reco import KionRecoBM25
+from service.registry import load_model
+from service.settings import ModelSpec
+from tests.helpers import dump_userknn
+
+
+@pytest.mark.parametrize("n_workers", [1, 2])
+def test_iter_recos_matches_model(tmp_path: Path, n_workers: int) -> None:
+    model = KionRecoBM25(*dump_userknn(tmp_path))
+    export_model(model, tmp_path / "artifact")
+    spec = ModelSpec(kind="KionRecoBM25",
+                     artifact_path=tmp_path / "artifact")
+    users = np.asarray(model.warm_users())
+
+    blocks = list(iter_recos(spec, 10, n_workers=n_workers, block_size=7,
+                             memory_budget=4096))
+
+    assert [len(block) for block, _ in blocks[:-1]] == [7] * (len(blocks) - 1)
+    np.testing.assert_array_equal(
+        np.concatenate([block for block, _ in blocks]), users)
+    np.testing.assert_array_equal(
+        np.concatenate([recos for _, recos in blocks]),
+        recos_matrix(model.reco_many(users, 10), 10))
+
+
+def test_iter_recos_user_ids(tmp_path: Path) -> None:
+    model = KionRecoBM25(*dump_userknn(tmp_path))
+    spec = ModelSpec(kind="KionRecoBM25", model_path=tmp_path / "userknn.dill",
+                     dataset_path=tmp_path / "dataset.dill")
+    users = [model.warm_users()[0], -1]
+
+    (block, recos), = iter_recos(spec, 5, user_ids=users, n_workers=1)
+
+    np.testing.assert_array_equal(block, users)
+    # холодный пользователь получает популярное, как в сервисе
+    np.testing.assert_array_equal(recos[1], model.popular_reco(5))
+    np.testing.assert_array_equal(
+        recos, recos_matrix(model.reco_many(users, 5), 5))
+
+
+def test_iter_recos_scorer_model(itemknn_artifact: Path) -> None:
+    spec = ModelSpec(artifact_path=itemknn_artifact)
+    model = load_model(spec)
+    users = np.append(model.warm_users()[:5], -1)
+
+    (block, recos), = iter_recos(spec, 10, user_ids=users, n_workers=2)
+
+    # выдача пакетного расчета совпадает с выдачей сервиса
+    for user_id, rec in zip(block, recos):
+        np.testing.assert_array_equal(rec[rec >= 0], model.reco(user_id, 10))
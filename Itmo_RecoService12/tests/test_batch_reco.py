@@ -0,0 +1,81 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from batch_reco import load_shards, run, shard_files
+from service.batch import recos_matrix
+from service.make_reco import KionRecoBM25
+from service.settings import ModelSpec
+from tests.helpers import dump_userknn
+
+
+def userknn_spec(tmp_path: Path) -> ModelSpec:
+    return ModelSpec(kind="KionRecoBM25",
+                     model_path=tmp_path / "userknn.dill",
+                     dataset_path=tmp_path / "dataset.dill")
+
+
+def test_run_saves_shards(tmp_path: Path) -> None:
+    model = KionRecoBM25(*dump_userknn(tmp_path))
+    users = np.asarray(model.warm_users())
+
+    report = run(userknn_spec(tmp_path), tmp_path / "recos", "userknn",
+                 k_recos=5, n_workers=1, shard_size=30, block_size=7)
+
+    assert report["users"] == len(users)
+    assert report["shards"] == (len(users) + 29) // 30
+    assert report["peak_rss_mb"]["main"] > 0
+    saved_users, recos = load_shards(tmp_path / "recos")
+    np.testing.assert_array_equal(saved_users, users)
+    np.testing.assert_array_equal(
+        recos, recos_matrix(model.reco_many(users, 5), 5))
+
+
+def test_run_reports_worker_memory(tmp_path: Path) -> None:
+    model = KionRecoBM25(*dump_userknn(tmp_path))
+    # запуск в отдельном процессе: в RUSAGE_CHILDREN не попадают
+    # процессы других тестов, а с заданными пользователями - и процесс
+    # warm_users, только процессы пула расчета
+    with ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context("spawn")) as pool:
+        report = pool.submit(run, userknn_spec(tmp_path), tmp_path / "recos",
+                             "userknn", k_recos=5,
+                             user_ids=model.warm_users(), n_workers=2,
+                             shard_size=30, block_size=7).result()
+
+    assert report["workers"] == 2
+    assert report["peak_rss_mb"]["workers"] > 0
+
+
+def test_run_resumes(tmp_path: Path) -> None:
+    model = KionRecoBM25(*dump_userknn(tmp_path))
+    spec, path = userknn_spec(tmp_path), tmp_path / "recos"
+    user_ids = np.insert(model.warm_users()[:4], 2, -1)
+    run(spec, path, "userknn", user_ids=user_ids, n_workers=1,
+        shard_size=2)
+    _, expected = load_shards(path)
+    # шард 0 готов (и не пересчитывается), шард 1 не дописан
+    done = shard_files(path, 0)[1]
+    np.save(done, np.full((2, 10), 7, dtype=np.int32))
+    shard_files(path, 1)[1].unlink()
+
+    report = run(spec, path, "userknn", user_ids=user_ids[::-1],
+                 n_workers=1, shard_size=2)
+
+    assert report["shards"] == 1 and report["users"] == 2
+    saved_users, recos = load_shards(path)
+    np.testing.assert_array_equal(saved_users, user_ids)
+    assert (recos[:2] == 7).all()
+    np.testing.assert_array_equal(recos[2:], expected[2:])
+
+
+def test_run_rejects_other_run(tmp_path: Path) -> None:
+    model = KionRecoBM25(*dump_userknn(tmp_path))
+    spec, path = userknn_spec(tmp_path), tmp_path / "recos"
+    run(spec, path, "userknn", user_ids=model.warm_users()[:1], n_workers=1)
+    with pytest.raises(ValueError):
+        run(spec, path, "userknn", k_recos=20, n_workers=1)
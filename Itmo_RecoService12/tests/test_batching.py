@@ -0,0 +1,40 @@
+import asyncio
+import typing as tp
+
+import numpy as np
+
+from service.batching import ModelBatchers
+from service.executors import ModelExecutors
+from service.metrics import Histogram
+from service.registry import ModelRegistry
+
+
+def test_batcher_matches_model(
+    itemknn_registry: tp.Callable[..., ModelRegistry],
+) -> None:
+    registry = itemknn_registry(executor="inline", batching=True,
+                                batch_max_size=4, batch_max_wait_ms=50)
+    batcher = ModelBatchers(registry, ModelExecutors(registry)).get("itemknn")
+    model = registry["itemknn"]
+    users = list(model.warm_users()[:9]) + [-1]
+
+    async def run() -> tp.List[np.ndarray]:
+        return await asyncio.gather(
+            *[batcher.reco(user_id, 10) for user_id in users])
+
+    for user_id, recos in zip(users, asyncio.run(run())):
+        np.testing.assert_array_equal(recos, model.reco(user_id, 10))
+    stats = batcher.stats()
+    # две полные пачки по 4 и остаток из 2 по таймеру
+    assert stats["batch_size"]["count"] == 3
+    assert stats["batch_size"]["sum"] == 10
+    assert stats["queue_time"]["count"] == 10
+    assert stats["queued"] == 0
+
+
+def test_histogram() -> None:
+    histogram = Histogram([1, 5])
+    for value in (0.5, 1, 3, 10):
+        histogram.observe(value)
+    assert histogram.snapshot() == {
+        "buckets": {"1": 2, "5": 3, "+Inf": 4}, "sum": 14.5, "count": 4}
@@ -0,0 +1,20 @@
+from pathlib import Path
+
+from benchmarks.run import run
+from benchmarks.synthetic import generate
+from service.registry import ModelRegistry
+
+
+def test_synthetic_models_load(tmp_path: Path) -> None:
+    specs = generate(tmp_path, n_users=200, n_items=50, n_interactions=2000)
+    registry = ModelRegistry(specs)
+    for name in registry:
+        model = registry[name]
+        user_id = model.warm_users()[0]
+        assert len(model.reco(user_id, 10)) == 10
+
+    report = run(tmp_path, n_requests=20, n_batch_users=50, n_workers=1)
+    assert set(report["interactions"]) == {"cold_s", "warm_s"}
+    assert set(report["models"]) == set(specs)
+    for result in report["models"].values():
+        assert result["throughput"]["users_per_s"] > 0
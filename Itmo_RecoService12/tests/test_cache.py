@@ -0,0 +1,47 @@
+import typing as tp
+
+import numpy as np
+
+from service.cache import RecoCache
+
+
+def test_cache_hit_miss_and_lru_eviction() -> None:
+    cache = RecoCache(max_entries=2, ttl=None)
+
+    assert cache.get(("m", "1", 1, 10)) is None
+    cache.put(("m", "1", 1, 10), [1, 2, 3])
+    cache.put(("m", "1", 2, 10), [4, 5, 6])
+    np.testing.assert_array_equal(cache.get(("m", "1", 1, 10)), [1, 2, 3])
+    # пользователь 2 давно не запрашивался и вытесняется
+    cache.put(("m", "1", 3, 10), [7, 8, 9])
+
+    assert cache.get(("m", "1", 2, 10)) is None
+    assert cache.get(("m", "1", 1, 10)).dtype == np.int32
+    assert cache.stats()["models"]["m"] == {
+        "hits": 2, "misses": 2, "evictions": 1}
+
+
+def test_cache_ttl_bytes_and_invalidate() -> None:
+    cache = RecoCache(max_entries=100, max_bytes=10_000, ttl=0)
+    cache.put(("m", "1", 1, 10), [1, 2, 3])
+    assert cache.get(("m", "1", 1, 10)) is None
+    assert len(cache) == 0
+
+    cache = RecoCache(max_entries=100, max_bytes=1_000, ttl=None)
+    for user_id in range(10):
+        cache.put(("m", "1", user_id, 10), np.arange(10))
+    assert cache.n_bytes <= 1_000
+    assert len(cache) < 10
+
+    calls = []
+
+    def compute() -> tp.List[int]:
+        calls.append(1)
+        return [1]
+
+    cache.get_or_compute(("other", "1", 1, 10), compute)
+    cache.get_or_compute(("other", "1", 1, 10), compute)
+    assert len(calls) == 1
+    cache.invalidate("m")
+    assert len(cache) == 1
+    assert cache.get(("other", "1", 1, 10)) is not None
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import pytest
+from rectools import Columns
+from rectools.metrics import (
+    MAP,
+    MeanInvUserFreq,
+    Precision,
+    Recall,
+    Serendipity,
+    calc_metrics,
+)
+from scipy import sparse
+
+from service import evaluation
+from tests.helpers import make_interactions
+
+
+def rectools_metrics(recos: np.ndarray, users: np.ndarray,
+                     test: pd.DataFrame, train: pd.DataFrame,
+                     catalog: np.ndarray) -> dict:
+    reco = pd.DataFrame({
+        Columns.User: np.repeat(users, recos.shape[1]),
+        Columns.Item: recos.ravel(),
+        Columns.Rank: np.tile(np.arange(1, recos.shape[1] + 1), len(users)),
+    })
+    reco = reco[reco[Columns.Item] >= 0]
+    metrics = {}
+    for name, metric in {"Precision": Precision, "Recall": Recall,
+                         "MAP": MAP, "MeanInvUserFreq": MeanInvUserFreq,
+                         "Serendipity": Serendipity}.items():
+        for k in range(1, recos.shape[1] + 1):
+            metrics[f"{name}@{k}"] = metric(k=k)
+    return calc_metrics(metrics, reco=reco, interactions=test,
+                        prev_interactions=train, catalog=catalog)
+
+
+def test_calc_metrics_matches_rectools() -> None:
+    rng = np.random.default_rng(0)
+    interactions = make_interactions(n_users=80, n_items=50,
+                                     n_interactions=1500)
+    is_test = rng.random(len(interactions)) < 0.3
+    train, test = interactions[~is_test], interactions[is_test]
+    catalog = train[Columns.Item].unique()
+
+    # часть пользователей теста без рекомендаций, часть рекомендаций -
+    # для пользователей не из теста, короткие и пустые строки
+    users = np.unique(interactions[Columns.User])[5:]
+    # айтемы взаимодействий и несколько айтемов вне их
+    items = np.unique(interactions[Columns.Item])
+    items = np.concatenate([items, items.max() + 1 + np.arange(10)])
+    recos = np.full((len(users), 10), -1)
+    for row, length in enumerate(rng.integers(0, 11, len(users))):
+        recos[row, :length] = rng.choice(items, length, replace=False)
+
+    expected = rectools_metrics(recos, users, test, train, catalog)
+    result = evaluation.calc_metrics(
+        recos, users,
+        (test[Columns.User].values, test[Columns.Item].values),
+        (train[Columns.User].values, train[Columns.Item].values),
+        n_catalog=len(catalog))
+
+    assert result.keys() == expected.keys()
+    for name, value in expected.items():
+        assert result[name] == pytest.approx(value), name
+
+
+def test_calc_metrics_csr() -> None:
+    recos = np.array([[1, 2, 3], [0, -1, -1], [2, 1, 0]])
+    test = sparse.csr_matrix(np.array([[0, 0, 1, 1],
+                                       [1, 1, 0, 0],
+                                       [0, 0, 0, 0]]))
+
+    result = evaluation.calc_metrics(recos, np.arange(3), test)
+
+    assert result["Precision@1"] == pytest.approx(1 / 2)
+    assert result["Recall@3"] == pytest.approx((2 / 2 + 1 / 2) / 2)
+    # AP@3 первого пользователя: (1/2 + 2/3) / 2
+    assert result["MAP@3"] == pytest.approx(((1 / 2 + 2 / 3) / 2 + 1 / 2) / 2)
+    np.testing.assert_array_equal(
+        evaluation.hit_matrix(recos, np.arange(3), test),
+        [[False, True, True], [True, False, False], [False, False, False]])
@@ -0,0 +1,61 @@
+import asyncio
+import typing as tp
+
+import numpy as np
+import pytest
+
+from service.executors import ModelExecutors
+from service.registry import ModelRegistry
+from service.settings import ModelSpec
+
+
+@pytest.mark.parametrize("executor", ["thread", "process", "inline"])
+def test_executor_matches_model(
+    itemknn_registry: tp.Callable[..., ModelRegistry],
+    executor: str,
+) -> None:
+    registry = itemknn_registry(executor=executor, executor_workers=2)
+    executors = ModelExecutors(registry)
+    # dill-модель считает через rectools, сравниваем с артефактом
+    model = registry["itemknn"]
+    users = list(model.warm_users()[:5]) + [-1]
+
+    async def run() -> tp.List[tp.Any]:
+        return await asyncio.gather(
+            executors.call("itemknn", model, "reco_many",
+                           users, 10),
+            *[executors.call("itemknn", model, "reco",
+                             user_id, 10) for user_id in users])
+
+    try:
+        batch, *single = asyncio.run(run())
+    finally:
+        executors.shutdown()
+    np.testing.assert_array_equal(batch, model.reco_many(users, 10))
+    for user_id, recos in zip(users, single):
+        np.testing.assert_array_equal(recos, model.reco(user_id, 10))
+    assert executors.stats()["itemknn"]["in_flight"] == 0
+
+
+def test_unknown_executor() -> None:
+    with pytest.raises(ValueError):
+        ModelExecutors(ModelRegistry({"m": ModelSpec(executor="gpu")}))
+
+
+def test_process_pool_does_not_load_model(
+    itemknn_registry: tp.Callable[..., ModelRegistry],
+) -> None:
+    registry = itemknn_registry(executor="process", executor_workers=1)
+    executors = ModelExecutors(registry)
+    assert executors.model("itemknn") is None
+
+    async def run() -> tp.Any:
+        return await executors.call("itemknn", None, "__getattribute__",
+                                    "name")
+
+    try:
+        # модель в процессе пула знает свое название
+        assert asyncio.run(run()) == "itemknn"
+    finally:
+        executors.shutdown()
+    assert not registry.is_loaded("itemknn")
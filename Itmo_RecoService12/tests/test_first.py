@@ -0,0 +1,34 @@
+import numpy as np
+
+from service.first import FirstReco
+
+
+def test_first_reco_pads_with_unseen_items() -> None:
+    rng = np.random.default_rng(0)
+    user_ids = rng.integers(0, 300, 5_000) * 7
+    item_ids = rng.integers(0, 1_000, 5_000)
+    model = FirstReco.from_interactions(user_ids, item_ids, seed=0)
+
+    for user_id in np.unique(user_ids)[:50]:
+        viewed = sorted(item_ids[user_ids == user_id])
+        rec = model.reco(user_id, k_recos=10)
+
+        assert len(rec) == 10
+        head = viewed[:10]
+        np.testing.assert_array_equal(rec[:len(head)], head)
+        # добавленные айтемы различны и не из просмотренных
+        padding = rec[len(head):]
+        assert len(set(padding)) == len(padding)
+        assert not set(padding) & set(viewed)
+        assert set(padding) <= set(item_ids)
+
+    cold = model.reco(-1, k_recos=10)
+    assert len(set(cold)) == 10
+
+
+def test_first_reco_small_catalogue() -> None:
+    model = FirstReco.from_interactions(np.array([1, 1, 2]),
+                                        np.array([10, 11, 12]), seed=0)
+
+    assert sorted(model.reco(1, k_recos=3)) == [10, 11, 12]
+    assert sorted(model.reco(5, k_recos=3)) == [10, 11, 12]
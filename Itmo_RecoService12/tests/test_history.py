@@ -0,0 +1,31 @@
+import numpy as np
+
+from service.history import HistoryStore
+
+
+def test_history_store() -> None:
+    user_ids = np.array([2, 0, 2, 1, 0, 2])
+    item_ids = np.array([10, 11, 12, 13, 14, 15])
+    history = HistoryStore.from_interactions(user_ids, item_ids, n_users=4)
+
+    assert len(history) == 4
+    np.testing.assert_array_equal(history.get(0), [11, 14])
+    np.testing.assert_array_equal(history.get(2), [10, 12, 15])
+    assert len(history.get(3)) == 0
+    assert len(history.get(10)) == 0
+
+    items, lengths = history.gather(np.array([2, 3, 0]))
+    np.testing.assert_array_equal(items, [10, 12, 15, 11, 14])
+    np.testing.assert_array_equal(lengths, [3, 0, 2])
+    np.testing.assert_array_equal(history.union(np.array([0, 1])),
+                                  [11, 13, 14])
+
+
+def test_history_store_save_load(tmp_path) -> None:
+    history = HistoryStore.from_interactions(np.array([1, 0, 1]),
+                                             np.array([5, 6, 7]))
+    history.save(tmp_path)
+    loaded = HistoryStore.load(tmp_path)
+
+    assert isinstance(loaded.indices, np.memmap)
+    np.testing.assert_array_equal(loaded.get(1), [5, 7])
@@ -0,0 +1,64 @@
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from service.interactions import (
+    META_FILE,
+    UserItems,
+    default_cache_dir,
+    load_interactions,
+)
+
+
+def _write_csv(path: Path, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "user_id": rng.integers(0, 100, 1000) * 3,
+        "item_id": rng.integers(0, 50, 1000),
+        "last_watch_dt": "2021-08-01",
+        "watched_pct": 50.0,
+    })
+    df.to_csv(path, index=False)
+    return df
+
+
+def test_user_items_matches_groupby() -> None:
+    rng = np.random.default_rng(0)
+    user_ids = rng.integers(0, 100, 1000)
+    item_ids = rng.integers(0, 50, 1000)
+    user_items = UserItems.from_interactions(user_ids, item_ids)
+
+    expected = pd.DataFrame({"user_id": user_ids, "item_id": item_ids}) \
+        .groupby("user_id")["item_id"].agg(lambda x: sorted(list(x)))
+    np.testing.assert_array_equal(user_items.users, expected.index)
+    for i, items in enumerate(expected):
+        np.testing.assert_array_equal(
+            user_items.items[user_items.indptr[i]:user_items.indptr[i + 1]],
+            items)
+    np.testing.assert_array_equal(user_items.catalogue, np.unique(item_ids))
+
+
+def test_load_interactions_reuses_cache(tmp_path: Path) -> None:
+    path = tmp_path / "interactions.csv"
+    _write_csv(path, seed=0)
+
+    cold = load_interactions(path)
+    assert cold.items.dtype == np.int32
+    meta_mtime = (default_cache_dir(path) / META_FILE).stat().st_mtime_ns
+
+    warm = load_interactions(path)
+    assert isinstance(warm.items, np.memmap)
+    assert (default_cache_dir(path) / META_FILE).stat().st_mtime_ns \
+        == meta_mtime
+    for name in ("users", "indptr", "items", "catalogue"):
+        np.testing.assert_array_equal(getattr(warm, name),
+                                      getattr(cold, name))
+
+    # новая версия CSV пересобирает кеш
+    df = _write_csv(path, seed=1)
+    os.utime(path, ns=(meta_mtime + 10 ** 9, meta_mtime + 10 ** 9))
+    rebuilt = load_interactions(path)
+    assert len(rebuilt.items) == len(df)
+    np.testing.assert_array_equal(rebuilt.users, np.unique(df["user_id"]))
@@ -0,0 +1,147 @@
+import operator
+import typing as tp
+from pathlib import Path
+
+import numpy as np
+import pytest
+from rectools import Columns
+
+from service.make_reco import KionReco, KionRecoBM25
+from service.scorers import UserKNNScorer, top_k
+from tests.helpers import dump_als, dump_itemknn, dump_userknn
+
+
+def test_reco_many_splits_warm_and_cold(tmp_path: Path) -> None:
+    model = KionReco(*dump_itemknn(tmp_path))
+    warm = model.warm_users()[:5]
+    user_ids = [warm[0], -1, warm[1], warm[2], -2, warm[3], warm[4]]
+
+    recos = model.reco_many(user_ids, k_recos=10)
+
+    assert len(recos) == len(user_ids)
+    for user_id, rec in zip(user_ids, recos):
+        if model.check_user(user_id):
+            expected = model.reco_recommend(user_id, k_recos=10)
+        else:
+            expected = model.popular_reco(10)
+        np.testing.assert_array_equal(rec, expected)
+
+
+def test_bm25_make_reco_matches_pandas(tmp_path: Path) -> None:
+    model = KionRecoBM25(*dump_userknn(tmp_path))
+
+    for user_id in model.users_inv:
+        # скор айтема: максимум similarity * idf по соседям
+        scores: tp.Dict[int, float] = {}
+        similar_users, similarity = model.neighbours(user_id)
+        for similar_user, sim in zip(similar_users[1:], similarity[1:]):
+            for item_id in model.history.get(similar_user):
+                score = sim * model.idf_dense[item_id]
+                scores[item_id] = max(scores.get(item_id, score), score)
+
+        recos = model.make_reco(user_id, k_recos=10)
+        expected = np.asarray(model.make_reco_pandas(user_id, k_recos=10),
+                              dtype=np.int64)
+
+        # порядок совпадает с точностью до айтемов с равным скором
+        assert len(recos) == len(expected) == 10
+        np.testing.assert_allclose([scores.get(i, 0) for i in recos],
+                                   [scores.get(i, 0) for i in expected])
+        kth = scores.get(expected[-1], 0)
+        assert {i for i in recos if scores.get(i, 0) > kth} \
+            == {i for i in expected if scores.get(i, 0) > kth}
+
+
+def test_bm25_make_reco_unknown_user(tmp_path: Path) -> None:
+    model = KionRecoBM25(*dump_userknn(tmp_path))
+    np.testing.assert_array_equal(model.make_reco(-1, k_recos=5),
+                                  model.popular.top(5))
+
+
+def test_bm25_make_reco_filter_viewed(tmp_path: Path) -> None:
+    model = KionRecoBM25(*dump_userknn(tmp_path))
+
+    for user_id in model.users_inv[:20]:
+        recos = model.make_reco(user_id, k_recos=3, filter_viewed=True)
+        assert len(recos) == 3
+        assert not set(model.history.get(user_id)) & set(recos)
+
+
+def userknn_scores(model: KionRecoBM25, user_id: int,
+                   aggregate: tp.Callable = max) -> tp.Dict[int, float]:
+    # скор айтема: агрегат similarity * idf по соседям
+    scores: tp.Dict[int, float] = {}
+    similar_users, similarity = model.neighbours(user_id)
+    for similar_user, sim in zip(similar_users[1:], similarity[1:]):
+        for item_id in model.history.get(similar_user):
+            score = sim * model.idf_dense[item_id]
+            scores[item_id] = aggregate(scores[item_id], score) \
+                if item_id in scores else score
+    return scores
+
+
+def test_bm25_reco_maps_external_ids(tmp_path: Path) -> None:
+    model = KionRecoBM25(*dump_userknn(tmp_path))
+    # блоки по несколько пользователей
+    model.batch_memory_budget = 3 * 8 * len(model.idf_dense)
+
+    users = model.warm_users()
+    for user_id, recos in zip(users, model.reco_batch(users, 10)):
+        internal_id = model.lookup_user(user_id)[1]
+        expected = model.item_ids[model.make_reco(internal_id, 10)]
+        np.testing.assert_array_equal(model.reco(user_id, 10), expected)
+        # равные скоры упорядочены одинаково в обоих путях
+        np.testing.assert_array_equal(recos, expected)
+
+
+def test_top_k_ties() -> None:
+    scores = np.array([[1.0, 2.0, 2.0, 2.0, -np.inf, 2.0],
+                       [3.0, -np.inf, 3.0, 1.0, 3.0, 0.0]])
+    np.testing.assert_array_equal(top_k(scores, 2), [[1, 2], [0, 2]])
+    np.testing.assert_array_equal(top_k(scores[:, :2], 3),
+                                  [[1, 0, -1], [0, -1, -1]])
+
+
+def test_userknn_scorer_sum(tmp_path: Path) -> None:
+    model = KionRecoBM25(*dump_userknn(tmp_path))
+    scorer = UserKNNScorer(*model.neighbour_table(), model.users_rows,
+                           model.history, model.idf_dense, aggregate="sum",
+                           memory_budget=5 * 8 * len(model.idf_dense))
+
+    users = np.concatenate([model.users_inv, [-1, len(model.users_rows)]])
+    recos = scorer.recommend(users, 10)
+    for user_id, row in zip(users, recos):
+        if user_id not in model.users_inv:
+            assert (row == -1).all()
+            continue
+        scores = userknn_scores(model, user_id, aggregate=operator.add)
+        for item_id in model.history.get(user_id):
+            scores.pop(item_id, None)
+        expected = sorted(scores.values(), reverse=True)[:10]
+        row = row[row >= 0]
+        np.testing.assert_allclose([scores[i] for i in row], expected,
+                                   rtol=1e-5)
+
+
+def test_userknn_scorer_unknown_aggregate(tmp_path: Path) -> None:
+    model = KionRecoBM25(*dump_userknn(tmp_path))
+    with pytest.raises(ValueError):
+        UserKNNScorer(*model.neighbour_table(), model.users_rows,
+                      model.history, model.idf_dense, aggregate="mean")
+
+
+def test_vector_scorer_matches_rectools(tmp_path: Path) -> None:
+    model = KionReco(*dump_als(tmp_path))
+    assert model.scorer is not None
+
+    users = model.warm_users()
+    expected = model.model.recommend(users=users, dataset=model.dataset,
+                                     k=10, filter_viewed=True)
+    for user_id, recos in zip(users, model.reco_batch(users, 10)):
+        user_expected = expected[expected[Columns.User] == user_id]
+        np.testing.assert_array_equal(recos[recos >= 0],
+                                      user_expected[Columns.Item])
+        # один пользователь считается произведением матрицы на вектор
+        np.testing.assert_array_equal(
+            model.reco(user_id, 10)[:len(user_expected)],
+            user_expected[Columns.Item])
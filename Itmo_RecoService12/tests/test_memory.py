@@ -0,0 +1,84 @@
+import gc
+import importlib.util
+import typing as tp
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from service import memory
+
+SMAPS_ROLLUP = """\
+00400000-7ffd2b1f4000 ---p 00000000 00:00 0                  [rollup]
+Rss:              204800 kB
+Pss:              102400 kB
+Pss_Anon:          51200 kB
+Shared_Clean:      81920 kB
+Shared_Dirty:      20480 kB
+Private_Clean:     10240 kB
+Private_Dirty:     92160 kB
+Referenced:       204800 kB
+Swap:                  0 kB
+"""
+
+
+def test_parse_smaps() -> None:
+    assert memory.parse_smaps(SMAPS_ROLLUP.splitlines()) == {
+        "Rss": 204800, "Pss": 102400, "Shared_Clean": 81920,
+        "Shared_Dirty": 20480, "Private_Clean": 10240,
+        "Private_Dirty": 92160, "Swap": 0,
+    }
+
+
+def test_memory_report(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(memory, "memory_usage", lambda pid=None:
+                        memory.parse_smaps(SMAPS_ROLLUP.splitlines()))
+    assert memory.memory_report() == \
+        "rss=200MB pss=100MB shared=100MB private=100MB"
+
+
+def test_memory_report_unavailable(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(memory, "memory_usage", lambda pid=None: {})
+    assert memory.memory_report() == "memory usage is unavailable"
+
+
+def test_memory_usage_missing_process() -> None:
+    assert memory.memory_usage(pid=-1) == {}
+
+
+def test_freeze_gc() -> None:
+    try:
+        memory.freeze_gc()
+        assert gc.get_freeze_count() > 0
+    finally:
+        gc.unfreeze()
+
+
+def load_gunicorn_config() -> tp.Any:
+    path = Path(__file__).resolve().parents[1] / "gunicorn.config.py"
+    spec = importlib.util.spec_from_file_location("gunicorn_config", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.mark.parametrize("preload", [True, False])
+def test_when_ready_preloads_models(
+    monkeypatch: pytest.MonkeyPatch,
+    preload: bool,
+) -> None:
+    config = load_gunicorn_config()
+    calls: tp.List[str] = []
+    monkeypatch.setattr(memory, "freeze_gc", lambda: calls.append("freeze"))
+    models = SimpleNamespace(warmup=lambda: calls.append("warmup"))
+    app = SimpleNamespace(state=SimpleNamespace(models=models))
+    server = SimpleNamespace(
+        cfg=SimpleNamespace(preload_app=preload),
+        app=SimpleNamespace(wsgi=lambda: app),
+        log=SimpleNamespace(info=lambda message: calls.append("log")))
+
+    config.when_ready(server)
+
+    # модели загружаются до заморозки GC, иначе их объекты не попадут
+    # в замороженное поколение
+    assert calls == (["warmup", "freeze", "log"] if preload else [])
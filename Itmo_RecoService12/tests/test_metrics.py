@@ -0,0 +1,78 @@
+import json
+from pathlib import Path
+
+from service.make_reco import KionReco
+from service.metrics import (
+    FALLBACKS,
+    METRICS_FILE_PATTERN,
+    Counter,
+    Gauge,
+    LabeledHistogram,
+    MetricsRegistry,
+    mark_process_dead,
+)
+from tests.helpers import dump_itemknn
+
+
+def make_metrics() -> MetricsRegistry:
+    metrics = MetricsRegistry()
+    metrics.register(Counter("requests_total", "Requests", ("model",)))
+    metrics.register(Gauge("in_flight", "In flight", ("model",)))
+    metrics.register(Gauge("load_seconds", "Load time", ("model",),
+                           mode="max"))
+    metrics.register(LabeledHistogram("latency_seconds", "Latency",
+                                      ("model",), buckets=(0.1, 1)))
+    return metrics
+
+
+def test_render() -> None:
+    metrics = make_metrics()
+    metrics.metrics["requests_total"].inc("m", amount=2)
+    metrics.metrics["latency_seconds"].observe(0.5, 'm"1')
+
+    text = metrics.render()
+    assert "# TYPE requests_total counter\n" in text
+    assert 'requests_total{model="m"} 2.0\n' in text
+    assert 'latency_seconds_bucket{model="m\\"1",le="0.1"} 0.0\n' in text
+    assert 'latency_seconds_bucket{model="m\\"1",le="1"} 1.0\n' in text
+    assert 'latency_seconds_bucket{model="m\\"1",le="+Inf"} 1.0\n' in text
+    assert 'latency_seconds_count{model="m\\"1"} 1.0\n' in text
+
+
+def test_merge_workers(tmp_path: Path) -> None:
+    # снимок другого воркера, как если бы его записал MetricsWriter
+    other = make_metrics()
+    other.metrics["requests_total"].inc("m", amount=3)
+    other.metrics["in_flight"].inc("m")
+    other.metrics["load_seconds"].set(5, "m")
+    other.metrics["latency_seconds"].observe(0.05, "m")
+    with open(tmp_path / METRICS_FILE_PATTERN.format(pid=1), "w") as f:
+        json.dump(other.snapshot(), f)
+
+    metrics = make_metrics()
+    metrics.metrics["requests_total"].inc("m")
+    metrics.metrics["in_flight"].inc("m")
+    metrics.metrics["load_seconds"].set(2, "m")
+    metrics.metrics["latency_seconds"].observe(0.5, "m")
+
+    text = metrics.render(tmp_path)
+    assert 'requests_total{model="m"} 4.0\n' in text
+    assert 'in_flight{model="m"} 2.0\n' in text
+    assert 'load_seconds{model="m"} 5.0\n' in text
+    assert 'latency_seconds_bucket{model="m",le="0.1"} 1.0\n' in text
+    assert 'latency_seconds_count{model="m"} 2.0\n' in text
+
+    # у завершившегося воркера остаются только счетчики и гистограммы
+    mark_process_dead(1, tmp_path)
+    text = metrics.render(tmp_path)
+    assert 'requests_total{model="m"} 4.0\n' in text
+    assert 'in_flight{model="m"} 1.0\n' in text
+
+
+def test_cold_user_fallback(tmp_path: Path) -> None:
+    model = KionReco(*dump_itemknn(tmp_path))
+    model.name = "itemknn"
+    before = FALLBACKS.get("itemknn", "cold") or 0
+    model.reco(-1, 10)
+    model.reco_many([-1, -2, model.warm_users()[0]], 10)
+    assert FALLBACKS.get("itemknn", "cold") - before == 3
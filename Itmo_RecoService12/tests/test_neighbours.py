@@ -0,0 +1,41 @@
+from pathlib import Path
+
+import numpy as np
+from scipy import sparse
+
+from service.artifacts import export_model, import_model
+from service.make_reco import KionRecoBM25
+from service.neighbours import top_neighbours
+from tests.helpers import dump_userknn
+
+
+def test_top_neighbours_blocks() -> None:
+    similarity = sparse.random(300, 300, density=0.1, format="csr",
+                               random_state=0, dtype=np.float32)
+    ids, sims = top_neighbours(similarity, 5, n_rows=310, block_size=16,
+                               n_threads=4)
+
+    assert ids.shape == sims.shape == (310, 5)
+    for row in range(300):
+        dense = similarity[row].toarray()[0]
+        expected = np.lexsort((np.arange(300), -dense))[:5]
+        expected = expected[dense[expected] > 0]
+        np.testing.assert_array_equal(ids[row, :len(expected)], expected)
+        np.testing.assert_array_equal(ids[row, len(expected):], -1)
+        np.testing.assert_allclose(sims[row, :len(expected)],
+                                   dense[expected])
+    assert (ids[300:] == -1).all()
+
+
+def test_userknn_artifact_uses_neighbour_table(tmp_path: Path) -> None:
+    model = KionRecoBM25(*dump_userknn(tmp_path))
+    loaded = import_model(export_model(model, tmp_path / "artifact"))
+
+    assert loaded.similarity is None
+    assert isinstance(loaded.neighbour_ids, np.memmap)
+    assert loaded.neighbour_ids.shape == (len(model.users_inv),
+                                          model.n_neighbours)
+    for user_id in model.users_inv:
+        for expected, found in zip(model.neighbours(user_id),
+                                   loaded.neighbours(user_id)):
+            np.testing.assert_array_equal(found, expected)
@@ -0,0 +1,45 @@
+from pathlib import Path
+
+import numpy as np
+
+from service.artifacts import export_model, import_model
+from service.make_reco import KionReco
+from service.popular import Popularity, shared_popularity
+from tests.helpers import dump_itemknn
+
+
+def test_popularity_order_and_fill() -> None:
+    popular = Popularity.from_interactions(np.array([3, 1, 3, 2, 1, 3, 5]))
+
+    np.testing.assert_array_equal(popular.items, [3, 1, 2, 5])
+    np.testing.assert_array_equal(popular.fill(np.array([1]), 3), [1, 3, 2])
+    np.testing.assert_array_equal(
+        popular.fill(np.array([1]), 3, exclude=np.array([3])), [1, 2, 5])
+    # популярное закончилось раньше, чем набралось k
+    np.testing.assert_array_equal(
+        popular.fill(np.array([5]), 4, exclude=np.array([3])), [5, 1, 2])
+
+
+def test_shared_popularity_per_dataset(tmp_path: Path) -> None:
+    paths = dump_itemknn(tmp_path)
+    first, second = KionReco(*paths), KionReco(*paths)
+    (tmp_path / "other").mkdir()
+    other = KionReco(*dump_itemknn(tmp_path / "other"))
+
+    assert second.popular is first.popular
+    assert shared_popularity(paths[1], np.array([0])) is first.popular
+    assert other.popular is not first.popular
+
+
+def test_short_lists_filled_without_viewed(tmp_path: Path) -> None:
+    model = KionReco(*dump_itemknn(tmp_path))
+    loaded = import_model(export_model(model, tmp_path / "artifact"))
+
+    users = loaded.warm_users()
+    for user_id, recos in zip(users, loaded.reco_many(users, 30)):
+        row = loaded.lookup_user(user_id)[1]
+        viewed = set(loaded.item_ids[loaded.history.get(row)])
+        assert len(recos) == min(30, len(loaded.item_ids) - len(viewed))
+        assert len(set(recos)) == len(recos)
+        assert not viewed & set(recos)
+        np.testing.assert_array_equal(loaded.reco(user_id, 30), recos)
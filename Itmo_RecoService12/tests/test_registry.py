@@ -0,0 +1,185 @@
+import os
+import threading
+import time
+import typing as tp
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from service import registry as registry_module
+from service.artifacts import MANIFEST_FILE
+from service.cache import RecoCache
+from service.make_reco import KionReco
+from service.registry import ModelRegistry, ModelWatcher, spec_version
+from service.settings import ModelSpec
+
+
+def test_model_is_loaded_lazily(
+    tmp_path: Path,
+    itemknn_registry: tp.Callable[..., ModelRegistry],
+) -> None:
+    registry = itemknn_registry()
+    assert "itemknn" in registry
+    assert not registry.is_loaded("itemknn")
+
+    model = registry["itemknn"]
+    assert registry.is_loaded("itemknn")
+    assert registry["itemknn"] is model
+    assert model.name == "itemknn"
+    assert registry.get("missing") is None
+
+
+def test_version_without_loading(
+    tmp_path: Path,
+    itemknn_registry: tp.Callable[..., ModelRegistry],
+) -> None:
+    registry = itemknn_registry()
+    version = registry.version("itemknn")
+    assert not registry.is_loaded("itemknn")
+    assert registry["itemknn"].version == version
+
+    model = KionReco(tmp_path / "model.dill", tmp_path / "dataset.dill")
+    assert spec_version(ModelSpec(
+        kind="KionReco", model_path=tmp_path / "model.dill")) == model.version
+
+
+def test_disabled_model_is_hidden(tmp_path: Path) -> None:
+    registry = ModelRegistry({
+        "on": ModelSpec(kind="KionRecoTable", table_path=tmp_path),
+        "off": ModelSpec(kind="KionRecoTable", table_path=tmp_path,
+                         enabled=False),
+    })
+    assert list(registry) == ["on"]
+    assert len(registry) == 1
+    assert "off" not in registry
+    assert registry.get("off") is None
+
+
+def test_warmup_loads_models(
+    tmp_path: Path,
+    itemknn_registry: tp.Callable[..., ModelRegistry],
+) -> None:
+    registry = itemknn_registry()
+    registry.warmup()
+    assert registry.is_loaded("itemknn")
+
+
+def test_reload_swaps_model(
+    tmp_path: Path,
+    itemknn_registry: tp.Callable[..., ModelRegistry],
+) -> None:
+    registry = itemknn_registry()
+    cache = RecoCache()
+    registry.add_listener(cache.invalidate)
+    old = registry["itemknn"]
+    user_id = old.warm_users()[0]
+    cache.put(("itemknn", old.version, user_id, 10), old.reco(user_id, 10))
+
+    new = registry.reload("itemknn")
+    assert new is not old
+    assert registry["itemknn"] is new
+    assert len(cache) == 0
+    assert registry.status()["itemknn"] == {
+        "loaded": True, "version": new.version,
+        "reloading": False, "error": None}
+
+
+def test_failed_reload_keeps_model(
+    tmp_path: Path,
+    itemknn_registry: tp.Callable[..., ModelRegistry],
+) -> None:
+    registry = itemknn_registry()
+    old = registry["itemknn"]
+    broken = ModelSpec(kind="KionReco", model_path=tmp_path / "missing.dill",
+                       dataset_path=tmp_path / "missing.dill")
+
+    with pytest.raises(AssertionError):
+        registry.reload("itemknn", broken)
+    assert registry["itemknn"] is old
+    assert registry.specs["itemknn"].artifact_path == tmp_path / "artifact"
+    assert "AssertionError" in registry.status()["itemknn"]["error"]
+
+
+def test_watcher_reloads_changed_model(
+    tmp_path: Path,
+    itemknn_registry: tp.Callable[..., ModelRegistry],
+) -> None:
+    registry = itemknn_registry()
+    watcher = ModelWatcher(registry)
+    manifest = tmp_path / "artifact" / MANIFEST_FILE
+    mtime = manifest.stat().st_mtime + 10
+    os.utime(manifest, (mtime, mtime))
+
+    # незагруженная модель просто прочитает новые файлы
+    assert watcher.check() == []
+    old = registry["itemknn"]
+    assert watcher.check() == []
+    os.utime(manifest, (mtime + 10, mtime + 10))
+    assert watcher.check() == ["itemknn"]
+    assert registry["itemknn"] is not old
+
+
+def test_reload_in_background_starts_once(
+    itemknn_registry: tp.Callable[..., ModelRegistry],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    registry = itemknn_registry()
+    registry["itemknn"]
+    release = threading.Event()
+    load_model = registry_module.load_model
+
+    def slow_load(spec: ModelSpec):
+        release.wait(10)
+        return load_model(spec)
+
+    monkeypatch.setattr(registry_module, "load_model", slow_load)
+    start = threading.Barrier(8)
+
+    def request() -> bool:
+        start.wait()
+        return registry.reload_in_background("itemknn")
+
+    with ThreadPoolExecutor(8) as pool:
+        started = list(pool.map(lambda _: request(), range(8)))
+    assert started.count(True) == 1
+    assert registry.is_reloading("itemknn")
+
+    release.set()
+    wait_reload(registry, "itemknn")
+    assert registry.errors.get("itemknn") is None
+    # после завершения перезагрузку снова можно запустить
+    assert registry.reload_in_background("itemknn")
+    wait_reload(registry, "itemknn")
+
+
+def wait_reload(registry: ModelRegistry, name: str) -> None:
+    deadline = time.monotonic() + 10
+    while registry.is_reloading(name) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not registry.is_reloading(name)
+
+
+def test_reload_keeps_process_model_unloaded(
+    itemknn_registry: tp.Callable[..., ModelRegistry],
+) -> None:
+    registry = itemknn_registry(executor="process")
+    reloaded: tp.List[str] = []
+    registry.add_listener(reloaded.append)
+    spec = registry.specs["itemknn"]
+
+    model = registry.reload("itemknn")
+    # проверенная модель не остается в воркере, пул пересоздается
+    assert not registry.is_loaded("itemknn")
+    assert reloaded == ["itemknn"]
+    assert registry.version("itemknn") == model.version
+    assert registry.status()["itemknn"]["version"] == model.version
+
+    # наблюдатель перезагружает модель пула, хотя она не загружена
+    watcher = ModelWatcher(registry)
+    manifest = spec.artifact_path / MANIFEST_FILE
+    mtime = manifest.stat().st_mtime + 10
+    os.utime(manifest, (mtime, mtime))
+    assert watcher.check() == ["itemknn"]
+    assert not registry.is_loaded("itemknn")
+    assert reloaded == ["itemknn", "itemknn"]
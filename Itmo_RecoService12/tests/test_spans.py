@@ -0,0 +1,55 @@
+import asyncio
+import timeit
+import typing as tp
+
+from service.executors import ModelExecutors
+from service.registry import ModelRegistry
+from service.spans import Trace, span, start_trace, stop_trace
+
+
+def test_spans() -> None:
+    with span("scoring"):
+        pass
+    trace, token = start_trace()
+    for _ in range(2):
+        with span("scoring"):
+            pass
+    with span("render"):
+        pass
+    stop_trace(token)
+    with span("after"):
+        pass
+
+    assert list(trace.stages) == ["scoring", "render"]
+    assert trace.server_timing().startswith("scoring;dur=")
+    assert ", render;dur=" in trace.server_timing()
+
+
+def test_disabled_span_overhead() -> None:
+    def disabled():
+        with span("stage"):
+            pass
+
+    # без трассировки span - чтение contextvar и пустой менеджер
+    assert min(timeit.repeat(disabled, number=10_000, repeat=3)) < 0.05
+
+
+def test_spans_in_thread_pool(
+    itemknn_registry: tp.Callable[..., ModelRegistry],
+) -> None:
+    registry = itemknn_registry()
+    executors = ModelExecutors(registry)
+    model = registry["itemknn"]
+
+    async def run() -> Trace:
+        trace, token = start_trace()
+        await executors.call("itemknn", model, "reco",
+                             model.warm_users()[0], 10)
+        stop_trace(token)
+        return trace
+
+    try:
+        trace = asyncio.run(run())
+    finally:
+        executors.shutdown()
+    assert set(trace.stages) == {"check_user", "model"}
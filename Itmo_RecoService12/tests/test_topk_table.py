@@ -0,0 +1,45 @@
+from pathlib import Path
+
+import numpy as np
+
+from service.make_reco import KionReco
+from service.topk_table import KionRecoTable, materialize
+from tests.helpers import dump_itemknn
+
+
+def test_table_matches_model(tmp_path: Path) -> None:
+    model = KionReco(*dump_itemknn(tmp_path))
+    materialize(model, tmp_path / "table", k_max=15, batch_size=7)
+    table = KionRecoTable(tmp_path / "table")
+
+    users = model.warm_users()
+    assert isinstance(table.items, np.memmap)
+    batch = table.reco_batch(users, 10)
+    for user_id in users[:10]:
+        expected = model.reco_batch([user_id], 10)[0]
+        expected = expected[expected >= 0]
+        recos = table.reco(user_id, 10)
+        assert len(recos) == 10
+        np.testing.assert_array_equal(batch[users == user_id][0], recos)
+        np.testing.assert_array_equal(recos[:len(expected)], expected)
+        assert len(set(recos)) == 10
+
+    assert not table.check_user(-1)
+    np.testing.assert_array_equal(table.reco(-1, 5), model.popular_reco(5))
+
+
+def test_table_batch_pads_like_reco(tmp_path: Path) -> None:
+    model = KionReco(*dump_itemknn(tmp_path))
+    materialize(model, tmp_path / "table", k_max=5)
+    table = KionRecoTable(tmp_path / "table")
+
+    # k_recos больше k_max: строки таблицы дополняются популярным
+    # (в таблице хранится только k_max популярных айтемов)
+    users = np.append(model.warm_users()[:10], -1)
+    recos = table.reco_many(users, 8)
+    for user_id, row, user_recos in zip(users, table.reco_batch(users, 8),
+                                        recos):
+        np.testing.assert_array_equal(user_recos, table.reco(user_id, 8))
+        if user_id >= 0:
+            np.testing.assert_array_equal(row[row >= 0], user_recos)
+            assert len(user_recos) > 5
@@ -0,0 +1,28 @@
+import numpy as np
+
+from service.user_index import UserIndex
+
+
+def test_lookup_returns_internal_id() -> None:
+    external_ids = np.array([50, 10, 40, 20])
+    index = UserIndex(external_ids)
+
+    for internal_id, user_id in enumerate(external_ids):
+        assert index.lookup(user_id) == (True, internal_id)
+    assert index.lookup(30) == (False, -1)
+    assert index.lookup(100) == (False, -1)
+    assert 40 in index
+    assert 0 not in index
+
+
+def test_lookup_many_matches_scan() -> None:
+    rng = np.random.default_rng(0)
+    external_ids = rng.choice(1000, size=300, replace=False)
+    queries = rng.integers(0, 1100, size=500)
+    index = UserIndex(external_ids)
+
+    expected = [
+        np.where(external_ids == q)[0][0] if q in external_ids else -1
+        for q in queries
+    ]
+    np.testing.assert_array_equal(index.lookup_many(queries), expected)
@@ -9,6 +9,7 @@ from fastapi import FastAPI
 from .exception_handlers import add_exception_handlers
 from .middlewares import add_middlewares
 from .views import add_views
+from ..first import FirstReco
 from ..log import app_logger, setup_logging
 from ..settings import ServiceConfig
 
@@ -42,9 +43,7 @@ def create_app(config: ServiceConfig) -> FastAPI:
     # поднимаем и подготавливаем данные
     a = pd.read_csv(config.items_path)[
         ['user_id', 'item_id']]
-    app.state.item_list = list(a['item_id'].unique())
-    app.state.items = a.groupby('user_id').agg(
-        {'item_id': lambda x: sorted(list(x))})
+    app.state.first = FirstReco(a['user_id'].values, a['item_id'].values)
 
     add_views(app)
     add_middlewares(app)
@@ -1,5 +1,4 @@
 from os import environ
-from random import sample
 from typing import List
 
 from dotenv import load_dotenv
@@ -81,22 +80,11 @@ async def get_reco(
     if user_id > 10 ** 9:
         raise UserNotFoundError(error_message=f"User {user_id} not found")
 
-    # получаем данные по пользователям и позициям из настроек
-    items = request.app.state.items
-    item_list = request.app.state.item_list
     # получаем данные по количеству позиций в выдаче
     k_recs = request.app.state.k_recs
 
     # формируем массив с рекомендациями
-    rec = list(items[items.index == user_id]['item_id'])
-    # проверяем на пустой результат
-    if len(rec) == 0:
-        rec = sample(item_list, k=k_recs)
-    else:
-        rec = rec[0][:k_recs]
-        if len(rec) < k_recs:
-            rec.extend(
-                sample(list(set(item_list) - set(rec)), k=k_recs - len(rec)))
+    rec = request.app.state.first.reco(user_id, k_recs)
 
     sorted_reco_list = sorted(rec)
     return RecoResponse(user_id=user_id, items=list(sorted_reco_list))
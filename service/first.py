@@ -0,0 +1,64 @@
+import typing as tp
+
+import numpy as np
+import pandas as pd
+
+
+class FirstReco:
+    """
+    Модель first: первые k просмотренных пользователем айтемов
+    (по возрастанию id), недостающие позиции - случайные айтемы каталога.
+
+    Айтемы i-го по возрастанию id пользователя лежат в
+    items[indptr[i]:indptr[i + 1]], поиск пользователя - np.searchsorted.
+    Случайные айтемы выбираются отбором с отклонением за O(k).
+    """
+
+    def __init__(
+        self,
+        user_ids: np.ndarray,
+        item_ids: np.ndarray,
+        seed: tp.Optional[int] = None,
+    ) -> None:
+        user_ids = np.asarray(user_ids)
+        item_ids = np.asarray(item_ids)
+        # сортировка по пользователю, внутри - по айтему
+        order = np.lexsort((item_ids, user_ids))
+        self.users, counts = np.unique(user_ids[order], return_counts=True)
+        self.indptr = np.zeros(len(self.users) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.indptr[1:])
+        self.items = item_ids[order]
+        self.catalogue = pd.unique(item_ids)
+        self.rng = np.random.default_rng(seed)
+
+    def sample(self, n: int, exclude: np.ndarray) -> np.ndarray:
+        """
+        n случайных различных айтемов каталога, кроме exclude
+        """
+        chosen = set(exclude.tolist())
+        if len(self.catalogue) - len(chosen) <= 2 * n:
+            # каталог почти исчерпан, разность множеств уже небольшая
+            free = self.catalogue[~np.isin(self.catalogue, exclude)]
+            return self.rng.permutation(free)[:n]
+        result: tp.List[int] = []
+        while len(result) < n:
+            for row in self.rng.integers(0, len(self.catalogue),
+                                         2 * (n - len(result))):
+                item_id = self.catalogue[row]
+                if item_id not in chosen:
+                    chosen.add(item_id)
+                    result.append(item_id)
+                    if len(result) == n:
+                        break
+        return np.asarray(result, dtype=self.catalogue.dtype)
+
+    def reco(self, user_id: int, k_recs: int = 10) -> np.ndarray:
+        pos = int(np.searchsorted(self.users, user_id))
+        if pos < len(self.users) and self.users[pos] == user_id:
+            start = self.indptr[pos]
+            rec = self.items[start:min(start + k_recs, self.indptr[pos + 1])]
+        else:
+            rec = self.items[:0]
+        if len(rec) < k_recs:
+            rec = np.concatenate([rec, self.sample(k_recs - len(rec), rec)])
+        return rec